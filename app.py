@@ -2,6 +2,7 @@ import os
 import logging
 import json
 import datetime
+import urllib.request
 import jwt
 from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, session
 from dotenv import load_dotenv
@@ -87,6 +88,21 @@ def commands():
 
     return render_template('commands.html')
 
+def fetch_bot_metrics():
+    """Get handler timings from the bot's local metrics endpoint, or None if it isn't running.
+
+    The bot only serves metrics when METRICS_PORT is set; see instrumentation.py.
+    """
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json", timeout=2) as response:
+            return json.load(response)
+    except Exception as e:
+        logger.warning(f"Could not fetch bot metrics: {e}")
+        return None
+
 @app.route('/stats')
 def stats():
     """Page displaying bot statistics."""
@@ -106,7 +122,7 @@ def stats():
             except (ValueError, IndexError):
                 pass
     
-    return render_template('stats.html', stats=stats_data)
+    return render_template('stats.html', stats=stats_data, metrics=fetch_bot_metrics())
 
 @app.route('/leveling', methods=['GET', 'POST'])
 def leveling_page():
@@ -157,11 +173,9 @@ def leveling_page():
                 current_level = user_data['level']
                 current_xp = user_data['xp']
                 
-                # Calculate XP required for next level using the formula from leveling.py
-                xp_required = settings['base_xp_required'] * (current_level ** 1.5)
-                xp_percent = int((current_xp / xp_required) * 100) if xp_required > 0 else 0
-                if xp_percent > 100:
-                    xp_percent = 100
+                # Calculate XP required for next level from the same curve the bot levels with
+                xp_required = db_instance.calculate_required_xp(current_level)
+                xp_percent = db_instance.level_curve.progress(current_level, current_xp)
                 
                 # Format user stats
                 user_stats = {
@@ -256,8 +270,8 @@ def get_leveling_stats(discord_user_id, username):
     # Calculate XP required for next level
     current_level = user_data['level']
     current_xp = user_data['xp']
-    xp_required = settings['base_xp_required'] * (current_level ** 1.5)
-    xp_percent = int((current_xp / xp_required) * 100) if xp_required > 0 else 0
+    xp_required = db.calculate_required_xp(current_level)
+    xp_percent = db.level_curve.progress(current_level, current_xp)
     
     # Format response
     response = {
@@ -440,6 +454,39 @@ def repair_investment(discord_user_id, username, investment_name):
         "message": message
     }), 400
 
+@app.route('/api/transcripts/search', methods=['GET'])
+@token_required
+def search_transcripts(discord_user_id, username):
+    """Full-text search across closed ticket transcripts (Admin only)."""
+    import asyncio
+    from permissions import has_admin_permissions
+    from transcript_archive import TranscriptArchive
+
+    if not asyncio.run(has_admin_permissions(discord_user_id, None)):
+        return jsonify({'error': 'You do not have permission to search ticket transcripts.'}), 403
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query (q) is required!'}), 400
+
+    try:
+        limit = min(max(int(request.args.get('limit', 25)), 1), 100)
+    except ValueError:
+        limit = 25
+
+    archive = TranscriptArchive()
+    try:
+        results = archive.search(query, limit=limit)
+        total = archive.count()
+    finally:
+        archive.close()
+
+    return jsonify({
+        "query": query,
+        "total_transcripts": total,
+        "results": results
+    })
+
 @app.route('/investments', methods=['GET', 'POST'])
 def investments_page():
     """Page for managing investments with a web interface."""
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import zipfile
+import datetime
+import tempfile
+from logger import setup_logger
+
+logger = setup_logger('backup_manager', 'bot.log')
+
+BACKUP_DIR = 'backup/archives'
+MANIFEST_FILE = 'manifest.json'
+SEARCH_DIRS = ['data', '.', 'logs']
+JSON_DIRS = ['data', '.']  # Directories whose JSON files are included in backups
+DB_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+BACKUP_PAGES = 256  # Pages copied per step of the SQLite online backup
+BACKUP_STEP_SLEEP = 0.005  # Seconds to pause between steps so writers aren't blocked
+BACKUP_RETENTION = 10  # Number of archives to keep
+
+class BackupManager:
+    """
+    Creates compressed, incremental backups of the bot's databases and JSON data files.
+    SQLite databases are copied with the online backup API so the copy is consistent
+    even while the bot is writing. Files are content-hashed and only files that changed
+    since the previous backup are added to the new archive.
+    """
+
+    def __init__(self, backup_dir=BACKUP_DIR, retention=BACKUP_RETENTION):
+        self.backup_dir = backup_dir
+        self.retention = retention
+        self.manifest_path = os.path.join(self.backup_dir, MANIFEST_FILE)
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+    def find_backup_files(self):
+        """Find the database and JSON data files to back up."""
+        files = []
+        for directory in SEARCH_DIRS:
+            if not os.path.isdir(directory):
+                continue
+
+            for file in sorted(os.listdir(directory)):
+                path = os.path.join(directory, file)
+                if not os.path.isfile(path):
+                    continue
+                if file.endswith(DB_EXTENSIONS):
+                    files.append(path)
+                elif file.endswith('.json') and directory in JSON_DIRS:
+                    files.append(path)
+        return files
+
+    @staticmethod
+    def snapshot_database(src_path, dst_path):
+        """Copy an SQLite database with the online backup API.
+
+        The copy is made a few pages at a time so other connections can keep
+        writing while the backup runs.
+        """
+        src = sqlite3.connect(src_path)
+        dst = sqlite3.connect(dst_path)
+        try:
+            with dst:
+                src.backup(dst, pages=BACKUP_PAGES, sleep=BACKUP_STEP_SLEEP)
+        finally:
+            dst.close()
+            src.close()
+
+    @staticmethod
+    def hash_file(path):
+        """Get the SHA-256 hash of a file's contents."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load_manifest(self):
+        """Load the manifest describing where the latest version of each file is archived."""
+        try:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading backup manifest: {e}")
+        return {'archives': [], 'files': {}}
+
+    def save_manifest(self, manifest):
+        """Atomically write the backup manifest."""
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(temp_path, self.manifest_path)
+
+    def create_backup(self, full=False):
+        """Create a new backup archive.
+
+        Args:
+            full (bool): Include every file, even ones that haven't changed
+
+        Returns:
+            dict: Backup summary with the archive path and changed, unchanged and failed files
+        """
+        manifest = self.load_manifest()
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        archive_name = f"backup_{timestamp}.zip"
+        suffix = 1
+        while archive_name in manifest['archives'] or os.path.exists(os.path.join(self.backup_dir, archive_name)):
+            archive_name = f"backup_{timestamp}_{suffix}.zip"
+            suffix += 1
+        archive_path = os.path.join(self.backup_dir, archive_name)
+
+        # Archives that retention will remove once this one is written. Files whose
+        # latest copy only lives in one of them must be stored again.
+        expiring = set(manifest['archives'][:max(0, len(manifest['archives']) + 1 - self.retention)])
+
+        changed = []
+        unchanged = []
+        failed = []
+        started = time.monotonic()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            staged = []
+            for path in self.find_backup_files():
+                arcname = os.path.normpath(path)
+                try:
+                    if path.endswith(DB_EXTENSIONS):
+                        staged_path = os.path.join(temp_dir, arcname.replace(os.sep, '__'))
+                        self.snapshot_database(path, staged_path)
+                    else:
+                        staged_path = path
+
+                    file_hash = self.hash_file(staged_path)
+                except Exception as e:
+                    logger.error(f"Error preparing {path} for backup: {e}")
+                    failed.append(arcname)
+                    continue
+
+                previous = manifest['files'].get(arcname)
+                if (not full and previous and previous['hash'] == file_hash
+                        and previous['archive'] not in expiring):
+                    unchanged.append(arcname)
+                    continue
+
+                staged.append((staged_path, arcname, file_hash))
+
+            if not staged and manifest['archives']:
+                logger.info(f"Backup skipped, {len(unchanged)} files unchanged since the last backup")
+                return {
+                    'archive': None,
+                    'changed': [],
+                    'unchanged': unchanged,
+                    'failed': failed,
+                    'size': 0,
+                    'seconds': time.monotonic() - started
+                }
+
+            with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+                for staged_path, arcname, file_hash in staged:
+                    archive.write(staged_path, arcname)
+                    manifest['files'][arcname] = {'hash': file_hash, 'archive': archive_name}
+                    changed.append(arcname)
+
+                # Each archive records where every file's latest version lives
+                archive.writestr(MANIFEST_FILE, json.dumps(manifest['files'], indent=4))
+
+        manifest['archives'].append(archive_name)
+        self.prune(manifest)
+        self.save_manifest(manifest)
+
+        summary = {
+            'archive': archive_path,
+            'changed': changed,
+            'unchanged': unchanged,
+            'failed': failed,
+            'size': os.path.getsize(archive_path),
+            'seconds': time.monotonic() - started
+        }
+        logger.info(f"Created backup {archive_path}: {len(changed)} changed, {len(unchanged)} unchanged, {len(failed)} failed in {summary['seconds']:.2f}s")
+        return summary
+
+    def prune(self, manifest):
+        """Delete the oldest archives beyond the retention limit."""
+        while len(manifest['archives']) > self.retention:
+            old_archive = manifest['archives'].pop(0)
+            try:
+                os.remove(os.path.join(self.backup_dir, old_archive))
+                logger.info(f"Removed old backup {old_archive}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error removing old backup {old_archive}: {e}")
+
+            # Files that no longer exist on disk may still point at the removed archive
+            for arcname in [name for name, entry in manifest['files'].items() if entry['archive'] == old_archive]:
+                del manifest['files'][arcname]
@@ -0,0 +1,113 @@
+"""
+Benchmark for the leveling database.
+Compares message XP throughput and leaderboard latency on a default SQLite
+connection (rollback journal, synchronous=FULL, no leaderboard index) against
+the tuned connection used by Database.
+
+Usage: python benchmark_db.py [--users 5000] [--messages 5000] [--queries 500]
+"""
+
+import os
+import time
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+
+from database import Database, SQLITE_PRAGMAS
+
+# SQLite's defaults, used to reproduce the connection as it was before tuning
+BASELINE_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT'
+}
+
+def create_database(path, users, tuned):
+    """Create a benchmark database seeded with random users."""
+    db = Database(path)
+
+    if not tuned:
+        for pragma, value in BASELINE_PRAGMAS.items():
+            db.conn.execute(f'PRAGMA {pragma} = {value}')
+        db.conn.execute('DROP INDEX IF EXISTS idx_users_leaderboard')
+
+    db.import_users(
+        {
+            'user_id': user_id,
+            'username': f"user{user_id}",
+            'xp': random.randint(0, 5000),
+            'level': random.randint(1, 100),
+            'coins': random.randint(0, 10000),
+            'prestige': random.randint(0, 5)
+        }
+        for user_id in range(1, users + 1)
+    )
+
+    # Every message should earn XP, so the cooldown is turned off
+    db.settings['xp_cooldown'] = 0
+    return db
+
+def bench_message_xp(db, users, messages):
+    """Measure add_xp calls per second."""
+    start = time.perf_counter()
+    for _ in range(messages):
+        user_id = random.randint(1, users)
+        db.add_xp(user_id, f"user{user_id}")
+    elapsed = time.perf_counter() - start
+    return messages / elapsed
+
+def bench_leaderboard(db, queries):
+    """Measure get_leaderboard latency in milliseconds."""
+    timings = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        db.get_leaderboard(10)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    }
+
+def run(users, messages, queries):
+    """Run the benchmark for the baseline and tuned configurations and print the results."""
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, tuned in (('baseline', False), ('tuned', True)):
+            random.seed(42)
+            db = create_database(os.path.join(temp_dir, f"{name}.db"), users, tuned)
+            results[name] = {
+                'messages_per_second': bench_message_xp(db, users, messages),
+                'leaderboard': bench_leaderboard(db, queries)
+            }
+            db.close()
+
+    print(f"Users: {users}, messages: {messages}, leaderboard queries: {queries}")
+    print(f"Tuned pragmas: {SQLITE_PRAGMAS}")
+    print()
+    print(f"{'':<10} {'msg XP/s':>10} {'lb p50 ms':>10} {'lb p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['messages_per_second']:>10.0f} "
+              f"{result['leaderboard']['p50']:>10.3f} {result['leaderboard']['p99']:>10.3f}")
+
+    baseline, tuned = results['baseline'], results['tuned']
+    print()
+    print(f"Message XP throughput: {tuned['messages_per_second'] / baseline['messages_per_second']:.1f}x")
+    print(f"Leaderboard p50 latency: {baseline['leaderboard']['p50'] / tuned['leaderboard']['p50']:.1f}x faster")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the leveling database before and after SQLite tuning")
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    # add_xp logs several lines per call; keep logging out of the measurement
+    logging.disable(logging.CRITICAL)
+
+    run(args.users, args.messages, args.queries)
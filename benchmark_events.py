@@ -0,0 +1,361 @@
+"""
+Offline throughput benchmark for the bot's event handlers.
+Loads the message, voice and reaction handling cogs into a bot that never
+connects to Discord, then replays synthetic messages, voice joins/leaves and
+reactions through the same message router and listeners the live bot uses.
+Everything runs in a temporary data directory, so no real data is touched.
+
+Reports events per second, p50/p99 latency per event type and per handler, and
+the SQLite statements run per event on leveling.db and documents.db, so
+regressions in the hot paths show up before a deploy.
+
+Usage: python benchmark_events.py [--users 500] [--messages 5000] [--voice 500] [--reactions 1000]
+                                  [--cogs leveling event_system ...] [--no-cooldown]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import importlib
+import statistics
+
+import discord
+from discord.ext import commands
+
+# Cogs on the message, voice and reaction paths, loaded the way bot.py loads them
+DEFAULT_COGS = ['leveling', 'event_system', 'chat_activity', 'grumbleteeth', 'voice_rewards', 'cur_filter', 'games']
+
+WORDS = ['hello', 'gg', 'anyone', 'up', 'for', 'a', 'game', 'tonight', 'lol', 'nice', 'level', 'coins', 'drop', 'when']
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = "Benchmark Guild"
+        self.members = {}
+        self.channels = {}
+        self.system_channel = None
+        self.roles = []
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+class FakeChannel:
+    def __init__(self, channel_id, name, guild, voice=False):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.type = discord.ChannelType.voice if voice else discord.ChannelType.text
+        self.mention = f"<#{channel_id}>"
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        return FakeMessage(random.getrandbits(48), None, self, '')
+
+class FakeMember:
+    def __init__(self, user_id, guild, bot=False):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = self.name
+        self.global_name = self.name
+        self.discriminator = '0'
+        self.mention = f"<@{user_id}>"
+        self.bot = bot
+        self.guild = guild
+        self.roles = []
+        self.avatar = None
+        self.display_avatar = None
+        self.sent = 0
+
+    def __str__(self):
+        return self.name
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def mentioned_in(self, message):
+        return self in message.mentions
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+class FakeMessage:
+    def __init__(self, message_id, author, channel, content):
+        self.id = message_id
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.clean_content = content
+        self.attachments = []
+        self.mentions = []
+        self.embeds = []
+        self.reference = None
+        self.created_at = discord.utils.utcnow()
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def reply(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        pass
+
+class FakeVoiceState:
+    def __init__(self, channel=None):
+        self.channel = channel
+        self.self_mute = False
+        self.self_deaf = False
+        self.self_stream = False
+        self.mute = False
+        self.deaf = False
+
+class FakeReaction:
+    def __init__(self, emoji, message):
+        self.emoji = emoji
+        self.message = message
+        self.count = 1
+
+class BenchmarkBot(commands.Bot):
+    """A bot that is never logged in; lookups that would hit Discord return the fake objects."""
+
+    def __init__(self, guild):
+        super().__init__(command_prefix="!", intents=discord.Intents.default())
+        self.guild = guild
+        self.bot_member = FakeMember(1, guild, bot=True)
+
+    @property
+    def user(self):
+        return self.bot_member
+
+    @property
+    def guilds(self):
+        return [self.guild]
+
+    def get_guild(self, guild_id):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_channel(self, channel_id):
+        return self.guild.get_channel(channel_id)
+
+    def get_user(self, user_id):
+        return self.guild.get_member(user_id)
+
+    async def fetch_user(self, user_id):
+        return self.guild.get_member(user_id)
+
+class Timings:
+    """Latencies for one event type or handler, and the errors it raised."""
+
+    def __init__(self):
+        self.samples = []
+        self.errors = 0
+
+    def summary(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {'calls': 0, 'p50': 0.0, 'p99': 0.0, 'errors': self.errors}
+        return {
+            'calls': len(samples),
+            'p50': statistics.median(samples),
+            'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            'errors': self.errors
+        }
+
+class StatementCounter:
+    """Counts the SQL statements run on the connections it is attached to."""
+
+    def __init__(self):
+        self.count = 0
+
+    def attach(self, conn):
+        conn.set_trace_callback(self.trace)
+
+    def trace(self, statement):
+        self.count += 1
+
+def time_handlers(router, handler_timings):
+    """Wrap each message router subscriber so its latency is recorded per call."""
+    for subscription in router.subscriptions.values():
+        timings = handler_timings.setdefault(f"message:{subscription.name}", Timings())
+
+        async def timed(message, handler=subscription.handler, timings=timings):
+            started = time.perf_counter()
+            try:
+                await handler(message)
+            finally:
+                timings.samples.append((time.perf_counter() - started) * 1000)
+
+        subscription.handler = timed
+
+async def dispatch(bot, event, handler_timings, *args):
+    """Run every listener for an event and wait for them, like bot.dispatch but awaited and timed."""
+    listeners = list(bot.extra_events.get(f"on_{event}", []))
+    bot_handler = getattr(bot, f"on_{event}", None)
+    if bot_handler is not None:
+        listeners.append(bot_handler)
+
+    async def timed(listener):
+        timings = handler_timings.setdefault(f"{event}:{listener.__qualname__}", Timings())
+        started = time.perf_counter()
+        try:
+            await listener(*args)
+        except Exception:
+            timings.errors += 1
+        finally:
+            timings.samples.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(timed(listener) for listener in listeners))
+
+async def replay(bot, guild, users, messages, voice, reactions):
+    """Replay synthetic events and time each one.
+
+    Returns:
+        tuple: (event timings, handler timings, statements per event type, elapsed seconds per event type)
+    """
+    from database import get_database
+    from document_store import get_document_store
+    from message_router import get_message_router
+
+    router = get_message_router(bot)
+    handler_timings = {}
+    time_handlers(router, handler_timings)
+
+    counter = StatementCounter()
+    counter.attach(get_database().conn)
+    counter.attach(get_document_store().conn)
+
+    text_channels = [FakeChannel(100 + i, f"chat-{i}", guild) for i in range(5)]
+    voice_channel = FakeChannel(200, "voice", guild, voice=True)
+    for channel in text_channels + [voice_channel]:
+        guild.channels[channel.id] = channel
+    members = [FakeMember(1000 + i, guild) for i in range(users)]
+    for member in members:
+        guild.members[member.id] = member
+
+    event_timings = {kind: Timings() for kind in ('message', 'voice', 'reaction')}
+    statements = {}
+    elapsed = {}
+
+    async def run_phase(kind, events):
+        counter.count = 0
+        started = time.perf_counter()
+        for event in events:
+            event_started = time.perf_counter()
+            await event()
+            event_timings[kind].samples.append((time.perf_counter() - event_started) * 1000)
+        elapsed[kind] = time.perf_counter() - started
+        statements[kind] = counter.count
+
+    posted = []
+
+    def message_event(i):
+        author = random.choice(members)
+        channel = random.choice(text_channels)
+        content = ' '.join(random.choices(WORDS, k=random.randint(1, 12)))
+        message = FakeMessage(10_000 + i, author, channel, content)
+        posted.append(message)
+        return lambda: router.on_message(message)
+
+    await run_phase('message', [message_event(i) for i in range(messages)])
+
+    voice_cog = bot.get_cog('VoiceRewardsCog')
+
+    def voice_events(member):
+        async def join():
+            await dispatch(bot, 'voice_state_update', handler_timings, member, FakeVoiceState(), FakeVoiceState(voice_channel))
+
+        async def leave():
+            # Backdate the join so the leave is rewarded for some minutes in voice
+            if voice_cog and member.id in voice_cog.voice_users:
+                voice_cog.voice_users[member.id].join_time -= random.randint(1, 60) * 60
+            await dispatch(bot, 'voice_state_update', handler_timings, member, FakeVoiceState(voice_channel), FakeVoiceState())
+        return [join, leave]
+
+    voice_members = random.sample(members, min(voice, len(members)))
+    await run_phase('voice', [event for member in voice_members for event in voice_events(member)])
+
+    def reaction_event():
+        reaction = FakeReaction('👍', random.choice(posted)) if posted else None
+        user = random.choice(members)
+        return lambda: dispatch(bot, 'reaction_add', handler_timings, reaction, user)
+
+    await run_phase('reaction', [reaction_event() for _ in range(reactions if posted else 0)])
+
+    for name, stats in router.stats.items():
+        if f"message:{name}" in handler_timings:
+            handler_timings[f"message:{name}"].errors = stats.errors
+
+    return event_timings, handler_timings, statements, elapsed
+
+async def run(users, messages, voice, reactions, cogs, no_cooldown):
+    """Load the cogs into an offline bot, replay the events and print the results."""
+    from events import register_events
+    from database import get_database
+    from document_store import get_document_store
+
+    guild = FakeGuild(10)
+    bot = BenchmarkBot(guild)
+    register_events(bot)
+    for name in cogs:
+        await importlib.import_module(name).setup(bot)
+    if no_cooldown:
+        get_database().settings['xp_cooldown'] = 0
+
+    event_timings, handler_timings, statements, elapsed = await replay(bot, guild, users, messages, voice, reactions)
+    get_document_store().flush()
+
+    counts = {'message': messages, 'voice': 2 * min(voice, users), 'reaction': reactions}
+    print(f"Users: {users}, XP cooldown: {'off' if no_cooldown else 'on'}, cogs: {', '.join(cogs)}")
+    print()
+    print(f"{'event':<10} {'events':>8} {'events/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'SQL/event':>10}")
+    for kind, timings in event_timings.items():
+        summary = timings.summary()
+        if not summary['calls']:
+            continue
+        print(f"{kind:<10} {counts[kind]:>8} {counts[kind] / elapsed[kind]:>10.0f} "
+              f"{summary['p50']:>8.3f} {summary['p99']:>8.3f} {statements[kind] / counts[kind]:>10.2f}")
+
+    print()
+    print(f"{'handler':<52} {'calls':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, timings in sorted(handler_timings.items()):
+        summary = timings.summary()
+        print(f"{name:<52} {summary['calls']:>7} {summary['p50']:>8.3f} {summary['p99']:>8.3f} {summary['errors']:>7}")
+
+    for task in asyncio.all_tasks() - {asyncio.current_task()}:
+        task.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bot's message, voice and reaction handlers offline")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--voice', type=int, default=500, help="Users that join and leave voice")
+    parser.add_argument('--reactions', type=int, default=1000)
+    parser.add_argument('--cogs', nargs='+', default=DEFAULT_COGS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-cooldown', action='store_true', help="Let every message earn XP, the worst case for the database")
+    args = parser.parse_args()
+
+    # The cogs keep their data in paths relative to the working directory, so they
+    # are loaded from a temporary one to use a fresh leveling.db and settings.json
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        os.makedirs('data', exist_ok=True)
+
+        # Handlers log several lines per event; keep logging out of the measurement
+        logging.disable(logging.CRITICAL)
+        random.seed(args.seed)
+        asyncio.run(run(args.users, args.messages, args.voice, args.reactions, args.cogs, args.no_cooldown))
@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 from logger import setup_logger
 from events import register_events
 from config import BotConfig
+from instrumentation import instrument_bot
+from command_sync import sync_commands, cap_global_commands
 from leveling import setup as setup_leveling
 from permissions import is_admin
 from countdown import setup as setup_countdown
@@ -177,32 +179,20 @@ async def initialize_bot():
             for cmd in bot.tree.get_commands():
                 logger.info(f"Command: {cmd.name}")
             
-            # Force sync the commands globally first
+            # Sync up to 95 global commands
             try:
-                # Get all commands before syncing
-                all_commands = bot.tree.get_commands()
-                
-                # Sync up to 95 global commands
-                bot.tree._global_commands = bot.tree._global_commands[:95]
-                logger.info(f"Syncing up to 95 global commands")
-                
-                global_commands = await bot.tree.sync()
-                logger.info(f"Synced {len(global_commands)} commands globally")
-                total_synced = len(global_commands)
+                removed = cap_global_commands(bot.tree, 95)
+                if removed:
+                    logger.warning(f"Not syncing {len(removed)} global commands over the limit of 95: {', '.join(removed)}")
             except Exception as e:
-                logger.error(f"Failed to sync commands globally: {e}")
-                total_synced = 0
-                
-            # Now sync to each guild separately for guild-specific commands
-            for guild_id in guild_ids:
-                try:
-                    guild_commands = await bot.tree.sync(guild=discord.Object(id=guild_id))
-                    total_synced += len(guild_commands)
-                    logger.info(f"Synced {len(guild_commands)} commands to guild ID: {guild_id}")
-                except Exception as e:
-                    logger.error(f"Failed to sync commands to guild ID {guild_id}: {e}")
-            
-            print(f"Synced {total_synced} total command(s) across {len(guild_ids)} guild(s)")
+                logger.error(f"Failed to limit global commands: {e}")
+
+            # Sync the global commands, then each guild's, skipping scopes whose commands haven't changed
+            report = await sync_commands(bot, guild_ids)
+            total_synced = sum(report['synced'].values())
+
+            print(f"Synced {total_synced} total command(s) to {len(report['synced'])} scope(s), "
+                  f"skipped {len(report['skipped'])} unchanged scope(s) across {len(guild_ids)} guild(s)")
             print(f"Bot is online as {bot.user.name}")
             
             # Log the registered commands
@@ -213,6 +203,9 @@ async def initialize_bot():
         except Exception as e:
             print(f"Failed to sync commands: {e}")
 
+    # Times every listener and command when METRICS_PORT is set; a no-op otherwise
+    await instrument_bot(bot)
+
     max_retries = 5
     retry_count = 0
     
@@ -243,5 +236,5 @@ async def remove_excess_commands(bot):
     if len(commands) > 100:
         logger.warning(f"Bot has {len(commands)} commands, exceeding Discord's 100 command limit")
         # Keep core commands, remove excess
-        bot.tree._global_commands = bot.tree._global_commands[:95]
+        cap_global_commands(bot.tree, 95)
         logger.info("Reduced to 95 global commands to allow for guild-specific commands")
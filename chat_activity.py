@@ -8,6 +8,7 @@ import logging
 import sqlite3
 import json
 from logger import setup_logger
+from message_router import get_message_router
 from activity_events import has_permissions
 
 logger = setup_logger('chat_activity', 'bot.log')
@@ -177,7 +178,12 @@ class ChatActivityCog(commands.Cog):
         self.db_name = 'data/leveling.db'
         self.activity_event = None  # Current activity event
         self.setup_database()
+        get_message_router(bot).subscribe('chat_activity', self.handle_message, channels=self.get_tracked_channels)
         logger.info("Chat activity cog initialized")
+    
+    def cog_unload(self):
+        """Stop receiving messages when the cog is unloaded."""
+        get_message_router(self.bot).unsubscribe('chat_activity')
         
     async def cog_load(self):
         """Called when the cog is loaded. Used to initialize async tasks."""
@@ -911,18 +917,14 @@ class ChatActivityCog(commands.Cog):
         except Exception as e:
             logger.error(f"Error announcing activity results: {e}")
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Listen for messages to track activity coins."""
-
-        if message.author.bot:
-            return
-
+    def get_tracked_channels(self):
+        """Get the channel IDs where messages earn activity coins."""
         if not self.activity_event or not self.activity_event.is_active:
-            return
+            return ()
+        return (self.activity_event.channel_id,)
 
-        if message.channel.id != self.activity_event.channel_id:
-            return
+    async def handle_message(self, message):
+        """Track activity coins for messages in the active event's channel."""
 
         coin_multiplier = 1.0
         event_system_cog = self.bot.get_cog("EventSystemCog")
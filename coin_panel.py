@@ -7,11 +7,15 @@ import datetime
 import logging
 import json
 from logger import setup_logger
-from database import Database
+from database import get_database
+from rewards import CoinSource
 from settings_storage import settings_storage
+from drop_engine import get_drop_engine
 
 logger = setup_logger('coin_panel', 'bot.log')
 
+COIN_DROP_CLAIM_SECONDS = 60  # How long a coin drop can be claimed
+
 class CoinDropSettings:
     """Class to store coin drop settings."""
     def __init__(self):
@@ -41,8 +45,10 @@ class CoinPanelCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.coin_drop_settings = {}  # Guild ID -> CoinDropSettings
+        self.engine = get_drop_engine(bot)
+        self.engine.register('coin', self.on_coin_drop_claimed, self.on_coin_drop_expired)
         self.load_settings()
         logger.info("Coin panel cog initialized")
         
@@ -178,7 +184,7 @@ class CoinPanelCog(commands.Cog):
         
         try:
 
-            self.db.add_coins(user_id, username, amount)
+            self.db.add_coins(user_id, username, amount, CoinSource.ADMIN)
 
             user_data = self.db.get_user(user_id)
             
@@ -222,7 +228,7 @@ class CoinPanelCog(commands.Cog):
             if current_coins < amount:
                 return False, f"{username} only has {current_coins} coins. Cannot remove {amount}."
 
-            self.db.add_coins(user_id, username, -amount)
+            self.db.add_coins(user_id, username, -amount, CoinSource.ADMIN)
 
             user_data = self.db.get_user(user_id)
             
@@ -306,6 +312,39 @@ class CoinPanelCog(commands.Cog):
             logger.error(f"Error toggling coin drops: {e}")
             return False, f"Error toggling coin drops: {str(e)}"
     
+    def _next_drop_text(self, guild_id):
+        settings = self.coin_drop_settings.get(guild_id)
+        if settings and settings.is_active and settings.next_drop_time:
+            return f"Next drop at {settings.next_drop_time.strftime('%I:%M %p')}"
+        return None
+
+    async def on_coin_drop_claimed(self, interaction, drop, result):
+        """Show who claimed a coin drop."""
+        user = interaction.user
+        embed = interaction.message.embeds[0]
+        embed.title = "💰 Coin Drop Claimed!"
+        embed.description = f"🎉 **{user.display_name}** claimed {result['coins']} coins!"
+        embed.color = discord.Color.green()
+        embed.set_footer(text=self._next_drop_text(drop['guild_id']))
+
+        await interaction.response.edit_message(embed=embed, view=None)
+        await interaction.channel.send(f"🎉 Congratulations {user.mention}! You won {result['coins']} coins! 🎉")
+
+    async def on_coin_drop_expired(self, drop):
+        """Mark an unclaimed coin drop as expired."""
+        message = await self.engine.fetch_drop_message(drop)
+        if message is None or not message.embeds:
+            return
+
+        embed = message.embeds[0]
+        embed.title = "💰 Coin Drop Expired!"
+        embed.description = "No one claimed the coins in time."
+        embed.color = discord.Color.red()
+        embed.set_footer(text=self._next_drop_text(drop['guild_id']))
+
+        await message.edit(embed=embed, view=None)
+        logger.info(f"Coin drop expired with no claims")
+    
     async def _run_coin_drops(self, guild_id):
         """Background task to handle coin drops at intervals."""
         try:
@@ -366,13 +405,14 @@ class CoinPanelCog(commands.Cog):
 
                     embed = discord.Embed(
                         title="💰 Coin Drop!",
-                        description=f"React with {emoji} to claim {coin_amount} coins!",
+                        description=f"Click {emoji} to claim {coin_amount} coins!",
                         color=discord.Color.gold()
                     )
 
-                    drop_message = await channel.send(embed=embed)
-
-                    await drop_message.add_reaction(emoji)
+                    # Claimed through the drop engine; the first click wins and expiry is scheduled
+                    drop = self.engine.create_drop('coin', channel.id, coins=coin_amount, duration=COIN_DROP_CLAIM_SECONDS, guild_id=guild_id)
+                    drop_message = await channel.send(embed=embed, view=self.engine.claim_view(label="Claim", emoji=emoji))
+                    self.engine.attach_message(drop, drop_message.id)
 
                     settings.last_drop_time = datetime.datetime.now()
                     settings.next_drop_time = settings.last_drop_time + datetime.timedelta(seconds=interval_seconds)
@@ -380,36 +420,6 @@ class CoinPanelCog(commands.Cog):
                     self.save_settings(guild_id)
                     logger.info(f"Coin drop sent in guild {guild_id}, next drop at {next_drop_formatted}")
 
-                    def check(reaction, user):
-                        return user != self.bot.user and str(reaction.emoji) == emoji and reaction.message.id == drop_message.id
-                    
-                    try:
-
-                        reaction, user = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
-
-                        self.db.add_coins(user.id, user.display_name, coin_amount)
-
-                        embed.title = "💰 Coin Drop Claimed!"
-                        embed.description = f"🎉 **{user.display_name}** claimed {coin_amount} coins!"
-                        embed.color = discord.Color.green()
-                        embed.set_footer(text=f"Next drop at {next_drop_formatted}")
-
-                        await drop_message.edit(embed=embed)
-
-                        await channel.send(f"🎉 Congratulations {user.mention}! You won {coin_amount} coins! 🎉")
-                        
-                        logger.info(f"Coin drop claimed by {user.id} ({user.display_name}) for {coin_amount} coins")
-                    
-                    except asyncio.TimeoutError:
-
-                        embed.title = "💰 Coin Drop Expired!"
-                        embed.description = "No one claimed the coins in time."
-                        embed.color = discord.Color.red()
-                        embed.set_footer(text=f"Next drop at {next_drop_formatted}")
-                        
-                        await drop_message.edit(embed=embed)
-                        logger.info(f"Coin drop expired with no claims")
-
                 except asyncio.CancelledError:
                     logger.info(f"Coin drop task cancelled for guild {guild_id}")
                     settings.is_active = False
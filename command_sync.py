@@ -0,0 +1,91 @@
+import os
+import json
+import asyncio
+import hashlib
+import discord
+from logger import setup_logger
+from document_store import get_document_store
+
+logger = setup_logger('command_sync', 'bot.log')
+
+_sync_lock = asyncio.Lock()
+
+def command_tree_hash(tree, guild=None):
+    """Hash the commands a sync would upload for one scope.
+
+    Args:
+        tree (app_commands.CommandTree): The bot's command tree
+        guild (discord.abc.Snowflake): Guild scope, or None for the global commands
+
+    Returns:
+        tuple: (hex digest, number of commands)
+    """
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return digest, len(payload)
+
+def cap_global_commands(tree, limit):
+    """Remove the global slash commands past the first limit, in the order they were added.
+
+    Returns:
+        list: Names of the commands removed
+    """
+    removed = [command.name for command in tree.get_commands(type=discord.AppCommandType.chat_input)[limit:]]
+    for name in removed:
+        tree.remove_command(name)
+    return removed
+
+async def sync_commands(bot, guild_ids, force=None):
+    """Sync the global commands and each guild's commands, skipping scopes that haven't changed.
+
+    The hash of each scope's commands is stored in the command_sync collection
+    after a successful sync. A scope is synced again only when its hash differs,
+    so reconnects and restarts with the same commands make no sync requests.
+
+    Args:
+        bot (commands.Bot): The connected bot
+        guild_ids (list): IDs of the guilds to sync
+        force (bool): Sync every scope even if unchanged; defaults to the
+            FORCE_COMMAND_SYNC environment variable
+
+    Returns:
+        dict: 'synced' (scope -> commands synced), 'skipped' (scope -> commands)
+        and 'failed' (scope -> error message)
+    """
+    if force is None:
+        force = os.environ.get('FORCE_COMMAND_SYNC', '').lower() in ('1', 'true', 'yes')
+
+    hashes = get_document_store().collection('command_sync')
+    application_id = bot.application_id or bot.user.id
+    report = {'synced': {}, 'skipped': {}, 'failed': {}}
+
+    # on_ready can fire again while an earlier sync is still running
+    async with _sync_lock:
+        scopes = [('global', None)] + [(f"guild:{guild_id}", discord.Object(id=guild_id)) for guild_id in guild_ids]
+        for scope, guild in scopes:
+            key = f"{application_id}:{scope}"
+            digest, count = command_tree_hash(bot.tree, guild)
+            stored = hashes.get(key)
+            if not force and stored and stored.get('hash') == digest:
+                report['skipped'][scope] = count
+                continue
+
+            try:
+                synced = await bot.tree.sync(guild=guild)
+                hashes.put(key, {'hash': digest, 'commands': len(synced)})
+                report['synced'][scope] = len(synced)
+                logger.info(f"Synced {len(synced)} commands to {scope}")
+            except Exception as e:
+                report['failed'][scope] = str(e)
+                logger.error(f"Failed to sync commands to {scope}: {e}")
+
+    logger.info(
+        f"Command sync: {len(report['synced'])} scope(s) synced, {len(report['skipped'])} unchanged and skipped, "
+        f"{len(report['failed'])} failed"
+    )
+    if report['skipped']:
+        logger.info(f"Skipped unchanged scopes: {', '.join(report['skipped'])}")
+    return report
@@ -1,10 +1,11 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 import asyncio
 import datetime
 import logging
 from logger import setup_logger
+from scheduler import get_scheduler
 
 logger = setup_logger('countdown', 'bot.log')
 
@@ -14,73 +15,90 @@ class CountdownCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.countdowns = {}  # Dictionary to store active countdowns
-        self.check_countdowns.start()  # Start the task
+        self.scheduler = get_scheduler(bot)
+        self.scheduler.register('countdown', self.run_countdown)
+        self.load_countdowns()
         logger.info("Countdown cog initialized")
     
-    def cog_unload(self):
-        """Called when the cog is unloaded."""
-        self.check_countdowns.cancel()
+    def load_countdowns(self):
+        """Restore active countdowns from the scheduler after a restart."""
+        for job in self.scheduler.get_jobs('countdown'):
+            payload = job['payload']
+            self.countdowns[payload['channel_id']] = self._countdown_info(payload)
+        if self.countdowns:
+            logger.info(f"Restored {len(self.countdowns)} active countdowns")
     
-    @tasks.loop(seconds=30)
-    async def check_countdowns(self):
-        """Check active countdowns and send updates."""
-        if not self.countdowns:
-            return  # No countdowns to check
-        
+    @staticmethod
+    def _countdown_info(payload):
+        return {
+            'title': payload['title'],
+            'end_time': datetime.datetime.fromtimestamp(payload['end_time']),
+            'update_interval': datetime.timedelta(seconds=payload['update_interval']),
+            'created_by': payload['created_by']
+        }
+    
+    def start_countdown(self, channel_id, title, end_time, update_interval, created_by):
+        """Create a countdown in a channel, replacing any existing one."""
+        payload = {
+            'channel_id': channel_id,
+            'title': title,
+            'end_time': end_time.timestamp(),
+            'update_interval': update_interval.total_seconds(),
+            'created_by': created_by
+        }
+        self.countdowns[channel_id] = self._countdown_info(payload)
+        # The first update is sent straight away, like the original polling loop did
+        self.scheduler.schedule('countdown', f"countdown:{channel_id}", datetime.datetime.now().timestamp(), payload)
+    
+    def remove_countdown(self, channel_id):
+        """Stop a channel's countdown."""
+        self.countdowns.pop(channel_id, None)
+        self.scheduler.cancel(f"countdown:{channel_id}")
+    
+    async def run_countdown(self, job_id, payload):
+        """Send a countdown update, or the completion message once it ends, and schedule the next one."""
+        channel_id = payload['channel_id']
         now = datetime.datetime.now()
-        to_remove = []
-        
-        for channel_id, countdown_info in self.countdowns.items():
-            end_time = countdown_info['end_time']
-            update_interval = countdown_info['update_interval']
-            last_update = countdown_info.get('last_update')
+        end_time = datetime.datetime.fromtimestamp(payload['end_time'])
+        channel = self.bot.get_channel(channel_id)
 
-            if now >= end_time:
-                channel = self.bot.get_channel(channel_id)
-                if channel:
-                    try:
-                        await channel.send(f"🎯 **{countdown_info['title']} Countdown Complete!** ⏰")
-                        logger.info(f"Countdown '{countdown_info['title']}' completed in channel {channel_id}")
-                    except Exception as e:
-                        logger.error(f"Error sending countdown completion message: {e}")
-                to_remove.append(channel_id)
-                continue
+        if now >= end_time:
+            self.countdowns.pop(channel_id, None)
+            if channel:
+                try:
+                    await channel.send(f"🎯 **{payload['title']} Countdown Complete!** ⏰")
+                    logger.info(f"Countdown '{payload['title']}' completed in channel {channel_id}")
+                except Exception as e:
+                    logger.error(f"Error sending countdown completion message: {e}")
+            return
 
-            if not last_update or (now - last_update).total_seconds() >= update_interval.total_seconds():
-                channel = self.bot.get_channel(channel_id)
-                if channel:
-                    remaining = end_time - now
-                    days, seconds = remaining.days, remaining.seconds
-                    hours = seconds // 3600
-                    minutes = (seconds % 3600) // 60
-                    seconds = seconds % 60
-                    
-                    time_str = []
-                    if days > 0:
-                        time_str.append(f"{days} day{'s' if days != 1 else ''}")
-                    if hours > 0:
-                        time_str.append(f"{hours} hour{'s' if hours != 1 else ''}")
-                    if minutes > 0:
-                        time_str.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
-                    if seconds > 0 and days == 0 and hours == 0:  # Only show seconds if less than an hour left
-                        time_str.append(f"{seconds} second{'s' if seconds != 1 else ''}")
-                    
-                    time_remaining = ", ".join(time_str)
-                    
-                    try:
-                        await channel.send(f"⏳ **{countdown_info['title']}** - Time remaining: **{time_remaining}**")
-                        countdown_info['last_update'] = now
-                        logger.info(f"Sent update for countdown '{countdown_info['title']}' in channel {channel_id}")
-                    except Exception as e:
-                        logger.error(f"Error sending countdown update message: {e}")
+        next_run = min(now.timestamp() + payload['update_interval'], payload['end_time'])
+        self.scheduler.schedule('countdown', job_id, next_run, payload)
 
-        for channel_id in to_remove:
-            del self.countdowns[channel_id]
-    
-    @check_countdowns.before_loop
-    async def before_check_countdowns(self):
-        """Wait until the bot is ready before starting the task."""
-        await self.bot.wait_until_ready()
+        if channel:
+            remaining = end_time - now
+            days, seconds = remaining.days, remaining.seconds
+            hours = seconds // 3600
+            minutes = (seconds % 3600) // 60
+            seconds = seconds % 60
+            
+            time_str = []
+            if days > 0:
+                time_str.append(f"{days} day{'s' if days != 1 else ''}")
+            if hours > 0:
+                time_str.append(f"{hours} hour{'s' if hours != 1 else ''}")
+            if minutes > 0:
+                time_str.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+            if seconds > 0 and days == 0 and hours == 0:  # Only show seconds if less than an hour left
+                time_str.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+            
+            time_remaining = ", ".join(time_str)
+            
+            try:
+                await channel.send(f"⏳ **{payload['title']}** - Time remaining: **{time_remaining}**")
+                logger.info(f"Sent update for countdown '{payload['title']}' in channel {channel_id}")
+            except Exception as e:
+                logger.error(f"Error sending countdown update message: {e}")
     
     @app_commands.command(name="countdown", description="Create a countdown timer or manage existing ones")
     async def countdown(self, interaction: discord.Interaction):
@@ -221,13 +239,13 @@ class CountdownModal(discord.ui.Modal):
 
             end_time = datetime.datetime.now() + duration_td
 
-            self.cog.countdowns[interaction.channel_id] = {
-                'title': self.title_input.value,
-                'end_time': end_time,
-                'update_interval': update_interval_td,
-                'created_by': interaction.user.id,
-                'last_update': None  # Will be set on first update
-            }
+            self.cog.start_countdown(
+                interaction.channel_id,
+                self.title_input.value,
+                end_time,
+                update_interval_td,
+                interaction.user.id
+            )
 
             await interaction.response.send_message(
                 f"✅ Countdown **{self.title_input.value}** created!\n"
@@ -268,7 +286,7 @@ class CountdownView(discord.ui.View):
             has_manage_permission = interaction.user.guild_permissions.manage_messages
             
             if is_creator or has_manage_permission:
-                del self.cog.countdowns[interaction.channel_id]
+                self.cog.remove_countdown(interaction.channel_id)
                 await interaction.response.send_message(f"✅ Countdown **{title}** has been removed!")
                 logger.info(f"Countdown '{title}' removed by {interaction.user} in channel {interaction.channel_id}")
             else:
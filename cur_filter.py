@@ -2,10 +2,11 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import random
-import json
-import os
+import asyncio
 import logging
 from logger import setup_logger
+from message_router import get_message_router
+from document_store import get_document_store
 
 logger = setup_logger('cur_filter')
 
@@ -15,31 +16,27 @@ class CurFilterCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.cur_users = set()  # Set to store user IDs who have the filter active
+        self.cur_store = get_document_store().collection(
+            'cur_users', legacy_file='data/cur_users.json',
+            legacy_transform=lambda users: {str(user_id): True for user_id in users}
+        )
         self.load_cur_users()
+        self.webhooks = {}  # channel_id -> the bot's webhook in that channel
+        self.webhook_locks = {}  # channel_id -> lock so concurrent messages don't create duplicate webhooks
+        get_message_router(bot).subscribe('cur_filter', self.handle_message, users=lambda: self.cur_users)
+    
+    def cog_unload(self):
+        """Stop receiving messages when the cog is unloaded"""
+        get_message_router(self.bot).unsubscribe('cur_filter')
     
     def load_cur_users(self):
-        """Load the list of users with active cur filter from file"""
+        """Load the users with active cur filter from the document store"""
         try:
-            if os.path.exists('data/cur_users.json'):
-                with open('data/cur_users.json', 'r') as f:
-                    users = json.load(f)
-                    self.cur_users = set(users)
-                    logger.info(f"Loaded {len(self.cur_users)} users with active cur filter")
+            self.cur_users = {int(user_id) for user_id in self.cur_store.all()}
+            logger.info(f"Loaded {len(self.cur_users)} users with active cur filter")
         except Exception as e:
             logger.error(f"Error loading cur users: {e}")
     
-    def save_cur_users(self):
-        """Save the list of users with active cur filter to file"""
-        try:
-
-            os.makedirs('data', exist_ok=True)
-            
-            with open('data/cur_users.json', 'w') as f:
-                json.dump(list(self.cur_users), f)
-                logger.info(f"Saved {len(self.cur_users)} users with active cur filter")
-        except Exception as e:
-            logger.error(f"Error saving cur users: {e}")
-    
     @app_commands.command(name="cur", description="Activate the cur filter on your messages")
     async def cur(self, interaction: discord.Interaction):
         """Activate the cur filter for the user"""
@@ -50,7 +47,7 @@ class CurFilterCog(commands.Cog):
             return
         
         self.cur_users.add(user_id)
-        self.save_cur_users()
+        self.cur_store.put(user_id, True)
         
         await interaction.response.send_message("✅ Cur filter activated! Your messages will now be curified.", ephemeral=True)
         logger.info(f"User {user_id} activated cur filter")
@@ -65,7 +62,7 @@ class CurFilterCog(commands.Cog):
             return
         
         self.cur_users.remove(user_id)
-        self.save_cur_users()
+        self.cur_store.delete(user_id)
         
         await interaction.response.send_message("✅ Cur filter deactivated! Your messages will now be normal.", ephemeral=True)
         logger.info(f"User {user_id} deactivated cur filter")
@@ -80,39 +77,62 @@ class CurFilterCog(commands.Cog):
                 result += char  # Keep spaces, punctuation, etc.
         return result
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Process messages and apply the cur filter if needed"""
+    async def get_webhook(self, channel):
+        """Get the bot's webhook for a channel, looking it up or creating it only on first use"""
+        webhook = self.webhooks.get(channel.id)
+        if webhook is not None:
+            return webhook
 
-        if message.author.bot:
-            return
+        lock = self.webhook_locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            webhook = self.webhooks.get(channel.id)
+            if webhook is not None:
+                return webhook
 
-        if message.author.id in self.cur_users:
+            for existing_webhook in await channel.webhooks():
+                if existing_webhook.user and existing_webhook.user.id == self.bot.user.id and existing_webhook.token:
+                    webhook = existing_webhook
+                    break
+            
+            if webhook is None:
+                webhook = await channel.create_webhook(name="CurFilter")
+                logger.info(f"Created cur filter webhook in {channel.id}")
+
+            self.webhooks[channel.id] = webhook
+            return webhook
 
-            try:
-                await message.delete()
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel):
+        """Forget the cached webhook when a channel's webhooks change"""
+        self.webhooks.pop(channel.id, None)
 
-                webhook = None
-                for existing_webhook in await message.channel.webhooks():
-                    if existing_webhook.user.id == self.bot.user.id:
-                        webhook = existing_webhook
-                        break
-                
-                if webhook is None:
-                    webhook = await message.channel.create_webhook(name="CurFilter")
+    async def handle_message(self, message):
+        """Apply the cur filter to a message from a filtered user"""
 
-                curified_text = self.curify_message(message.content)
+        try:
+            await message.delete()
 
-                await webhook.send(
-                    content=curified_text,
-                    username=message.author.display_name,
-                    avatar_url=message.author.display_avatar.url,
-                    allowed_mentions=discord.AllowedMentions.none()
-                )
-                
-                logger.debug(f"Curified message from {message.author.id} in {message.channel.id}")
-            except Exception as e:
-                logger.error(f"Error processing cur filter for message: {e}")
+            curified_text = self.curify_message(message.content)
+
+            for attempt in range(2):
+                webhook = await self.get_webhook(message.channel)
+                try:
+                    await webhook.send(
+                        content=curified_text,
+                        username=message.author.display_name,
+                        avatar_url=message.author.display_avatar.url,
+                        allowed_mentions=discord.AllowedMentions.none()
+                    )
+                    break
+                except discord.NotFound:
+                    # The webhook was deleted before on_webhooks_update arrived; look it up again once
+                    self.webhooks.pop(message.channel.id, None)
+                    if attempt:
+                        raise
+            
+            logger.debug(f"Curified message from {message.author.id} in {message.channel.id}")
+        except Exception as e:
+            logger.error(f"Error processing cur filter for message: {e}")
 
 async def setup(bot):
     """Add the cur filter cog to the bot"""
@@ -1,215 +1,413 @@
 import sqlite3
 import os
+import logging
 import time
 import datetime
-from logger import setup_logger
+import threading
+from logger import setup_logger, HOT_PATH_RATE_LIMIT
+from rank_index import get_rank_index
+from level_curve import get_level_curve
+from rewards import CoinSource, get_reward_policy
 
-logger = setup_logger('database')
+logger = setup_logger('database', rate_limit=HOT_PATH_RATE_LIMIT)
 
-class Database:
-    def __init__(self, db_name='data/leveling.db'):
-        """Initialize the database connection."""
+# Connection settings applied to every leveling.db connection. WAL lets readers run
+# while a write is in progress, and synchronous=NORMAL is safe with WAL while avoiding
+# an fsync on every commit.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # milliseconds to wait for a lock before failing
+    'cache_size': -16000,  # negative values are KiB, so 16 MB of page cache
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY'
+}
 
-        self.db_path = db_name
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+def tune_connection(conn):
+    """Apply the standard performance pragmas to an SQLite connection."""
+    for pragma, value in SQLITE_PRAGMAS.items():
+        try:
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        except sqlite3.Error as e:
+            logger.error(f"Error setting PRAGMA {pragma}: {e}")
+    return conn
 
-        self._create_tables()
+# How each imported column is combined with an existing user row by Database.import_users.
+# Level and XP are merged as total XP before the upsert (see Database._merge_progress), so the
+# stored XP always belongs to the stored level.
+IMPORT_MERGE_POLICIES = {
+    'overwrite': {
+        'coins': 'excluded.coins',
+        'prestige': 'excluded.prestige'
+    },
+    'max': {
+        'coins': 'MAX(users.coins, excluded.coins)',
+        'prestige': 'MAX(users.prestige, excluded.prestige)'
+    },
+    'sum': {
+        'coins': 'users.coins + excluded.coins',
+        'prestige': 'MAX(users.prestige, excluded.prestige)'
+    }
+}
 
-        self.settings = self.get_settings()
-        
-        logger.info(f"Database initialized at {self.db_path}")
-    
-    def _create_tables(self):
-        """Create necessary tables if they don't exist."""
+# Columns that decide a user's position on the leaderboard
+RANK_COLUMNS = {'prestige', 'level', 'xp'}
 
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                xp INTEGER DEFAULT 0,
-                level INTEGER DEFAULT 1,
-                coins REAL DEFAULT 0,
-                prestige INTEGER DEFAULT 0,
-                last_xp_time INTEGER DEFAULT 0,
-                message_count INTEGER DEFAULT 0,
-                voice_minutes INTEGER DEFAULT 0,
-                boost_end_time INTEGER DEFAULT 0,
-                boost_multiplier REAL DEFAULT 1.0,
-                streaming_minutes INTEGER DEFAULT 0,
-                images_shared INTEGER DEFAULT 0
-            )
-        ''')
+DEFAULT_DB_PATH = 'data/leveling.db'
 
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                id INTEGER PRIMARY KEY,
-                xp_per_message INTEGER DEFAULT 15,
-                xp_multiplier REAL DEFAULT 1.0,
-                coins_per_level INTEGER DEFAULT 35,
-                xp_cooldown INTEGER DEFAULT 60,
-                base_xp_required INTEGER DEFAULT 75,
-                min_xp_per_message INTEGER DEFAULT 5,
-                max_xp_per_message INTEGER DEFAULT 15,
-                voice_active_xp INTEGER DEFAULT 2,
-                voice_inactive_xp INTEGER DEFAULT 1,
-                voice_active_coins REAL DEFAULT 1.0,
-                voice_inactive_coins REAL DEFAULT 0.5,
-                image_xp INTEGER DEFAULT 30,
-                streaming_xp INTEGER DEFAULT 5,
-                streaming_coins REAL DEFAULT 3.0,
-                xp_enabled INTEGER DEFAULT 1,
-                levels_per_prestige INTEGER DEFAULT 100,
-                max_prestige INTEGER DEFAULT 5,
-                prestige_coins INTEGER DEFAULT 2000,
-                prestige_boost_multiplier REAL DEFAULT 1.5,
-                prestige_boost_duration INTEGER DEFAULT 172800,
-                xp_cooldown_min INTEGER DEFAULT 5,
-                xp_cooldown_max INTEGER DEFAULT 10
-            )
-        ''')
+# Used for any setting missing from the settings row
+DEFAULT_SETTINGS = {
+    'xp_per_message': 15,
+    'xp_multiplier': 1.0,
+    'coins_per_level': 35,
+    'xp_cooldown': 60,
+    'base_xp_required': 75,
+    'xp_enabled': 1,
+    'min_xp_per_message': 5,
+    'max_xp_per_message': 15,
+    'voice_active_xp': 2,
+    'voice_inactive_xp': 1,
+    'voice_active_coins': 1.0,
+    'voice_inactive_coins': 0.5,
+    'image_xp': 30,
+    'streaming_xp': 5,
+    'streaming_coins': 3.0,
+    'levels_per_prestige': 100,
+    'max_prestige': 5,
+    'prestige_coins': 2000,
+    'prestige_boost_multiplier': 1.5,
+    'prestige_boost_duration': 172800,  # 48 hours in seconds
+    'xp_cooldown_min': 5,
+    'xp_cooldown_max': 10
+}
+
+def format_coins(coins):
+    """Round a coin balance to 2 decimal places, returning an int for whole amounts."""
+    coins = round(coins, 2)
+    if coins == int(coins):
+        coins = int(coins)
+    return coins
+
+def _add_missing_columns(conn, table, columns):
+    """Add columns that tables created by older versions of the bot don't have."""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for column_name, column_def in columns.items():
+        if column_name not in existing:
+            logger.info(f"Adding {column_name} column to {table} table")
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column_name} {column_def}')
+
+def _migrate_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            xp INTEGER DEFAULT 0,
+            level INTEGER DEFAULT 1,
+            coins REAL DEFAULT 0,
+            prestige INTEGER DEFAULT 0,
+            last_xp_time INTEGER DEFAULT 0,
+            message_count INTEGER DEFAULT 0,
+            voice_minutes INTEGER DEFAULT 0,
+            boost_end_time INTEGER DEFAULT 0,
+            boost_multiplier REAL DEFAULT 1.0,
+            streaming_minutes INTEGER DEFAULT 0,
+            images_shared INTEGER DEFAULT 0
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY,
+            xp_per_message INTEGER DEFAULT 15,
+            xp_multiplier REAL DEFAULT 1.0,
+            coins_per_level INTEGER DEFAULT 35,
+            xp_cooldown INTEGER DEFAULT 60,
+            base_xp_required INTEGER DEFAULT 75,
+            min_xp_per_message INTEGER DEFAULT 5,
+            max_xp_per_message INTEGER DEFAULT 15,
+            voice_active_xp INTEGER DEFAULT 2,
+            voice_inactive_xp INTEGER DEFAULT 1,
+            voice_active_coins REAL DEFAULT 1.0,
+            voice_inactive_coins REAL DEFAULT 0.5,
+            image_xp INTEGER DEFAULT 30,
+            streaming_xp INTEGER DEFAULT 5,
+            streaming_coins REAL DEFAULT 3.0,
+            xp_enabled INTEGER DEFAULT 1,
+            levels_per_prestige INTEGER DEFAULT 100,
+            max_prestige INTEGER DEFAULT 5,
+            prestige_coins INTEGER DEFAULT 2000,
+            prestige_boost_multiplier REAL DEFAULT 1.5,
+            prestige_boost_duration INTEGER DEFAULT 172800,
+            xp_cooldown_min INTEGER DEFAULT 5,
+            xp_cooldown_max INTEGER DEFAULT 10
+        )
+    ''')
+
+    # Databases created before schema versioning may be missing later columns
+    _add_missing_columns(conn, 'settings', {
+        'min_xp_per_message': 'INTEGER DEFAULT 5',
+        'max_xp_per_message': 'INTEGER DEFAULT 15',
+        'xp_enabled': 'INTEGER DEFAULT 1',
+        'voice_active_xp': 'INTEGER DEFAULT 2',
+        'voice_inactive_xp': 'INTEGER DEFAULT 1',
+        'voice_active_coins': 'REAL DEFAULT 1.0',
+        'voice_inactive_coins': 'REAL DEFAULT 0.5',
+        'image_xp': 'INTEGER DEFAULT 30',
+        'streaming_xp': 'INTEGER DEFAULT 5',
+        'streaming_coins': 'REAL DEFAULT 3.0',
+        'levels_per_prestige': 'INTEGER DEFAULT 100',
+        'max_prestige': 'INTEGER DEFAULT 5',
+        'prestige_coins': 'INTEGER DEFAULT 2000',
+        'prestige_boost_multiplier': 'REAL DEFAULT 1.5',
+        'prestige_boost_duration': 'INTEGER DEFAULT 172800',
+        'xp_cooldown_min': 'INTEGER DEFAULT 5',
+        'xp_cooldown_max': 'INTEGER DEFAULT 10'
+    })
+    _add_missing_columns(conn, 'users', {
+        'message_count': 'INTEGER DEFAULT 0',
+        'voice_minutes': 'INTEGER DEFAULT 0',
+        'boost_end_time': 'INTEGER DEFAULT 0',
+        'boost_multiplier': 'REAL DEFAULT 1.0',
+        'streaming_minutes': 'INTEGER DEFAULT 0',
+        'images_shared': 'INTEGER DEFAULT 0'
+    })
+
+    conn.execute('''
+        INSERT OR IGNORE INTO settings (
+            id, xp_per_message, xp_multiplier, coins_per_level, 
+            xp_cooldown, base_xp_required, min_xp_per_message, max_xp_per_message
+        )
+        VALUES (1, 15, 1.0, 35, 60, 75, 5, 15)
+    ''')
+
+def _migrate_xp_defaults(conn):
+    conn.execute('''
+        UPDATE settings 
+        SET base_xp_required = 75,
+            min_xp_per_message = 5,
+            max_xp_per_message = 15,
+            coins_per_level = 35
+        WHERE id = 1
+    ''')
+
+def _migrate_leaderboard_index(conn):
+    # Covering index for get_leaderboard so the top users are read in index order
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_leaderboard
+        ON users (prestige DESC, level DESC, xp DESC, user_id, username, coins)
+    ''')
+
+def _migrate_coin_ledger(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS coin_ledger (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            delta REAL NOT NULL,
+            source TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_coin_ledger_user ON coin_ledger (user_id, entry_id)')
+    # Covers get_coin_flows so per-source totals don't read the table rows
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_coin_ledger_source ON coin_ledger (source, created_at, delta)')
+
+    # Opening balances, so each user's entries add up to their balance
+    conn.execute('''
+        INSERT INTO coin_ledger (user_id, delta, source, created_at)
+        SELECT user_id, coins, 'opening_balance', ? FROM users WHERE coins != 0
+    ''', (time.time(),))
+
+def _migrate_drops(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drops (
+            drop_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            message_id INTEGER,
+            coins INTEGER NOT NULL DEFAULT 0,
+            xp INTEGER NOT NULL DEFAULT 0,
+            max_claims INTEGER NOT NULL DEFAULT 1,
+            claim_count INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'open',
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_drops_message ON drops (message_id) WHERE message_id IS NOT NULL')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_drops_open ON drops (kind) WHERE status = 'open'")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drop_claims (
+            drop_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            coins INTEGER NOT NULL,
+            xp INTEGER NOT NULL,
+            claimed_at REAL NOT NULL,
+            PRIMARY KEY (drop_id, user_id)
+        )
+    ''')
+
+def _migrate_drop_modes(conn):
+    # 'single' drops are claimed one click at a time; 'rain' drops collect claimants and pay them together
+    _add_missing_columns(conn, 'drops', {'mode': "TEXT NOT NULL DEFAULT 'single'"})
+
+def _migrate_drop_payouts(conn):
+    # Rain claimants are stored unpaid first, so a settlement that fails part way can be resumed
+    _add_missing_columns(conn, 'drop_claims', {'paid': 'INTEGER NOT NULL DEFAULT 1'})
+
+# Schema changes to leveling.db, applied in order by run_migrations. Add a new
+# entry for each change rather than editing an existing one.
+SCHEMA_MIGRATIONS = [
+    (1, 'Create users and settings tables', _migrate_base_tables),
+    (2, 'Apply current XP and coin defaults', _migrate_xp_defaults),
+    (3, 'Add leaderboard covering index', _migrate_leaderboard_index),
+    (4, 'Add coin ledger', _migrate_coin_ledger),
+    (5, 'Add drops and drop claims', _migrate_drops),
+    (6, 'Add drop modes', _migrate_drop_modes),
+    (7, 'Track unpaid rain drop claims', _migrate_drop_payouts)
+]
+
+def get_schema_version(conn):
+    """Get the schema version of a leveling.db connection, 0 if it has never been migrated."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at REAL NOT NULL
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
 
+def run_migrations(conn):
+    """Apply the schema migrations a leveling.db connection hasn't had yet.
+
+    Each migration runs in its own transaction together with its schema_version
+    row, so a failed migration is rolled back and retried on the next start.
+
+    Returns:
+        int: The schema version after migrating
+    """
+    version = get_schema_version(conn)
+    conn.commit()
+
+    for migration_version, description, migrate in SCHEMA_MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            # Check for and add missing columns in settings table
-            self.cursor.execute('PRAGMA table_info(settings)')
-            settings_columns = [column[1] for column in self.cursor.fetchall()]
-
-            new_settings_columns = {
-                'voice_active_xp': 'INTEGER DEFAULT 2',
-                'voice_inactive_xp': 'INTEGER DEFAULT 1',
-                'voice_active_coins': 'REAL DEFAULT 1.0',
-                'voice_inactive_coins': 'REAL DEFAULT 0.5',
-                'image_xp': 'INTEGER DEFAULT 30',
-                'streaming_xp': 'INTEGER DEFAULT 5',
-                'streaming_coins': 'REAL DEFAULT 3.0',
-                'levels_per_prestige': 'INTEGER DEFAULT 100',
-                'max_prestige': 'INTEGER DEFAULT 5', 
-                'prestige_coins': 'INTEGER DEFAULT 2000',
-                'prestige_boost_multiplier': 'REAL DEFAULT 1.5',
-                'prestige_boost_duration': 'INTEGER DEFAULT 172800',
-                'xp_cooldown_min': 'INTEGER DEFAULT 5',
-                'xp_cooldown_max': 'INTEGER DEFAULT 10'
-            }
+            # Another process may have applied it while this one waited for the lock
+            if get_schema_version(conn) < migration_version:
+                logger.info(f"Applying schema migration {migration_version}: {description}")
+                migrate(conn)
+                conn.execute(
+                    'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                    (migration_version, description, time.time())
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Schema migration {migration_version} failed", exc_info=True)
+            raise
+        version = migration_version
 
-            for column_name, column_def in new_settings_columns.items():
-                if column_name not in settings_columns:
-                    logger.info(f"Adding {column_name} column to settings table")
-                    self.cursor.execute(f'ALTER TABLE settings ADD COLUMN {column_name} {column_def}')
-
-            # Check for and add missing columns in users table
-            self.cursor.execute('PRAGMA table_info(users)')
-            users_columns = [column[1] for column in self.cursor.fetchall()]
-
-            new_users_columns = {
-                'voice_minutes': 'INTEGER DEFAULT 0',
-                'boost_end_time': 'INTEGER DEFAULT 0',
-                'boost_multiplier': 'REAL DEFAULT 1.0',
-                'streaming_minutes': 'INTEGER DEFAULT 0',
-                'images_shared': 'INTEGER DEFAULT 0'
-            }
+    return version
 
-            for column_name, column_def in new_users_columns.items():
-                if column_name not in users_columns:
-                    logger.info(f"Adding {column_name} column to users table")
-                    self.cursor.execute(f'ALTER TABLE users ADD COLUMN {column_name} {column_def}')
+class SettingsCache:
+    """
+    The settings row for one database file, shared by every Database connected to it.
+    The version increases on each change and subscribers are called with the new
+    settings, so cogs never keep a stale copy and don't need to re-query the row.
+    """
 
-            # Update default settings
-            self.cursor.execute('''
-                UPDATE settings 
-                SET base_xp_required = 75,
-                    min_xp_per_message = 5,
-                    max_xp_per_message = 15,
-                    coins_per_level = 35
-                WHERE id = 1 AND 
-                    (base_xp_required != 75 OR 
-                     min_xp_per_message != 5 OR 
-                     max_xp_per_message != 15 OR
-                     coins_per_level != 35)
-            ''')
-                
-        except Exception as e:
-            logger.error(f"Error checking/adding columns to database tables: {e}")
+    def __init__(self):
+        self.settings = None
+        self.version = 0
+        self.subscribers = []
 
-        self.cursor.execute('''
-            INSERT OR IGNORE INTO settings (
-                id, xp_per_message, xp_multiplier, coins_per_level, 
-                xp_cooldown, base_xp_required, min_xp_per_message, max_xp_per_message
-            )
-            VALUES (1, 15, 1.0, 35, 60, 75, 5, 15)
-        ''')
+    def set(self, settings):
+        """Replace the cached settings and notify subscribers."""
+        self.settings = settings
+        self.version += 1
+        for callback in list(self.subscribers):
+            try:
+                callback(dict(settings), self.version)
+            except Exception as e:
+                logger.error(f"Error in settings subscriber: {e}")
+
+    def subscribe(self, callback):
+        """Call callback(settings, version) whenever the settings change."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop notifying a callback about settings changes."""
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+_settings_caches = {}
+_initialized_paths = set()  # Database files whose schema has been created/migrated in this process
+_shared_databases = {}
+_registry_lock = threading.RLock()  # get_database() holds it while Database.__init__ takes it again
+
+def get_database(db_name=DEFAULT_DB_PATH):
+    """Get the process-wide Database for a file, creating it on first use.
+
+    Cogs share this instance, so there is one connection to leveling.db in the bot
+    and one copy of its settings. Use Database() directly only where a separate
+    connection is needed, e.g. from another thread.
+    """
+    key = os.path.abspath(db_name)
+    with _registry_lock:
+        database = _shared_databases.get(key)
+        if database is None:
+            database = Database(db_name)
+            _shared_databases[key] = database
+        return database
+
+class Database:
+    def __init__(self, db_name=DEFAULT_DB_PATH):
+        """Initialize the database connection."""
+
+        self.db_path = db_name
+        self.conn = tune_connection(sqlite3.connect(self.db_path))
+        self.cursor = self.conn.cursor()
+        # Rows from this cursor are looked up by column name, so reads don't depend on column order
+        self.row_cursor = self.conn.cursor()
+        self.row_cursor.row_factory = sqlite3.Row
+        key = os.path.abspath(self.db_path)
+        self.rank_index = get_rank_index(key)
+
+        # Schema migrations only need to run once per file per process
+        with _registry_lock:
+            if key not in _initialized_paths:
+                run_migrations(self.conn)
+                _initialized_paths.add(key)
+            self.settings_cache = _settings_caches.setdefault(key, SettingsCache())
+
+        if self.settings_cache.settings is None:
+            self.settings_cache.set(self._read_settings())
         
-        self.conn.commit()
-        logger.debug("Database tables created/verified")
+        logger.info(f"Database initialized at {self.db_path}")
+
+    @property
+    def settings(self):
+        """The cached settings row. Treat as read-only; change settings with update_settings."""
+        return self.settings_cache.settings
     
     def get_settings(self):
-        """Get leveling system settings."""
-        self.cursor.execute('SELECT * FROM settings WHERE id = 1')
-        result = self.cursor.fetchone()
-        
-        if result:
-            columns = [column[0] for column in self.cursor.description]
-            
-            # Default fallback settings
-            settings = {
-                'xp_per_message': 15,
-                'xp_multiplier': 1.0,
-                'coins_per_level': 35,
-                'xp_cooldown': 60,
-                'base_xp_required': 75,
-                'xp_enabled': 1,
-                'min_xp_per_message': 5,
-                'max_xp_per_message': 15,
-                'voice_active_xp': 2,
-                'voice_inactive_xp': 1,
-                'voice_active_coins': 1.0,
-                'voice_inactive_coins': 0.5,
-                'image_xp': 30,
-                'streaming_xp': 5,
-                'streaming_coins': 3.0,
-                'levels_per_prestige': 100,
-                'max_prestige': 5,
-                'prestige_coins': 2000,
-                'prestige_boost_multiplier': 1.5,
-                'prestige_boost_duration': 172800,  # 48 hours in seconds
-                'xp_cooldown_min': 5,
-                'xp_cooldown_max': 10
-            }
+        """Get a copy of the leveling system settings from the shared cache."""
+        return dict(self.settings)
 
-            # Populate settings from database result
-            try:
-                for i, column_name in enumerate(columns):
-                    if i < len(result):
-                        settings[column_name] = result[i]
-            except Exception as e:
-                logger.error(f"Error mapping settings from database: {e}")
-            
-            return settings
+    def _read_settings(self):
+        """Read the leveling system settings from the database."""
+        row = self.row_cursor.execute('SELECT * FROM settings WHERE id = 1').fetchone()
+
+        settings = dict(DEFAULT_SETTINGS)
+        if row:
+            settings.update(row)
         else:
             logger.error("Settings not found in database!")
-            return {
-                'xp_per_message': 15,
-                'xp_multiplier': 1.0,
-                'coins_per_level': 35,
-                'xp_cooldown': 60,
-                'base_xp_required': 75,
-                'xp_enabled': 1,
-                'min_xp_per_message': 5,
-                'max_xp_per_message': 15,
-                'voice_active_xp': 2,
-                'voice_inactive_xp': 1,
-                'voice_active_coins': 1.0,
-                'voice_inactive_coins': 0.5,
-                'image_xp': 30,
-                'streaming_xp': 5,
-                'streaming_coins': 3.0,
-                'levels_per_prestige': 100,
-                'max_prestige': 5,
-                'prestige_coins': 2000,
-                'prestige_boost_multiplier': 1.5,
-                'prestige_boost_duration': 172800,  # 48 hours in seconds
-                'xp_cooldown_min': 5,
-                'xp_cooldown_max': 10
-            }
+        return settings
     
     def update_settings(self, settings_dict):
         """Update leveling system settings."""
@@ -257,57 +455,18 @@ class Database:
             ))
         
         self.conn.commit()
-        self.settings = self.get_settings()
+        self.settings_cache.set(self._read_settings())
         logger.info(f"Settings updated: {settings_dict}")
-        return self.settings
+        return self.get_settings()
     
     def get_user(self, user_id):
-        """Get user data, create if not exists."""
-        self.cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = self.cursor.fetchone()
-        
-        if not user:
+        """Get user data, or None if the user doesn't exist."""
+        row = self.row_cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        if not row:
             return None
 
-        # Format coins nicely
-        coins = round(user[4], 2)
-        if coins == int(coins):
-            coins = int(coins)
-            
-        # Get column names for safe mapping
-        columns = [column[0] for column in self.cursor.description]
-        
-        # Create base user data
-        user_data = {
-            'user_id': user[0],
-            'username': user[1],
-            'xp': user[2],
-            'level': user[3],
-            'coins': coins,
-            'prestige': user[5],
-            'last_xp_time': user[6],
-            'message_count': 0,
-            'voice_minutes': 0,
-            'boost_end_time': 0,
-            'boost_multiplier': 1.0,
-            'streaming_minutes': 0,
-            'images_shared': 0
-        }
-        
-        # Add additional fields if they exist in the database
-        additional_fields = {
-            'message_count': 7,
-            'voice_minutes': 8,
-            'boost_end_time': 9,
-            'boost_multiplier': 10,
-            'streaming_minutes': 11,
-            'images_shared': 12
-        }
-        
-        for field_name, index in additional_fields.items():
-            if len(user) > index:
-                user_data[field_name] = user[index]
-                
+        user_data = dict(row)
+        user_data['coins'] = format_coins(row['coins'])
         return user_data
     
     def create_user(self, user_id, username):
@@ -320,6 +479,7 @@ class Database:
             (user_id, username)
         )
         self.conn.commit()
+        self._update_rank_index(user_id)
         return self.get_user(user_id)
     
     def get_or_create_user(self, user_id, username):
@@ -366,8 +526,117 @@ class Database:
 
         query = f"UPDATE users SET {', '.join(set_clauses)} WHERE user_id = ?"
         self.cursor.execute(query, params)
+        if 'coins' in data:
+            self._reconcile_coin_ledger(CoinSource.ADJUSTMENT, [user_id])
         self.conn.commit()
+
+        if RANK_COLUMNS & data.keys():
+            self._update_rank_index(user_id)
+    
+    def import_users(self, records, merge_policy='overwrite', chunk_size=500):
+        """Bulk insert or merge user records in a single transaction.
+        
+        Args:
+            records (iterable): Dicts with user_id and optional username, xp, level, coins, prestige
+            merge_policy (str): How to combine with existing users - 'overwrite' replaces the
+                stored values, 'max' keeps the higher total XP, coins and prestige, 'sum' adds
+                total XP and coins and keeps the higher prestige
+            chunk_size (int): Number of records sent to SQLite per executemany call
+            
+        Returns:
+            tuple: (imported_count, skipped_count)
+        """
+        if merge_policy not in IMPORT_MERGE_POLICIES:
+            raise ValueError(f"Unknown merge policy '{merge_policy}'. Use one of: {', '.join(IMPORT_MERGE_POLICIES)}")
+
+        merge = IMPORT_MERGE_POLICIES[merge_policy]
+        query = f'''
+            INSERT INTO users (user_id, username, xp, level, coins, prestige)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                xp = excluded.xp,
+                level = excluded.level,
+                coins = {merge['coins']},
+                prestige = {merge['prestige']}
+        '''
+
+        imported_count = 0
+        skipped_count = 0
+        chunk = []
+
+        try:
+            for record in records:
+                try:
+                    user_id = int(record['user_id'])
+                    chunk.append((
+                        user_id,
+                        record.get('username') or f"User_{user_id}",
+                        int(record.get('xp') or 0),
+                        int(record.get('level') or 1),
+                        record.get('coins') or 0,
+                        int(record.get('prestige') or 0)
+                    ))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Skipping invalid import record {record}: {e}")
+                    skipped_count += 1
+                    continue
+
+                if len(chunk) >= chunk_size:
+                    self._merge_progress(chunk, merge_policy)
+                    self.cursor.executemany(query, chunk)
+                    imported_count += len(chunk)
+                    chunk = []
+
+            if chunk:
+                self._merge_progress(chunk, merge_policy)
+                self.cursor.executemany(query, chunk)
+                imported_count += len(chunk)
+
+            self._reconcile_coin_ledger(CoinSource.IMPORT)
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error importing users, rolling back: {e}")
+            self.conn.rollback()
+            raise
+
+        # Rebuilt from the table on the next lookup rather than updated row by row
+        self.rank_index.invalidate()
+
+        logger.info(f"Imported {imported_count} users with '{merge_policy}' policy ({skipped_count} skipped)")
+        return imported_count, skipped_count
     
+    def _merge_progress(self, chunk, merge_policy):
+        """Merge each import row's level and XP with the stored user's as total XP, in place.
+
+        Args:
+            chunk (list): (user_id, username, xp, level, coins, prestige) rows for import_users
+            merge_policy (str): 'max' keeps the higher total XP, 'sum' adds them; 'overwrite'
+                leaves the rows as they are
+        """
+        if merge_policy == 'overwrite':
+            return
+
+        curve = self.level_curve
+        user_ids = list({row[0] for row in chunk})
+        stored = {}
+        for start in range(0, len(user_ids), 500):
+            batch = user_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(batch))
+            for user_id, level, xp in self.cursor.execute(
+                f'SELECT user_id, level, xp FROM users WHERE user_id IN ({placeholders})', batch
+            ):
+                stored[user_id] = curve.total_xp_for_level(level) + xp
+
+        for i, (user_id, username, xp, level, coins, prestige) in enumerate(chunk):
+            total = curve.total_xp_for_level(level) + xp
+            if user_id in stored:
+                total = max(total, stored[user_id]) if merge_policy == 'max' else total + stored[user_id]
+            # A user listed twice merges with the row before it, which the upsert stores first
+            stored[user_id] = total
+            level, xp = curve.level_from_total_xp(total)
+            chunk[i] = (user_id, username, xp, level, coins, prestige)
+
     def get_user_perk_boosts(self, user_id):
         """Get a user's active perk boosts from the shop system.
         
@@ -430,11 +699,11 @@ class Database:
     def add_xp(self, user_id, username, xp_amount=None, xp_multiplier=1.0, coin_multiplier=1.0):
         """Add XP to a user and handle level ups. Also checks for and applies prestige boost."""
 
-        logger.info(f"add_xp called for {username} (ID: {user_id})")
+        logger.debug("add_xp called for %s (ID: %s)", username, user_id)
         
         # Check if XP gain is globally disabled
         if not self.settings.get('xp_enabled', 1):
-            logger.info("XP gain is disabled globally")
+            logger.debug("XP gain is disabled globally")
             return None, False, 0  # XP gain is disabled, no level up, 0 XP
             
         # Determine XP amount if not provided
@@ -445,12 +714,12 @@ class Database:
             if min_xp > 0 and max_xp > 0 and min_xp != max_xp:
                 import random
                 xp_amount = random.randint(min_xp, max_xp)
-                logger.info(f"Random XP amount generated: {xp_amount} (min: {min_xp}, max: {max_xp})")
+                logger.debug("Random XP amount generated: %s (min: %s, max: %s)", xp_amount, min_xp, max_xp)
             else:
                 xp_amount = self.settings['xp_per_message']
-                logger.info(f"Using fixed XP amount: {xp_amount}")
+                logger.debug("Using fixed XP amount: %s", xp_amount)
         else:
-            logger.info(f"Using provided XP amount: {xp_amount}")
+            logger.debug("Using provided XP amount: %s", xp_amount)
         
         user = self.get_or_create_user(user_id, username)
         if user is None:
@@ -469,14 +738,14 @@ class Database:
         if message_xp_boost > 1.0 or general_xp_boost > 1.0:
             old_multiplier = xp_multiplier
             xp_multiplier *= message_xp_boost * general_xp_boost
-            logger.info(f"Applied perk boosts: message_xp_boost={message_xp_boost}x, general_xp_boost={general_xp_boost}x")
-            logger.info(f"XP multiplier updated from {old_multiplier}x to {xp_multiplier}x")
+            logger.debug("Applied perk boosts: message_xp_boost=%sx, general_xp_boost=%sx", message_xp_boost, general_xp_boost)
+            logger.debug("XP multiplier updated from %sx to %sx", old_multiplier, xp_multiplier)
             
         # Apply coin boost to coin multiplier
-        if coin_boost > 1.0:
+        if coin_boost > 1.0 and get_reward_policy(CoinSource.LEVEL_UP).coin_boost:
             old_coin_multiplier = coin_multiplier
             coin_multiplier *= coin_boost
-            logger.info(f"Applied coin boost: {coin_boost}x (new multiplier: {coin_multiplier}x)")
+            logger.debug("Applied coin boost: %sx (new multiplier: %sx)", coin_boost, coin_multiplier)
         
         # Check if user has an active prestige boost
         boost_end_time = user.get('boost_end_time', 0)
@@ -484,77 +753,63 @@ class Database:
         has_active_boost = boost_end_time > current_time
         
         if has_active_boost:
-            logger.info(f"User {username} has active prestige boost! ({boost_multiplier}x XP boost until {datetime.datetime.fromtimestamp(boost_end_time).strftime('%Y-%m-%d %H:%M:%S')})")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("User %s has active prestige boost! (%sx XP boost until %s)", username, boost_multiplier,
+                             datetime.datetime.fromtimestamp(boost_end_time).strftime('%Y-%m-%d %H:%M:%S'))
             xp_multiplier *= boost_multiplier
-            logger.info(f"Updated XP multiplier with boost: {xp_multiplier}x")
+            logger.debug("Updated XP multiplier with boost: %sx", xp_multiplier)
         elif boost_end_time > 0 and boost_multiplier > 1.0:
             # Expired boost should be reset
             boost_multiplier = 1.0
             boost_end_time = 0
-            logger.info(f"User {username} had a boost but it expired. Resetting boost.")
+            logger.debug("User %s had a boost but it expired. Resetting boost.", username)
             self.cursor.execute('UPDATE users SET boost_multiplier = 1.0, boost_end_time = 0 WHERE user_id = ?', (user_id,))
             
         # Calculate final XP to add with all multipliers
         xp_to_add = round(xp_amount * xp_multiplier)
-        logger.info(f"XP to add after all multipliers: {xp_to_add}")
+        logger.debug("XP to add after all multipliers: %s", xp_to_add)
         
         # Check for cooldown
         last_xp_time = user.get('last_xp_time', 0)
         cooldown = self.settings['xp_cooldown']
         time_since_last_xp = current_time - last_xp_time
         
-        logger.info(f"Last XP time: {last_xp_time}, Current time: {current_time}, Cooldown: {cooldown}")
-        logger.info(f"Time since last XP: {time_since_last_xp} seconds")
+        logger.debug("Last XP time: %s, Current time: %s, Cooldown: %s", last_xp_time, current_time, cooldown)
+        logger.debug("Time since last XP: %s seconds", time_since_last_xp)
         
         if time_since_last_xp < cooldown:
-            logger.info(f"User is on cooldown. Needs to wait {cooldown - time_since_last_xp} more seconds")
+            logger.debug("User is on cooldown. Needs to wait %s more seconds", cooldown - time_since_last_xp)
+            # Keeps an expired boost reset, and doesn't leave its transaction open on the shared connection
+            self.conn.commit()
             return None, False, 0  # Still on cooldown, no level up, 0 XP
 
         # Update XP and message count
         new_xp = user['xp'] + xp_to_add
         new_message_count = user.get('message_count', 0) + 1
         
-        logger.info(f"Updating user {username} ({user_id}) - Current XP: {user['xp']}, Adding: {xp_to_add}, New XP: {new_xp}")
-        logger.info(f"Setting last_xp_time to {current_time} ({datetime.datetime.fromtimestamp(current_time).strftime('%Y-%m-%d %H:%M:%S')})")
+        logger.debug("Updating user %s (%s) - Current XP: %s, Adding: %s, New XP: %s", username, user_id, user['xp'], xp_to_add, new_xp)
         
         try:
             self.cursor.execute('UPDATE users SET xp = ?, last_xp_time = ?, message_count = ? WHERE user_id = ?', 
                               (new_xp, current_time, new_message_count, user_id))
-
-            self.cursor.execute('SELECT xp, last_xp_time FROM users WHERE user_id = ?', (user_id,))
-            verify_result = self.cursor.fetchone()
-            logger.info(f"Verification after update: XP = {verify_result[0]}, last_xp_time = {verify_result[1]}")
             
         except Exception as e:
             logger.error(f"Error updating user XP: {e}")
 
         # Check for level up
         current_level = user['level']
-        required_xp = self.calculate_required_xp(current_level)
-        
-        level_up = False
-        new_level = current_level
-        
-        # Handle level ups
-        while new_xp >= required_xp:
-            new_level += 1
-            new_xp -= required_xp
-            required_xp = self.calculate_required_xp(new_level)
-            level_up = True
+        new_level, new_xp = self.level_curve.add_xp(current_level, user['xp'], xp_to_add)
+        level_up = new_level > current_level
         
         if level_up:
             coins_to_add = round(self.settings['coins_per_level'] * (new_level - current_level) * coin_multiplier)
-            new_coins = user['coins'] + coins_to_add
             
             logger.info(f"Level up for {username}: Level {current_level} -> {new_level}, Coins: +{coins_to_add}")
             
             try:
-                self.cursor.execute('UPDATE users SET level = ?, xp = ?, coins = ? WHERE user_id = ?', 
-                                  (new_level, new_xp, new_coins, user_id))
-
-                self.cursor.execute('SELECT level, xp, coins FROM users WHERE user_id = ?', (user_id,))
-                verify_result = self.cursor.fetchone()
-                logger.info(f"Verification after level up: Level = {verify_result[0]}, XP = {verify_result[1]}, Coins = {verify_result[2]}")
+                self.cursor.execute('UPDATE users SET level = ?, xp = ? WHERE user_id = ?', 
+                                  (new_level, new_xp, user_id))
+                self._record_coin_changes([(user_id, coins_to_add, CoinSource.LEVEL_UP)])
                 
                 # Check if this level up makes the user eligible for prestige
                 levels_per_prestige = self.settings.get('levels_per_prestige', 100)
@@ -568,7 +823,7 @@ class Database:
         
         try:
             self.conn.commit()
-            logger.info(f"Database commit successful for user {username} ({user_id})")
+            logger.debug("Database commit successful for user %s (%s)", username, user_id)
         except Exception as e:
             logger.error(f"Error committing changes to database: {e}")
             try:
@@ -577,18 +832,26 @@ class Database:
             except Exception as e2:
                 logger.error(f"Error rolling back transaction: {e2}")
 
+        self._update_rank_index(user_id)
         updated_user = self.get_user(user_id)
         return updated_user, level_up, xp_to_add
     
-    def add_coins(self, user_id, username, amount):
-        """Add coins to a user. No coins are added if XP/coin gain is disabled and command is not /addcoin."""
+    def add_coins(self, user_id, username, amount, source):
+        """Add coins to a user, or remove them with a negative amount.
 
-        import traceback
-        call_stack = traceback.extract_stack()
-        is_addcoin_command = any('addcoin' in frame.name for frame in call_stack)
+        Args:
+            user_id (int): The user's Discord ID
+            username (str): The user's Discord username, used if the user has to be created
+            amount (float): Coins to add, rounded to a whole number
+            source (CoinSource): Why the coins changed. Its RewardPolicy decides whether
+                /xpstop blocks the change and whether the user's coin boost applies
 
-        if not is_addcoin_command and not self.settings.get('xp_enabled', 1):
-            logger.debug(f"Skipping coin addition for {username}: XP/coins gain is disabled globally")
+        Returns:
+            dict: The user's data after the change, unchanged if the change was blocked
+        """
+        amount = self._reward_amount(user_id, amount, source)
+        if amount is None:
+            logger.debug(f"Skipping {CoinSource(source).value} coins for {username}: XP/coins gain is disabled globally")
             return self.get_user(user_id)  # Return current user data without changes
             
         user = self.get_or_create_user(user_id, username)
@@ -597,15 +860,25 @@ class Database:
             return None
 
         rounded_amount = round(amount)
-        new_coins = user['coins'] + rounded_amount
-
-        source = "via /addcoin" if is_addcoin_command else "normal gain"
-        logger.debug(f"Adding {rounded_amount} coins to {username} ({user_id}) {source}")
+        logger.debug(f"Adding {rounded_amount} coins to {username} ({user_id}) via {CoinSource(source).value}")
         
-        self.cursor.execute('UPDATE users SET coins = ? WHERE user_id = ?', (new_coins, user_id))
+        self._record_coin_changes([(user_id, rounded_amount, source)])
         self.conn.commit()
         
         return self.get_user(user_id)
+
+    def _reward_amount(self, user_id, amount, source):
+        """Apply a coin source's RewardPolicy to an amount.
+
+        Returns:
+            float: The amount to add, or None if /xpstop blocks coins from this source
+        """
+        policy = get_reward_policy(source)
+        if not policy.ignores_xp_toggle and not self.settings.get('xp_enabled', 1):
+            return None
+        if policy.coin_boost and amount > 0:
+            amount *= self.get_user_perk_boosts(user_id).get('coins', 1.0)
+        return amount
     
     def prestige_user(self, user_id, username):
         """Prestige a user - reset level and xp, keep coins, increase prestige, and add XP boost."""
@@ -636,9 +909,6 @@ class Database:
         boost_multiplier = self.settings.get('prestige_boost_multiplier', 1.5)
         prestige_coins = self.settings.get('prestige_coins', 2000)
         
-        # Add prestige reward coins
-        new_coins = user['coins'] + prestige_coins
-        
         logger.info(f"User {username} ({user_id}) prestiging: Prestige {user['prestige']} -> {new_prestige}, +{prestige_coins} coins, {boost_multiplier}x XP boost for {boost_duration/3600} hours")
         
         self.cursor.execute('''
@@ -646,48 +916,84 @@ class Database:
             SET level = 1, 
                 xp = 0, 
                 prestige = ?,
-                coins = ?,
                 boost_end_time = ?,
                 boost_multiplier = ?
             WHERE user_id = ?
-        ''', (new_prestige, new_coins, boost_end_time, boost_multiplier, user_id))
+        ''', (new_prestige, boost_end_time, boost_multiplier, user_id))
+        self._record_coin_changes([(user_id, prestige_coins, CoinSource.PRESTIGE)])
         
         self.conn.commit()
+        self._update_rank_index(user_id)
         return True, self.get_user(user_id)
     
+    @property
+    def level_curve(self):
+        """The level curve for the current XP settings."""
+        return get_level_curve(self.settings['base_xp_required'])
+
     def calculate_required_xp(self, level):
         """Calculate XP required for a given level."""
-
-        base_xp = self.settings['base_xp_required']
-        return base_xp * level
+        return self.level_curve.required_xp(level)
     
     def get_leaderboard(self, limit=10):
         """Get the top users by level and XP."""
 
-        self.cursor.execute('''
+        self.row_cursor.execute('''
             SELECT user_id, username, xp, level, coins, prestige
             FROM users
-            ORDER BY prestige DESC, level DESC, xp DESC
+            ORDER BY prestige DESC, level DESC, xp DESC, user_id
             LIMIT ?
         ''', (limit,))
         
         result = []
-        for row in self.cursor.fetchall():
+        for row in self.row_cursor.fetchall():
+            entry = dict(row)
+            entry['coins'] = format_coins(row['coins'])
+            result.append(entry)
+        return result
+    
+    def _load_rank_index(self):
+        """Build the rank index from every user in the database."""
+        self.cursor.execute('SELECT user_id, prestige, level, xp FROM users')
+        self.rank_index.load(
+            (row[0], (row[1], row[2], row[3])) for row in self.cursor.fetchall()
+        )
 
-            coins = round(row[4], 2)
+    def _update_rank_index(self, user_id):
+        """Move a user to their current position in the rank index."""
+        if not self.rank_index.loaded:
+            return
 
-            if coins == int(coins):
-                coins = int(coins)
-                
-            result.append({
-                'user_id': row[0],
-                'username': row[1],
-                'xp': row[2],
-                'level': row[3],
-                'coins': coins,
-                'prestige': row[5]
-            })
-        return result
+        self.cursor.execute('SELECT prestige, level, xp FROM users WHERE user_id = ?', (user_id,))
+        row = self.cursor.fetchone()
+        if row:
+            self.rank_index.update(user_id, (row[0], row[1], row[2]))
+
+    def get_user_rank(self, user_id, by_xp=True):
+        """Get a user's leaderboard position.
+        
+        Args:
+            user_id (int): The user to look up
+            by_xp (bool): Rank by prestige, level and XP like the leaderboard, or by coins
+            
+        Returns:
+            int: 1-based rank, or None if the user doesn't exist
+        """
+        if by_xp:
+            if not self.rank_index.loaded:
+                self._load_rank_index()
+            return self.rank_index.get_rank(user_id)
+
+        self.cursor.execute('SELECT coins FROM users WHERE user_id = ?', (user_id,))
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+
+        self.cursor.execute('''
+            SELECT COUNT(*) + 1 FROM users
+            WHERE coins > ? OR (coins = ? AND user_id < ?)
+        ''', (row[0], row[0], user_id))
+        return self.cursor.fetchone()[0]
     
     def toggle_xp(self, enable=True):
         """Enable or disable XP and coin gain globally."""
@@ -695,66 +1001,435 @@ class Database:
         self.cursor.execute('UPDATE settings SET xp_enabled = ? WHERE id = 1', (1 if enable else 0,))
         self.conn.commit()
 
-        self.settings = self.get_settings()
+        self.settings_cache.set(self._read_settings())
         logger.info(f"XP and coin gain {'enabled' if enable else 'disabled'}")
-        return self.settings
+        return self.get_settings()
     
     def get_xp_status(self):
         """Get the current XP and coin gain status (enabled/disabled)."""
         return bool(self.settings.get('xp_enabled', 1))
     
-    def add_coins_simple(self, user_id, amount):
-        """Add coins to a user without additional validations.
-        Used for simple coin adjustments.
+    def add_coins_simple(self, user_id, amount, source):
+        """Add coins to an existing user without rounding them.
+        Returns False if the user doesn't exist or the source's RewardPolicy blocks the change.
         """
         if not user_id:
             logger.error("Cannot add coins: user_id is empty")
             return False
-            
-        user = self.get_user(user_id)
-        if not user:
+
+        if not self.get_user(user_id):
             logger.error(f"Failed to get user {user_id}")
             return False
 
-        new_coins = user['coins'] + amount
-        
-        logger.debug(f"Adding {amount} coins to user {user_id}. New balance: {new_coins}")
-        
+        amount = self._reward_amount(user_id, amount, source)
+        if amount is None:
+            logger.debug(f"Skipping {CoinSource(source).value} coins for user {user_id}: XP/coins gain is disabled globally")
+            return False
+
+        logger.debug(f"Adding {amount} coins to user {user_id} via {CoinSource(source).value}")
+
         try:
-            self.cursor.execute('UPDATE users SET coins = ? WHERE user_id = ?', (new_coins, user_id))
+            self._record_coin_changes([(user_id, amount, source)])
             self.conn.commit()
             return True
         except Exception as e:
+            self.conn.rollback()
             logger.error(f"Error adding coins to user {user_id}: {e}")
             return False
-            
-    def remove_coins(self, user_id, amount):
-        """Remove coins from a user."""
+
+    def remove_coins(self, user_id, amount, source):
+        """Remove coins from a user. Returns False without changes if they have fewer than amount."""
         if not user_id:
             logger.error("Cannot remove coins: user_id is empty")
             return False
-            
-        user = self.get_user(user_id)
-        if not user:
-            logger.error(f"Failed to get user {user_id}")
-            return False
-            
-        if user['coins'] < amount:
-            logger.debug(f"Insufficient coins: User {user_id} has {user['coins']} coins, but {amount} are needed")
-            return False
-            
-        new_coins = user['coins'] - amount
-        
-        logger.debug(f"Removing {amount} coins from user {user_id}. New balance: {new_coins}")
-        
+
+        # A savepoint, so a failure undoes only this deduction and not other writes pending on the shared connection
+        self.conn.execute('SAVEPOINT remove_coins')
         try:
-            self.cursor.execute('UPDATE users SET coins = ? WHERE user_id = ?', (new_coins, user_id))
+            # Checking and deducting in one statement stops two purchases spending the same coins
+            self.cursor.execute(
+                'UPDATE users SET coins = coins - ? WHERE user_id = ? AND coins >= ?',
+                (amount, user_id, amount)
+            )
+            if self.cursor.rowcount == 0:
+                self.conn.execute('RELEASE remove_coins')
+                logger.debug(f"Insufficient coins or unknown user: {amount} coins needed from user {user_id}")
+                return False
+
+            self._insert_coin_ledger([(user_id, -amount, source)])
+            self.conn.execute('RELEASE remove_coins')
             self.conn.commit()
+            logger.debug(f"Removed {amount} coins from user {user_id} via {CoinSource(source).value}")
             return True
         except Exception as e:
+            self.conn.execute('ROLLBACK TO remove_coins')
+            self.conn.execute('RELEASE remove_coins')
             logger.error(f"Error removing coins from user {user_id}: {e}")
             return False
-    
+
+    def apply_coin_changes(self, changes):
+        """Apply several coin changes in one transaction, e.g. for every winner of a drop.
+
+        Args:
+            changes (list): (user_id, delta, CoinSource) tuples; users that don't exist and
+                changes blocked by their source's RewardPolicy are skipped
+
+        Returns:
+            bool: True if the changes were committed
+        """
+        allowed = []
+        for user_id, delta, source in changes:
+            amount = self._reward_amount(user_id, delta, source)
+            if amount is not None:
+                allowed.append((user_id, amount, source))
+        changes = allowed
+        if not changes:
+            return True
+        try:
+            self._record_coin_changes(changes)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error applying {len(changes)} coin changes: {e}")
+            return False
+
+    def _record_coin_changes(self, changes):
+        """Change balances and write their ledger entries in the current transaction, without committing.
+
+        Balances are updated with coins = coins + delta rather than from a value read
+        earlier, so concurrent grants to the same user can't overwrite each other.
+        """
+        changes = [(user_id, delta, source) for user_id, delta, source in changes if delta]
+        self.cursor.executemany(
+            'UPDATE users SET coins = coins + ? WHERE user_id = ?',
+            [(delta, user_id) for user_id, delta, _ in changes]
+        )
+        self._insert_coin_ledger(changes)
+
+    def _insert_coin_ledger(self, changes):
+        now = time.time()
+        self.cursor.executemany('''
+            INSERT INTO coin_ledger (user_id, delta, source, created_at)
+            SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE user_id = ?)
+        ''', [(user_id, delta, CoinSource(source).value, now, user_id) for user_id, delta, source in changes])
+
+    def _reconcile_coin_ledger(self, source, user_ids=None):
+        """Write ledger entries for balances that were set directly, e.g. by an import,
+        so each user's entries still add up to their balance."""
+        where = ''
+        params = [CoinSource(source).value, time.time()]
+        if user_ids is not None:
+            where = f"WHERE users.user_id IN ({', '.join('?' for _ in user_ids)})"
+            params += list(user_ids)
+
+        self.cursor.execute(f'''
+            INSERT INTO coin_ledger (user_id, delta, source, created_at)
+            SELECT user_id, coins - ledger_total, ?, ? FROM (
+                SELECT users.user_id, users.coins,
+                       COALESCE((SELECT SUM(delta) FROM coin_ledger WHERE coin_ledger.user_id = users.user_id), 0) AS ledger_total
+                FROM users
+                {where}
+            )
+            WHERE ABS(coins - ledger_total) >= 0.005
+        ''', params)
+
+    def get_coin_history(self, user_id, limit=20):
+        """Get a user's most recent coin ledger entries, newest first.
+
+        Returns:
+            list: Dicts with entry_id, delta, source and created_at
+        """
+        self.row_cursor.execute('''
+            SELECT entry_id, delta, source, created_at FROM coin_ledger
+            WHERE user_id = ? ORDER BY entry_id DESC LIMIT ?
+        ''', (user_id, limit))
+        return [dict(row) for row in self.row_cursor.fetchall()]
+
+    def get_coin_flows(self, since=None):
+        """Get the coins added and removed per source, for economy analytics.
+
+        Args:
+            since (float): Only count entries from this Unix timestamp on
+
+        Returns:
+            list: Dicts with source, entries, added, removed and net, largest net first
+        """
+        self.row_cursor.execute('''
+            SELECT source,
+                   COUNT(*) AS entries,
+                   SUM(CASE WHEN delta > 0 THEN delta ELSE 0 END) AS added,
+                   SUM(CASE WHEN delta < 0 THEN -delta ELSE 0 END) AS removed,
+                   SUM(delta) AS net
+            FROM coin_ledger
+            WHERE created_at >= ?
+            GROUP BY source
+            ORDER BY net DESC
+        ''', (since or 0,))
+        return [dict(row) for row in self.row_cursor.fetchall()]
+
+    def create_drop(self, drop_id, kind, channel_id, coins, xp, max_claims, expires_at, guild_id=None, mode='single'):
+        """Store a new drop that can be claimed until expires_at.
+
+        For a 'rain' drop, coins and xp are shared by everyone paid with settle_drop.
+        """
+        self.cursor.execute('''
+            INSERT INTO drops (drop_id, kind, guild_id, channel_id, coins, xp, max_claims, created_at, expires_at, mode)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (drop_id, kind, guild_id, channel_id, coins, xp, max_claims, time.time(), expires_at, mode))
+        self.conn.commit()
+
+    def set_drop_message(self, drop_id, message_id):
+        """Record the message a drop was posted in, so its claim button can find it."""
+        self.cursor.execute('UPDATE drops SET message_id = ? WHERE drop_id = ?', (message_id, drop_id))
+        self.conn.commit()
+
+    def get_drop(self, drop_id=None, message_id=None):
+        """Get a drop by ID or by the message it was posted in, or None."""
+        if drop_id is not None:
+            row = self.row_cursor.execute('SELECT * FROM drops WHERE drop_id = ?', (drop_id,)).fetchone()
+        else:
+            row = self.row_cursor.execute('SELECT * FROM drops WHERE message_id = ?', (message_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_open_drops(self, kind=None):
+        """Get drops that can still be claimed, optionally only of one kind."""
+        if kind is None:
+            self.row_cursor.execute("SELECT * FROM drops WHERE status = 'open'")
+        else:
+            self.row_cursor.execute("SELECT * FROM drops WHERE status = 'open' AND kind = ?", (kind,))
+        return [dict(row) for row in self.row_cursor.fetchall()]
+
+    def _begin_immediate(self):
+        """Start a transaction that takes the write lock now.
+
+        BEGIN fails inside an open transaction, so writes another caller left
+        uncommitted on the shared connection are committed first.
+        """
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def claim_drop(self, drop_id, user_id, username):
+        """Claim a drop for a user and grant its reward in one transaction.
+
+        The claim only succeeds while the drop is open, unexpired, has claims left and
+        the user hasn't claimed it yet. Because the check and the claim are a single
+        UPDATE, the first claims win even when many arrive at once or after a restart.
+
+        Returns:
+            dict: status ('claimed', 'duplicate' or 'closed'), and for a claim the coins
+                and xp granted, level_before, level_after and whether the drop is now full
+        """
+        now = time.time()
+        try:
+            self._begin_immediate()
+            self.cursor.execute('''
+                UPDATE drops
+                SET claim_count = claim_count + 1,
+                    status = CASE WHEN claim_count + 1 >= max_claims THEN 'claimed' ELSE status END
+                WHERE drop_id = ? AND status = 'open' AND expires_at > ? AND claim_count < max_claims
+                    AND NOT EXISTS (SELECT 1 FROM drop_claims WHERE drop_id = ? AND user_id = ?)
+            ''', (drop_id, now, drop_id, user_id))
+
+            if self.cursor.rowcount == 0:
+                duplicate = self.cursor.execute(
+                    'SELECT 1 FROM drop_claims WHERE drop_id = ? AND user_id = ?', (drop_id, user_id)
+                ).fetchone()
+                self.conn.rollback()
+                return {'status': 'duplicate' if duplicate else 'closed'}
+
+            drop = self.row_cursor.execute(
+                'SELECT coins, xp, claim_count, max_claims FROM drops WHERE drop_id = ?', (drop_id,)
+            ).fetchone()
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO users (user_id, username, xp, level, coins, prestige, last_xp_time, message_count,
+                    voice_minutes, boost_end_time, boost_multiplier, streaming_minutes, images_shared)
+                VALUES (?, ?, 0, 1, 0, 0, 0, 0, 0, 0, 1.0, 0, 0)
+            ''', (user_id, username))
+
+            coins = self._reward_amount(user_id, drop['coins'], CoinSource.DROP) or 0
+            xp = drop['xp'] if self.settings.get('xp_enabled', 1) else 0
+            self._record_coin_changes([(user_id, round(coins), CoinSource.DROP)])
+            level_before, level_after = self._grant_xp(user_id, xp)
+
+            self.cursor.execute('''
+                INSERT INTO drop_claims (drop_id, user_id, coins, xp, claimed_at) VALUES (?, ?, ?, ?, ?)
+            ''', (drop_id, user_id, round(coins), xp, now))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        self._update_rank_index(user_id)
+        return {
+            'status': 'claimed',
+            'coins': round(coins),
+            'xp': xp,
+            'level_before': level_before,
+            'level_after': level_after,
+            'full': drop['claim_count'] >= drop['max_claims']
+        }
+
+    def settle_drop(self, drop_id, claimants=None, batch_size=500):
+        """Close a rain drop and pay everyone who joined it a share of its coins and XP.
+
+        The coins and XP are split evenly, and what doesn't divide evenly goes one
+        each to the earliest claimants. The first transaction closes the drop and
+        stores every claimant's share unpaid, so the drop can't be paid twice. The
+        shares are then paid batch_size at a time, each batch in one transaction, so
+        a large rain doesn't hold the database write lock for long. If a batch fails,
+        calling settle_drop again for the drop pays the claimants still unpaid.
+
+        Args:
+            drop_id (str): The drop
+            claimants (list): (user_id, username) tuples in the order they joined; not
+                needed to resume a settlement
+            batch_size (int): Claimants per transaction
+
+        Returns:
+            dict: status ('settled' or 'closed'), and when settled the number of claims,
+                the coins and xp each claimant got at least, coins_extra and xp_extra,
+                the number of claimants who got one more, and level_ups, a list of
+                (user_id, new_level) for the claimants paid by this call
+        """
+        drop = self.get_drop(drop_id)
+        if drop is None:
+            return {'status': 'closed'}
+
+        if drop['status'] == 'open':
+            if not claimants or not self._start_settlement(drop, claimants):
+                return {'status': 'closed'}
+        elif drop['status'] != 'settling':
+            return {'status': 'closed'}
+
+        level_ups = []
+        while True:
+            try:
+                self._begin_immediate()
+                batch = self.cursor.execute(
+                    'SELECT user_id, coins, xp FROM drop_claims WHERE drop_id = ? AND paid = 0 LIMIT ?',
+                    (drop_id, batch_size)
+                ).fetchall()
+                if not batch:
+                    self.cursor.execute("UPDATE drops SET status = 'claimed' WHERE drop_id = ? AND status = 'settling'", (drop_id,))
+                    self.conn.commit()
+                    break
+
+                self._record_coin_changes([(user_id, coins, CoinSource.DROP) for user_id, coins, _ in batch])
+                for user_id, _, xp in batch:
+                    level_before, level_after = self._grant_xp(user_id, xp)
+                    if level_after > level_before:
+                        level_ups.append((user_id, level_after))
+                self.cursor.executemany(
+                    'UPDATE drop_claims SET paid = 1 WHERE drop_id = ? AND user_id = ?',
+                    [(drop_id, user_id) for user_id, _, _ in batch]
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+            for user_id, _, xp in batch:
+                if xp:
+                    self._update_rank_index(user_id)
+
+        shares = self.cursor.execute('SELECT coins, xp FROM drop_claims WHERE drop_id = ?', (drop_id,)).fetchall()
+        coins = min(share[0] for share in shares)
+        xp = min(share[1] for share in shares)
+        return {
+            'status': 'settled',
+            'claims': len(shares),
+            'coins': coins,
+            'xp': xp,
+            'coins_extra': sum(1 for share in shares if share[0] > coins),
+            'xp_extra': sum(1 for share in shares if share[1] > xp),
+            'level_ups': level_ups
+        }
+
+    def _start_settlement(self, drop, claimants):
+        """Close an open rain drop and store each claimant's share unpaid, in one transaction.
+
+        Returns:
+            bool: False if the drop was no longer open
+        """
+        # Never more claimants than coins or XP to share, so nobody's share rounds down to nothing
+        claimants = claimants[:min(drop['max_claims'], max(drop['coins'], drop['xp'], 1))]
+        count = len(claimants)
+        total_xp = drop['xp'] if self.settings.get('xp_enabled', 1) else 0
+        now = time.time()
+
+        shares = []
+        for position, (user_id, _) in enumerate(claimants):
+            share = drop['coins'] // count + (1 if position < drop['coins'] % count else 0)
+            # Drops have no coin boost, so this only zeroes the coins while /xpstop is on
+            coins = round(self._reward_amount(user_id, share, CoinSource.DROP) or 0)
+            xp = total_xp // count + (1 if position < total_xp % count else 0)
+            shares.append((drop['drop_id'], user_id, coins, xp, now))
+
+        try:
+            self._begin_immediate()
+            self.cursor.execute('''
+                UPDATE drops SET status = 'settling', claim_count = ? WHERE drop_id = ? AND status = 'open'
+            ''', (count, drop['drop_id']))
+            if self.cursor.rowcount == 0:
+                self.conn.rollback()
+                return False
+
+            self.cursor.executemany('''
+                INSERT OR IGNORE INTO users (user_id, username, xp, level, coins, prestige, last_xp_time, message_count,
+                    voice_minutes, boost_end_time, boost_multiplier, streaming_minutes, images_shared)
+                VALUES (?, ?, 0, 1, 0, 0, 0, 0, 0, 0, 1.0, 0, 0)
+            ''', claimants)
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO drop_claims (drop_id, user_id, coins, xp, claimed_at, paid) VALUES (?, ?, ?, ?, ?, 0)',
+                shares
+            )
+            self.conn.commit()
+            return True
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_settling_drops(self):
+        """Get rain drops whose settlement started but hasn't paid every claimant yet."""
+        self.row_cursor.execute("SELECT * FROM drops WHERE status = 'settling'")
+        return [dict(row) for row in self.row_cursor.fetchall()]
+
+    def close_drop(self, drop_id):
+        """Expire a drop if it's still open. Returns True if it was."""
+        self.cursor.execute("UPDATE drops SET status = 'expired' WHERE drop_id = ? AND status = 'open'", (drop_id,))
+        self.conn.commit()
+        return self.cursor.rowcount > 0
+
+    def get_drop_claims(self, drop_id):
+        """Get the claims of a drop in the order they were made."""
+        self.row_cursor.execute(
+            'SELECT user_id, coins, xp, claimed_at FROM drop_claims WHERE drop_id = ? ORDER BY claimed_at', (drop_id,)
+        )
+        return [dict(row) for row in self.row_cursor.fetchall()]
+
+    def _grant_xp(self, user_id, xp_amount):
+        """Add a fixed amount of XP in the current transaction, applying level ups and their coins.
+
+        Unlike add_xp this ignores the message cooldown and multipliers, for rewards
+        that promise an exact amount.
+
+        Returns:
+            tuple: (level_before, level_after)
+        """
+        row = self.row_cursor.execute('SELECT level, xp FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None or xp_amount <= 0:
+            level = row['level'] if row else 1
+            return level, level
+
+        new_level, new_xp = self.level_curve.add_xp(row['level'], row['xp'], xp_amount)
+        self.cursor.execute('UPDATE users SET level = ?, xp = ? WHERE user_id = ?', (new_level, new_xp, user_id))
+        if new_level > row['level']:
+            level_coins = self.settings.get('coins_per_level', 35) * (new_level - row['level'])
+            self._record_coin_changes([(user_id, level_coins, CoinSource.LEVEL_UP)])
+        return row['level'], new_level
+
     def add_voice_activity(self, user_id, username, minutes, is_streaming=False, is_active=True):
         """Add voice activity time and reward XP and coins.
         
@@ -799,6 +1474,7 @@ class Database:
             xp_per_minute = self.settings.get('voice_inactive_xp', 1)
             coins_per_minute = self.settings.get('voice_inactive_coins', 0.5)
             activity_type = "inactive"
+        coin_source = CoinSource.STREAMING if is_streaming else CoinSource.VOICE
         
         # Get user's perk boosts
         perk_boosts = self.get_user_perk_boosts(user_id)
@@ -814,7 +1490,7 @@ class Database:
             logger.info(f"XP multiplier: {xp_multiplier}x")
             
         # Apply coin boost
-        if coin_boost > 1.0:
+        if coin_boost > 1.0 and get_reward_policy(coin_source).coin_boost:
             coins_per_minute *= coin_boost
             logger.info(f"Applied coin boost for voice activity: {coin_boost}x (new coins_per_minute: {coins_per_minute})")
         
@@ -844,20 +1520,20 @@ class Database:
                     UPDATE users 
                     SET voice_minutes = ?, 
                         streaming_minutes = ?,
-                        xp = xp + ?,
-                        coins = coins + ?
+                        xp = xp + ?
                     WHERE user_id = ?
-                ''', (new_voice_minutes, new_streaming_minutes, xp_to_add, coins_to_add, user_id))
+                ''', (new_voice_minutes, new_streaming_minutes, xp_to_add, user_id))
             else:
                 self.cursor.execute('''
                     UPDATE users 
                     SET voice_minutes = ?,
-                        xp = xp + ?,
-                        coins = coins + ?
+                        xp = xp + ?
                     WHERE user_id = ?
-                ''', (new_voice_minutes, xp_to_add, coins_to_add, user_id))
+                ''', (new_voice_minutes, xp_to_add, user_id))
+            self._record_coin_changes([(user_id, coins_to_add, coin_source)])
                 
             self.conn.commit()
+            self._update_rank_index(user_id)
             
             # Check for level ups after adding XP
             updated_user = self.get_user(user_id)
@@ -867,30 +1543,23 @@ class Database:
                 
             current_xp = updated_user['xp']
             current_level = updated_user['level']
-            required_xp = self.calculate_required_xp(current_level)
+            new_level, new_xp = self.level_curve.add_xp(current_level, current_xp, 0)
             
-            if current_xp >= required_xp:
+            if new_level > current_level:
                 # Handle level up
-                new_xp = current_xp
-                new_level = current_level
-                
-                while new_xp >= self.calculate_required_xp(new_level):
-                    new_xp -= self.calculate_required_xp(new_level)
-                    new_level += 1
-                
                 level_coins = self.settings.get('coins_per_level', 35) * (new_level - current_level)
-                new_coins = updated_user['coins'] + level_coins
                 
                 logger.info(f"Voice activity caused level up for {username}: Level {current_level} -> {new_level}, +{level_coins} coins")
                 
                 self.cursor.execute('''
                     UPDATE users 
                     SET level = ?,
-                        xp = ?,
-                        coins = ?
+                        xp = ?
                     WHERE user_id = ?
-                ''', (new_level, new_xp, new_coins, user_id))
+                ''', (new_level, new_xp, user_id))
+                self._record_coin_changes([(user_id, level_coins, CoinSource.LEVEL_UP)])
                 self.conn.commit()
+                self._update_rank_index(user_id)
                 
                 final_user = self.get_user(user_id)
                 if final_user is not None:
@@ -967,6 +1636,7 @@ class Database:
             ''', (new_images_shared, xp_to_add, user_id))
                 
             self.conn.commit()
+            self._update_rank_index(user_id)
             
             # Check for level ups after adding XP
             updated_user = self.get_user(user_id)
@@ -976,30 +1646,23 @@ class Database:
                 
             current_xp = updated_user['xp']
             current_level = updated_user['level']
-            required_xp = self.calculate_required_xp(current_level)
+            new_level, new_xp = self.level_curve.add_xp(current_level, current_xp, 0)
             
-            if current_xp >= required_xp:
+            if new_level > current_level:
                 # Handle level up
-                new_xp = current_xp
-                new_level = current_level
-                
-                while new_xp >= self.calculate_required_xp(new_level):
-                    new_xp -= self.calculate_required_xp(new_level)
-                    new_level += 1
-                
                 level_coins = self.settings.get('coins_per_level', 35) * (new_level - current_level)
-                new_coins = updated_user['coins'] + level_coins
                 
                 logger.info(f"Image share caused level up for {username}: Level {current_level} -> {new_level}, +{level_coins} coins")
                 
                 self.cursor.execute('''
                     UPDATE users 
                     SET level = ?,
-                        xp = ?,
-                        coins = ?
+                        xp = ?
                     WHERE user_id = ?
-                ''', (new_level, new_xp, new_coins, user_id))
+                ''', (new_level, new_xp, user_id))
+                self._record_coin_changes([(user_id, level_coins, CoinSource.LEVEL_UP)])
                 self.conn.commit()
+                self._update_rank_index(user_id)
                 
                 final_user = self.get_user(user_id)
                 if final_user is not None:
@@ -1016,6 +1679,10 @@ class Database:
         
     def close(self):
         """Close the database connection."""
+        with _registry_lock:
+            key = os.path.abspath(self.db_path)
+            if _shared_databases.get(key) is self:
+                del _shared_databases[key]
         if self.conn:
             self.conn.close()
             logger.info("Database connection closed")
\ No newline at end of file
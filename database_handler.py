@@ -30,9 +30,9 @@ class DatabaseHandler:
         
         if not use_postgres:
             # Fall back to SQLite for backward compatibility
-            from database import Database
+            from database import get_database
             logger.info("Using SQLite database")
-            self.sqlite_db = Database()
+            self.sqlite_db = get_database()
             self.using_postgres = False
     
     def get_db(self):
@@ -56,13 +56,17 @@ class DatabaseHandler:
         """Add XP to a user and handle level ups."""
         return self.get_db().add_xp(user_id, username, xp_amount)
     
-    def add_coins(self, user_id, username, amount):
-        """Add coins to a user's balance."""
-        return self.get_db().add_coins(user_id, username, amount)
+    def add_coins(self, user_id, username, amount, source):
+        """Add coins to a user's balance. source is a rewards.CoinSource, recorded in the SQLite coin ledger."""
+        if self.using_postgres:
+            return self.pg_db.add_coins(user_id, username, amount)
+        return self.sqlite_db.add_coins(user_id, username, amount, source)
     
-    def remove_coins(self, user_id, username, amount):
-        """Remove coins from a user's balance."""
-        return self.get_db().remove_coins(user_id, username, amount)
+    def remove_coins(self, user_id, username, amount, source):
+        """Remove coins from a user's balance. source is a rewards.CoinSource, recorded in the SQLite coin ledger."""
+        if self.using_postgres:
+            return self.pg_db.remove_coins(user_id, username, amount)
+        return self.sqlite_db.remove_coins(user_id, amount, source)
     
     def get_top_users(self, limit=10, offset=0, by_xp=True):
         """Get the top users ranked by XP or coins."""
@@ -9,14 +9,20 @@ import aiohttp
 import asyncio
 import sqlite3
 from logger import setup_logger
+from backup_manager import BackupManager
+from message_router import get_message_router
+from document_store import get_document_store
 
 logger = setup_logger('db_sync', 'bot.log')
 
+MAX_UPLOAD_SIZE = 25 * 1024 * 1024  # Discord attachment limit in bytes
+
 class DBSyncCog(commands.Cog):
     """Cog for syncing database files to DMs for backup and restoring database from uploads."""
     
     def __init__(self, bot):
         self.bot = bot
+        self.backup_manager = BackupManager()
         logger.info("DB Sync cog initialized")
     
     @app_commands.command(
@@ -24,9 +30,12 @@ class DBSyncCog(commands.Cog):
         description="Send database and data files as a backup to your DMs (Admin only)"
     )
     @app_commands.default_permissions(administrator=True)
-    async def db_sync(self, interaction: discord.Interaction):
+    async def db_sync(self, interaction: discord.Interaction, full: bool = False):
         """
-        Send database and data files as attachments to the user's DMs for backup.
+        Send a compressed backup of the database and data files to the user's DMs.
+        
+        Parameters:
+        - full: Include every file instead of only the files changed since the last backup
         """
 
         if not interaction.user.guild_permissions.administrator:
@@ -40,49 +49,30 @@ class DBSyncCog(commands.Cog):
         
         try:
 
-            search_dirs = ['data', '.', 'logs']
-            for directory in search_dirs:
-                os.makedirs(directory, exist_ok=True)
-
-            db_files = []
-            for directory in search_dirs:
-
-                db_files.extend([os.path.join(directory, file) for file in os.listdir(directory) 
-                                if file.endswith(('.db', '.sqlite', '.sqlite3'))])
+            summary = await asyncio.to_thread(self.backup_manager.create_backup, full)
 
-                if directory == 'data' or directory == '.':  # Include JSON files from data and root directories
-                    db_files.extend([os.path.join(directory, file) for file in os.listdir(directory) 
-                                    if file.endswith('.json')])
-            
-            if not db_files:
-                await interaction.followup.send(
-                    "No database files found in any of the project directories.", 
-                    ephemeral=True
-                )
+            if not summary['archive']:
+                if summary['unchanged']:
+                    await interaction.followup.send(
+                        f"✅ Nothing has changed since the last backup ({len(summary['unchanged'])} files checked). "
+                        "Use `full: True` to receive a complete backup.", 
+                        ephemeral=True
+                    )
+                else:
+                    await interaction.followup.send(
+                        "No database files found in any of the project directories.", 
+                        ephemeral=True
+                    )
                 return
 
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_dir = f'backup_{timestamp}'
-            os.makedirs(backup_dir, exist_ok=True)
-
-            files_copied = []
-            for src_path in db_files:
-
-                file_name = os.path.basename(src_path)
-                dst_path = os.path.join(backup_dir, file_name)
-
-                try:
-                    shutil.copy2(src_path, dst_path)
-                    files_copied.append(dst_path)
-                    logger.info(f"Copied {src_path} to {dst_path}")
-                except Exception as e:
-                    logger.error(f"Error copying {src_path}: {e}")
-            
-            if not files_copied:
+            archive_path = summary['archive']
+            archive_name = os.path.basename(archive_path)
+            archive_size = summary['size'] / (1024 * 1024)  # size in MB
 
-                shutil.rmtree(backup_dir, ignore_errors=True)
+            if summary['size'] > MAX_UPLOAD_SIZE:
                 await interaction.followup.send(
-                    "Failed to create backup copies of database files.", 
+                    f"⚠️ The backup archive `{archive_name}` is {archive_size:.2f} MB, which is too large to send on Discord. "
+                    f"It has been saved on the server in `{self.backup_manager.backup_dir}`.", 
                     ephemeral=True
                 )
                 return
@@ -90,32 +80,32 @@ class DBSyncCog(commands.Cog):
             try:
 
                 dm_channel = await interaction.user.create_dm()
-                await dm_channel.send("**📦 Database Backup**\nHere are the database and data files you requested:")
 
-                files_sent = 0
-                for file_path in files_copied:
-                    filename = os.path.basename(file_path)
-                    file_size = os.path.getsize(file_path) / (1024 * 1024)  # size in MB
+                file = discord.File(archive_path, filename=archive_name)
+                await dm_channel.send(
+                    f"**📦 Database Backup**\n"
+                    f"📄 **{archive_name}** - Size: {archive_size:.2f} MB\n"
+                    f"{'Full' if full else 'Incremental'} backup: {len(summary['changed'])} changed files included, "
+                    f"{len(summary['unchanged'])} unchanged files skipped.",
+                    file=file
+                )
 
-                    file = discord.File(file_path, filename=filename)
-                    await dm_channel.send(
-                        f"📄 **{filename}** - Size: {file_size:.2f} MB",
-                        file=file
-                    )
-                    files_sent += 1
+                if summary['failed']:
+                    await dm_channel.send(f"⚠️ Could not back up: {', '.join(summary['failed'])}")
 
                 await dm_channel.send(
-                    f"✅ **Backup Complete**\nSent {files_sent} database files.\n"
-                    f"This includes database files (.db) and data files (.json) with user data.\n"
-                    f"Keep these files safe to restore your bot's data if needed."
+                    "✅ **Backup Complete**\n"
+                    "The archive contains database files (.db) and data files (.json) with user data.\n"
+                    "Unchanged files are stored in earlier backups; `manifest.json` in the archive lists which backup holds the latest copy of each file.\n"
+                    "Keep these files safe to restore your bot's data if needed."
                 )
 
                 await interaction.followup.send(
-                    f"✅ Database backup complete! {files_sent} files have been sent to your DMs.", 
+                    f"✅ Database backup complete! {len(summary['changed'])} files have been sent to your DMs as `{archive_name}`.", 
                     ephemeral=True
                 )
                 
-                logger.info(f"DB sync completed by {interaction.user.id}. Sent {files_sent} files.")
+                logger.info(f"DB sync completed by {interaction.user.id}. Sent {archive_name} with {len(summary['changed'])} files.")
                 
             except discord.Forbidden:
                 await interaction.followup.send(
@@ -123,8 +113,6 @@ class DBSyncCog(commands.Cog):
                     ephemeral=True
                 )
                 logger.error(f"Failed to send DM to {interaction.user.id}")
-
-            shutil.rmtree(backup_dir, ignore_errors=True)
             
         except Exception as e:
             logger.error(f"Error in DB sync: {e}")
@@ -160,11 +148,8 @@ class DBSyncCog(commands.Cog):
             ephemeral=False
         )
         
-        def check(m):
-            return m.author.id == interaction.user.id and m.channel.id == interaction.channel.id
-            
         try:
-            reply_msg = await self.bot.wait_for('message', check=check, timeout=300)  # 5 minute timeout
+            reply_msg = await get_message_router(self.bot).wait_for(interaction.channel.id, interaction.user.id, timeout=300)  # 5 minute timeout
             
             if reply_msg.content.lower() == 'cancel':
                 await interaction.followup.send("Database restore cancelled.", ephemeral=True)
@@ -192,7 +177,7 @@ class DBSyncCog(commands.Cog):
             
             try:
                 if os.path.exists('data/leveling.db'):
-                    shutil.copy2('data/leveling.db', backup_path)
+                    await asyncio.to_thread(BackupManager.snapshot_database, 'data/leveling.db', backup_path)
                     logger.info(f"Created backup of database at {backup_path}")
             except Exception as e:
                 logger.error(f"Error creating backup: {e}")
@@ -315,11 +300,8 @@ class DBSyncCog(commands.Cog):
             ephemeral=False
         )
         
-        def check(m):
-            return m.author.id == interaction.user.id and m.channel.id == interaction.channel.id
-            
         try:
-            reply_msg = await self.bot.wait_for('message', check=check, timeout=300)  # 5 minute timeout
+            reply_msg = await get_message_router(self.bot).wait_for(interaction.channel.id, interaction.user.id, timeout=300)  # 5 minute timeout
             
             if reply_msg.content.lower() == 'cancel':
                 await interaction.followup.send("Data import cancelled.", ephemeral=True)
@@ -366,6 +348,8 @@ class DBSyncCog(commands.Cog):
                 
                 try:
                     shutil.copy2(file_path, destination)
+                    # Files already moved into the document store are imported again on restart
+                    get_document_store().reimport_legacy_file(destination)
                     logger.info(f"Copied {filename} to data directory")
                 except Exception as e:
                     logger.error(f"Error copying {filename}: {e}")
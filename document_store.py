@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import asyncio
+import threading
+from logger import setup_logger
+
+logger = setup_logger('document_store', 'bot.log')
+
+DOCUMENTS_DB_PATH = 'data/documents.db'
+
+class Collection:
+    """
+    A keyed collection of JSON documents stored as one table with a row per key.
+    Changing a document rewrites only its row instead of the whole collection.
+
+    With coalesce_delay set, writes made inside the event loop are held for that
+    many seconds and committed together, so bursts of changes to the same keys
+    (e.g. cooldown timestamps) cost one transaction.
+    """
+
+    def __init__(self, store, name, coalesce_delay=None):
+        self.store = store
+        self.name = name
+        self.table = f"docs_{name}"
+        self.coalesce_delay = coalesce_delay
+        self.pending = {}  # key -> JSON text, or None for a delete
+        self.flush_handle = None
+
+    def get(self, key, default=None):
+        """Get a document, or default if the key doesn't exist."""
+        key = str(key)
+        with self.store.lock:
+            if key in self.pending:
+                text = self.pending[key]
+            else:
+                row = self.store.conn.execute(f'SELECT doc FROM {self.table} WHERE key = ?', (key,)).fetchone()
+                text = row[0] if row else None
+        return json.loads(text) if text is not None else default
+
+    def all(self):
+        """Get every document.
+
+        Returns:
+            dict: key -> document
+        """
+        with self.store.lock:
+            docs = {key: json.loads(doc) for key, doc in self.store.conn.execute(f'SELECT key, doc FROM {self.table}')}
+            for key, text in self.pending.items():
+                if text is None:
+                    docs.pop(key, None)
+                else:
+                    docs[key] = json.loads(text)
+        return docs
+
+    def find(self, field, value):
+        """Get the documents whose top-level field equals value.
+
+        Returns:
+            dict: key -> document
+        """
+        self.flush()
+        with self.store.lock:
+            rows = self.store.conn.execute(
+                f"SELECT key, doc FROM {self.table} WHERE json_extract(doc, '$.' || ?) = ?", (field, value)
+            ).fetchall()
+        return {key: json.loads(doc) for key, doc in rows}
+
+    def put(self, key, doc):
+        """Insert or replace a document."""
+        self._write(str(key), json.dumps(doc))
+
+    def delete(self, key):
+        """Delete a document if it exists."""
+        self._write(str(key), None)
+
+    def _write(self, key, text):
+        with self.store.lock:
+            if self.coalesce_delay is None:
+                self._apply({key: text})
+                return
+
+            self.pending[key] = text
+            if self.flush_handle is not None:
+                return
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                self.flush_handle = loop.call_later(self.coalesce_delay, self.flush)
+                return
+        self.flush()
+
+    def _apply(self, changes):
+        conn = self.store.conn
+        now = time.time()
+        with conn:
+            for key, text in changes.items():
+                if text is None:
+                    conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                else:
+                    conn.execute(f'''
+                        INSERT INTO {self.table} (key, doc, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET doc = excluded.doc, updated_at = excluded.updated_at
+                    ''', (key, text, now))
+
+    def flush(self):
+        """Commit any held writes now."""
+        with self.store.lock:
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
+                self.flush_handle = None
+            if not self.pending:
+                return
+            changes, self.pending = self.pending, {}
+            try:
+                self._apply(changes)
+            except Exception as e:
+                logger.error(f"Error writing {len(changes)} documents to {self.name}, will retry: {e}")
+                # Held again for the next flush, behind any newer write to the same key
+                for key, text in changes.items():
+                    self.pending.setdefault(key, text)
+                try:
+                    self.flush_handle = asyncio.get_running_loop().call_later(self.coalesce_delay or 0, self.flush)
+                except RuntimeError:
+                    pass  # No event loop; the next write or flush retries
+
+    def replace_all(self, docs):
+        """Replace the whole collection in one transaction, e.g. for an import."""
+        with self.store.lock:
+            self.pending = {}
+            with self.store.conn:
+                self.store.conn.execute(f'DELETE FROM {self.table}')
+            self._apply({str(key): json.dumps(doc) for key, doc in docs.items()})
+
+    def __len__(self):
+        self.flush()
+        with self.store.lock:
+            return self.store.conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+class DocumentStore:
+    """
+    SQLite store for cog state that used to live in data/*.json files.
+    Each collection is its own table of (key, JSON document) rows. The first time
+    a collection is opened, its legacy JSON file is imported and renamed to
+    <file>.migrated.
+    """
+
+    def __init__(self, db_path=DOCUMENTS_DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.collections = {}
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS document_collections (
+                name TEXT PRIMARY KEY,
+                legacy_file TEXT,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+        atexit.register(self.flush)
+
+    def collection(self, name, legacy_file=None, legacy_transform=None, coalesce_delay=None):
+        """Open a collection, creating its table and importing its legacy JSON file on first use.
+
+        Args:
+            name (str): Collection name, letters, digits and underscores only
+            legacy_file (str): JSON file the collection replaces
+            legacy_transform (callable): Converts the legacy file's data to a key -> document dict;
+                by default the file must already be a JSON object
+            coalesce_delay (float): Seconds to hold writes so they're committed together
+
+        Returns:
+            Collection: The collection
+        """
+        if not name.replace('_', '').isalnum():
+            raise ValueError(f"Invalid collection name: {name}")
+
+        with self.lock:
+            if name in self.collections:
+                return self.collections[name]
+
+            collection = Collection(self, name, coalesce_delay)
+            with self.conn:
+                self.conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {collection.table} (
+                        key TEXT PRIMARY KEY,
+                        doc TEXT NOT NULL CHECK (json_valid(doc)),
+                        updated_at REAL NOT NULL
+                    )
+                ''')
+
+            registered = self.conn.execute('SELECT 1 FROM document_collections WHERE name = ?', (name,)).fetchone()
+            if registered is None and legacy_file and self._import_legacy_file(collection, legacy_file, legacy_transform):
+                with self.conn:
+                    self.conn.execute(
+                        'INSERT INTO document_collections (name, legacy_file, created_at) VALUES (?, ?, ?)',
+                        (name, legacy_file, time.time())
+                    )
+
+            self.collections[name] = collection
+            return collection
+
+    def _import_legacy_file(self, collection, legacy_file, legacy_transform):
+        """Import a legacy JSON file. Returns False if it should be retried on the next start."""
+        if not os.path.exists(legacy_file):
+            return True
+
+        try:
+            with open(legacy_file, 'r') as f:
+                data = json.load(f)
+            docs = legacy_transform(data) if legacy_transform else data
+            # Upserted rather than replacing the table, so a retried import keeps documents written since
+            collection._apply({str(key): json.dumps(doc) for key, doc in docs.items()})
+            os.replace(legacy_file, f"{legacy_file}.migrated")
+            logger.info(f"Imported {len(docs)} documents from {legacy_file} into collection {collection.name}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to import {legacy_file} into collection {collection.name}: {e}")
+            return False
+
+    def reimport_legacy_file(self, legacy_file):
+        """Clear the collection imported from a legacy JSON file so the file is imported again on the next start.
+
+        Used when a JSON file is restored, e.g. by /dbimportjson. Returns True if a collection was cleared.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT name FROM document_collections WHERE legacy_file = ?', (legacy_file,)
+            ).fetchall()
+            with self.conn:
+                for (name,) in rows:
+                    self.conn.execute(f'DELETE FROM docs_{name}')
+                    self.conn.execute('DELETE FROM document_collections WHERE name = ?', (name,))
+                    logger.info(f"Cleared collection {name} to re-import {legacy_file}")
+            return bool(rows)
+
+    def flush(self):
+        """Commit held writes in every collection."""
+        for collection in list(self.collections.values()):
+            collection.flush()
+
+_document_store = None
+
+def get_document_store():
+    """Get the process-wide document store."""
+    global _document_store
+    if _document_store is None:
+        _document_store = DocumentStore()
+    return _document_store
@@ -0,0 +1,346 @@
+import time
+import secrets
+import discord
+from logger import setup_logger
+from database import get_database
+from scheduler import get_scheduler
+
+logger = setup_logger('drop_engine', 'bot.log')
+
+DROP_CLAIM_CUSTOM_ID = 'drop:claim'
+CLOSED_DROP_CACHE_SIZE = 500  # Closed drops remembered so late clicks are rejected without a database write
+RAIN_MAX_CLAIMANTS = 5000  # Most users that can join one rain drop, so a window open to everyone stays bounded
+RAIN_SETTLE_BATCH_SIZE = 500  # Rain claimants paid per transaction
+RAIN_SETTLE_RETRY_SECONDS = 60  # Wait before retrying a rain settlement that failed
+
+class ClaimStats:
+    """Claim attempts and the time spent in the claim transaction for one drop kind."""
+
+    __slots__ = ('attempts', 'claims', 'rejected', 'conflicts', 'total_latency', 'max_latency',
+                 'settlements', 'settle_latency')
+
+    def __init__(self):
+        self.attempts = 0
+        self.claims = 0
+        self.rejected = 0  # Turned away from memory, no transaction
+        self.conflicts = 0  # Lost the race inside the transaction
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.settlements = 0  # Rain drops paid out
+        self.settle_latency = 0.0
+
+    def record(self, latency, claimed):
+        if claimed:
+            self.claims += 1
+        else:
+            self.conflicts += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+class DropEngine:
+    """
+    Shared claim handling for random drops and the coin and XP drop panels.
+    Drops are stored in leveling.db and claimed with Database.claim_drop, which
+    checks the drop is still open and grants the reward in one transaction, so the
+    first clicks win even across restarts. Drops that are known to be full or
+    expired are rejected from memory, so a popular drop doesn't cost a database
+    write for every click that arrives after it was claimed.
+
+    Cogs register callbacks per drop kind with register(), post a message with
+    claim_view() and attach it with attach_message(). Expiry runs through the
+    scheduler, so drops still expire if the bot restarts in between.
+
+    Rain drops, created with create_rain(), are shared by the first max_claims users
+    or everyone who joins before they expire. Joining only adds the user to an
+    in-memory list; the whole list is paid with Database.settle_drop when the rain
+    fills up or ends, so a large event costs a few batched transactions instead of
+    one per user. Users who joined before a restart have to join again. A settlement
+    that fails is retried through the scheduler, and one cut short by a restart is
+    resumed at startup, paying only the claimants still unpaid.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = get_database()
+        self.handlers = {}  # kind -> (on_claimed, on_expired)
+        self.drops = {}  # message_id -> drop, for drops posted since start
+        self.closed = {}  # drop_id -> True, oldest first
+        self.claimants = {}  # drop_id -> user IDs that already claimed
+        self.rain_claimants = {}  # drop_id -> {user_id: username} in the order they joined
+        self.stats = {}
+
+        self.scheduler = get_scheduler(bot)
+        self.scheduler.register('drop_expire', self.run_drop_expire)
+        self.scheduler.register('drop_settle', self.run_drop_settle)
+        bot.add_view(DropClaimView(self))
+
+        for drop in self.db.get_settling_drops():
+            self.scheduler.schedule('drop_settle', f"drop_settle:{drop['drop_id']}", time.time(), {'drop_id': drop['drop_id']})
+
+    def register(self, kind, on_claimed, on_expired=None, on_settled=None):
+        """Register the coroutines that update a drop's message.
+
+        Args:
+            kind (str): Drop kind, e.g. "random"
+            on_claimed (coroutine function): Called as on_claimed(interaction, drop, result)
+                after a successful claim; it must respond to the interaction
+            on_expired (coroutine function): Called as on_expired(drop) when a drop expires
+                before all its claims were used, or a rain drop ends with nobody in it
+            on_settled (coroutine function): Called as on_settled(drop, result) after a
+                rain drop was paid out, with the result of Database.settle_drop
+        """
+        self.handlers[kind] = (on_claimed, on_expired, on_settled)
+        self.stats.setdefault(kind, ClaimStats())
+
+    def create_drop(self, kind, channel_id, coins=0, xp=0, duration=120, max_claims=1, guild_id=None):
+        """Create a drop and schedule its expiry. Post it with claim_view() and call attach_message().
+
+        Returns:
+            dict: The drop
+        """
+        drop_id = f"{kind}_{int(time.time())}_{secrets.token_hex(3)}"
+        expires_at = time.time() + duration
+        self.db.create_drop(drop_id, kind, channel_id, coins, xp, max_claims, expires_at, guild_id)
+        self.scheduler.schedule('drop_expire', f"drop_expire:{drop_id}", expires_at, {'drop_id': drop_id})
+        return self.db.get_drop(drop_id)
+
+    def create_rain(self, kind, channel_id, coins=0, xp=0, duration=60, max_claims=None, guild_id=None):
+        """Create a rain drop whose coins and XP are shared by the users who join it.
+
+        Args:
+            max_claims (int): Pay the first this many users as soon as they have joined;
+                None lets everyone join until the drop expires, up to RAIN_MAX_CLAIMANTS.
+                Never more than the coins or XP shared, so every share is at least 1
+
+        Returns:
+            dict: The drop
+        """
+        max_claims = min(max_claims or RAIN_MAX_CLAIMANTS, RAIN_MAX_CLAIMANTS, max(coins, xp, 1))
+        drop_id = f"{kind}_rain_{int(time.time())}_{secrets.token_hex(3)}"
+        expires_at = time.time() + duration
+        self.db.create_drop(drop_id, kind, channel_id, coins, xp, max_claims, expires_at, guild_id, mode='rain')
+        self.scheduler.schedule('drop_expire', f"drop_expire:{drop_id}", expires_at, {'drop_id': drop_id})
+        self.rain_claimants[drop_id] = {}
+        return self.db.get_drop(drop_id)
+
+    def claim_view(self, label="Claim", emoji=None, style=discord.ButtonStyle.success):
+        """Get a view with the claim button to send with a drop message."""
+        return DropClaimView(self, label, emoji, style)
+
+    def attach_message(self, drop, message_id):
+        """Record the message a drop was posted in."""
+        drop['message_id'] = message_id
+        self.db.set_drop_message(drop['drop_id'], message_id)
+        self.drops[message_id] = drop
+
+    def _close(self, drop_id):
+        self.closed[drop_id] = True
+        self.claimants.pop(drop_id, None)
+        self.rain_claimants.pop(drop_id, None)
+        while len(self.closed) > CLOSED_DROP_CACHE_SIZE:
+            del self.closed[next(iter(self.closed))]
+
+    async def handle_claim(self, interaction):
+        """Handle a click on a drop's claim button."""
+        message_id = interaction.message.id
+        drop = self.drops.get(message_id)
+        if drop is None:
+            drop = self.db.get_drop(message_id=message_id)
+            if drop is None:
+                await interaction.response.send_message("This drop no longer exists!", ephemeral=True)
+                return
+            self.drops[message_id] = drop
+
+        drop_id = drop['drop_id']
+        user_id = interaction.user.id
+        stats = self.stats.setdefault(drop['kind'], ClaimStats())
+        stats.attempts += 1
+
+        if drop_id in self.closed or drop['expires_at'] <= time.time():
+            stats.rejected += 1
+            await interaction.response.send_message("This drop has already been claimed or has expired!", ephemeral=True)
+            return
+        if user_id in self.claimants.get(drop_id, ()):
+            stats.rejected += 1
+            await interaction.response.send_message("You already claimed this drop!", ephemeral=True)
+            return
+        if drop['mode'] == 'rain':
+            await self._join_rain(interaction, drop, stats)
+            return
+
+        started = time.perf_counter()
+        try:
+            result = self.db.claim_drop(drop_id, user_id, str(interaction.user))
+        except Exception as e:
+            logger.error(f"Error claiming drop {drop_id} for {user_id}: {e}", exc_info=True)
+            await interaction.response.send_message("An error occurred while claiming the reward. Please try again later.", ephemeral=True)
+            return
+        stats.record(time.perf_counter() - started, result['status'] == 'claimed')
+
+        if result['status'] == 'duplicate':
+            self.claimants.setdefault(drop_id, set()).add(user_id)
+            await interaction.response.send_message("You already claimed this drop!", ephemeral=True)
+            return
+        if result['status'] == 'closed':
+            self._close(drop_id)
+            await interaction.response.send_message("This drop has already been claimed or has expired!", ephemeral=True)
+            return
+
+        if result['full']:
+            self._close(drop_id)
+        else:
+            self.claimants.setdefault(drop_id, set()).add(user_id)
+        logger.info(f"Drop {drop_id} claimed by {interaction.user} ({user_id}): {result['coins']} coins, {result['xp']} XP")
+
+        on_claimed, _, _ = self.handlers.get(drop['kind'], (None, None, None))
+        if on_claimed is None:
+            await interaction.response.send_message(
+                f"You claimed {result['coins']} coins and {result['xp']} XP!", ephemeral=True
+            )
+            return
+        try:
+            await on_claimed(interaction, drop, result)
+        except Exception as e:
+            logger.error(f"Error in claim handler for {drop['kind']} drop {drop_id}: {e}", exc_info=True)
+
+    async def _join_rain(self, interaction, drop, stats):
+        drop_id = drop['drop_id']
+        joined = self.rain_claimants.setdefault(drop_id, {})
+        if interaction.user.id in joined:
+            stats.rejected += 1
+            await interaction.response.send_message("You already joined this drop!", ephemeral=True)
+            return
+
+        joined[interaction.user.id] = str(interaction.user)
+        stats.claims += 1
+        claimants = None
+        if len(joined) >= drop['max_claims']:
+            # Taken before responding, so clicks that arrive meanwhile are rejected as closed
+            self.scheduler.cancel(f"drop_expire:{drop_id}")
+            claimants = self._take_rain_claimants(drop)
+
+        await interaction.response.send_message(
+            "You joined the drop! The reward is shared when it ends.", ephemeral=True
+        )
+        if claimants is not None:
+            await self._settle_rain(drop, claimants)
+
+    def _take_rain_claimants(self, drop):
+        claimants = list(self.rain_claimants.get(drop['drop_id'], {}).items())
+        self._close(drop['drop_id'])
+        if drop['message_id']:
+            self.drops.pop(drop['message_id'], None)
+        return claimants
+
+    async def _settle_rain(self, drop, claimants):
+        drop_id = drop['drop_id']
+        _, on_expired, on_settled = self.handlers.get(drop['kind'], (None, None, None))
+        if not claimants and drop['status'] == 'open':
+            if self.db.close_drop(drop_id) and on_expired:
+                await on_expired(drop)
+            return
+
+        started = time.perf_counter()
+        try:
+            result = self.db.settle_drop(drop_id, claimants, RAIN_SETTLE_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Error settling rain drop {drop_id}, retrying in {RAIN_SETTLE_RETRY_SECONDS}s: {e}", exc_info=True)
+            # The claimants are kept in case the drop wasn't closed yet; once it was, the unpaid ones are stored
+            self.scheduler.schedule(
+                'drop_settle', f"drop_settle:{drop_id}", time.time() + RAIN_SETTLE_RETRY_SECONDS,
+                {'drop_id': drop_id, 'claimants': claimants}
+            )
+            return
+        stats = self.stats.setdefault(drop['kind'], ClaimStats())
+        stats.settlements += 1
+        stats.settle_latency += time.perf_counter() - started
+        if result['status'] != 'settled':
+            return
+
+        logger.info(f"Rain drop {drop_id} settled: {result['claims']} claimants got at least {result['coins']} coins and {result['xp']} XP each")
+        if on_settled:
+            await on_settled(drop, result)
+
+    async def run_drop_expire(self, job_id, payload):
+        """Scheduler handler that expires a drop and lets its cog update the message."""
+        drop_id = payload['drop_id']
+        drop = self.db.get_drop(drop_id)
+        if drop and drop['mode'] == 'rain':
+            await self._settle_rain(drop, self._take_rain_claimants(drop))
+            return
+
+        closed = self.db.close_drop(drop_id)
+        self._close(drop_id)
+
+        drop = self.db.get_drop(drop_id)
+        if drop and drop['message_id']:
+            self.drops.pop(drop['message_id'], None)
+        if not closed or drop is None:
+            return
+
+        _, on_expired, _ = self.handlers.get(drop['kind'], (None, None, None))
+        if on_expired:
+            await on_expired(drop)
+
+    async def run_drop_settle(self, job_id, payload):
+        """Scheduler handler that retries or resumes paying a rain drop."""
+        drop = self.db.get_drop(payload['drop_id'])
+        if drop is None:
+            return
+        claimants = [tuple(claimant) for claimant in payload.get('claimants', [])]
+        await self._settle_rain(drop, claimants)
+
+    async def fetch_drop_message(self, drop):
+        """Fetch the message a drop was posted in, or None if it's gone."""
+        channel = self.bot.get_channel(drop['channel_id'])
+        if channel is None or not drop['message_id']:
+            return None
+        try:
+            return await channel.fetch_message(drop['message_id'])
+        except discord.HTTPException:
+            return None
+
+    def get_stats(self):
+        """Get claim counts and transaction latency per drop kind.
+
+        Returns:
+            list: Dicts with kind, attempts, claims, rejected, conflicts, avg_ms, max_ms,
+                settlements and avg_settle_ms
+        """
+        rows = []
+        for kind, stats in sorted(self.stats.items()):
+            transactions = stats.claims + stats.conflicts
+            rows.append({
+                'kind': kind,
+                'attempts': stats.attempts,
+                'claims': stats.claims,
+                'rejected': stats.rejected,
+                'conflicts': stats.conflicts,
+                'avg_ms': stats.total_latency * 1000 / transactions if transactions else 0.0,
+                'max_ms': stats.max_latency * 1000,
+                'settlements': stats.settlements,
+                'avg_settle_ms': stats.settle_latency * 1000 / stats.settlements if stats.settlements else 0.0
+            })
+        return rows
+
+class DropClaimView(discord.ui.View):
+    """Persistent claim button shared by every drop. The drop is looked up from the message."""
+
+    def __init__(self, engine, label="Claim", emoji=None, style=discord.ButtonStyle.success):
+        super().__init__(timeout=None)
+        self.engine = engine
+        button = discord.ui.Button(label=label, emoji=emoji, style=style, custom_id=DROP_CLAIM_CUSTOM_ID)
+        button.callback = self.claim
+        self.add_item(button)
+
+    async def claim(self, interaction: discord.Interaction):
+        await self.engine.handle_claim(interaction)
+
+def get_drop_engine(bot):
+    """Get the bot's drop engine, creating it on first use."""
+    engine = getattr(bot, 'drop_engine', None)
+    if engine is None:
+        engine = DropEngine(bot)
+        bot.drop_engine = engine
+    return engine
@@ -10,7 +10,7 @@ import sqlite3
 import time
 import logging
 from typing import Dict, List, Optional, Tuple, Union
-from database import Database
+from database import get_database
 from logger import setup_logger
 
 logger = setup_logger('event_system')
@@ -114,7 +114,7 @@ class EventSystemCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.settings_file = "data/event_settings.json"
         self.settings = EventSettings()
 
@@ -3,6 +3,7 @@ import random
 from discord.ext import commands, tasks
 from datetime import datetime
 from logger import setup_logger
+from message_router import get_message_router
 
 logger = setup_logger('events')
 
@@ -73,18 +74,16 @@ def register_events(bot):
             goodbye_message = random.choice(goodbye_messages)
             await system_channel.send(goodbye_message)
 
-    @bot.event
     async def on_message(message):
         """Called when a message is sent in a channel the bot can see."""
 
-        if message.author == bot.user:
-            return
-
         logger.debug(f'Message from {message.author}: {message.content[:50]}{"..." if len(message.content) > 50 else ""}')
 
         if bot.user.mentioned_in(message):
             logger.info(f'Bot was mentioned by {message.author}')
 
+    get_message_router(bot).subscribe('events', on_message, guild_only=False, include_bots=True)
+
     @bot.event
     async def on_reaction_add(reaction, user):
         """Called when a reaction is added to a message."""
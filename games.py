@@ -3,12 +3,13 @@ from discord import app_commands
 from discord.ext import commands
 import logging
 import datetime
-import json
 import os
 import random
 import asyncio
 import string
 import re
+from message_router import get_message_router
+from settings_storage import settings_storage
 
 class GamesCog(commands.Cog):
     """Cog for running fun mini-games in text channels."""
@@ -27,47 +28,38 @@ class GamesCog(commands.Cog):
         
         # Active games
         self.active_games = {}
+        get_message_router(bot).subscribe('games', self.handle_message, channels=lambda: self.active_games)
         
         # Load settings
         self.load_settings()
+        settings_storage.subscribe('games', self.on_settings_changed)
         
         # Start the game spawner - will be initialized in cog_load
         self.spawn_game_task = None
     
     def load_settings(self):
-        """Load games settings from settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-                games_settings = settings.get('games', {})
-                
-                self.enabled = games_settings.get('enabled', True)
-                self.cooldown_minutes = games_settings.get('cooldown_minutes', 15)
-                self.xp_rewards = games_settings.get('xp_rewards', (10, 50))
-                self.coin_rewards = games_settings.get('coin_rewards', (5, 25))
-                self.allowed_channels = games_settings.get('allowed_channels', [])
-        except Exception as e:
-            self.logger.error(f"Failed to load games settings: {e}")
+        """Load games settings from the shared settings store."""
+        games_settings = settings_storage.get('games', {})
+        
+        self.enabled = games_settings.get('enabled', True)
+        self.cooldown_minutes = games_settings.get('cooldown_minutes', 15)
+        self.xp_rewards = games_settings.get('xp_rewards', (10, 50))
+        self.coin_rewards = games_settings.get('coin_rewards', (5, 25))
+        self.allowed_channels = games_settings.get('allowed_channels', [])
     
     def save_settings(self):
-        """Save games settings to settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-            
-            if 'games' not in settings:
-                settings['games'] = {}
-            
-            settings['games']['enabled'] = self.enabled
-            settings['games']['cooldown_minutes'] = self.cooldown_minutes
-            settings['games']['xp_rewards'] = self.xp_rewards
-            settings['games']['coin_rewards'] = self.coin_rewards
-            settings['games']['allowed_channels'] = self.allowed_channels
-            
-            with open('settings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
-        except Exception as e:
-            self.logger.error(f"Failed to save games settings: {e}")
+        """Save games settings to the shared settings store."""
+        settings_storage.update_section('games', {
+            'enabled': self.enabled,
+            'cooldown_minutes': self.cooldown_minutes,
+            'xp_rewards': list(self.xp_rewards),
+            'coin_rewards': list(self.coin_rewards),
+            'allowed_channels': self.allowed_channels
+        })
+    
+    def on_settings_changed(self, key, value):
+        """Reload games settings when settings.json changes."""
+        self.load_settings()
     
     async def cog_load(self):
         """Initialize tasks when the cog is loaded."""
@@ -78,6 +70,8 @@ class GamesCog(commands.Cog):
         """Clean up when the cog is unloaded."""
         if self.spawn_game_task:
             self.spawn_game_task.cancel()
+        get_message_router(self.bot).unsubscribe('games')
+        settings_storage.unsubscribe('games', self.on_settings_changed)
     
     async def spawn_games_loop(self):
         """Loop that spawns games periodically."""
@@ -290,17 +284,9 @@ class GamesCog(commands.Cog):
                 # Message not found, just clean up
                 del self.active_games[channel_id]
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Check if a message is the answer to an active game."""
-        # Ignore messages from bots
-        if message.author.bot:
-            return
-        
-        # Check if there's an active game in this channel
+    async def handle_message(self, message):
+        """Check if a message in a channel with an active game is the answer."""
         channel_id = message.channel.id
-        if channel_id not in self.active_games:
-            return
         
         # Get the game info
         game_info = self.active_games[channel_id]
@@ -314,8 +300,9 @@ class GamesCog(commands.Cog):
             coin_reward = random.randint(self.coin_rewards[0], self.coin_rewards[1])
             
             # Award XP and coins
-            from database import Database
-            db = Database()
+            from database import get_database
+            from rewards import CoinSource
+            db = get_database()
             
             # Get user data
             user_id = str(message.author.id)
@@ -323,8 +310,8 @@ class GamesCog(commands.Cog):
             user_data = db.get_or_create_user(user_id, username)
             
             # Add XP and coins
-            db.add_xp(user_id, xp_reward)
-            db.add_coins(user_id, coin_reward)
+            db.add_xp(user_id, username, xp_amount=xp_reward)
+            db.add_coins(user_id, username, coin_reward, CoinSource.GAME)
             
             try:
                 # Get the game message
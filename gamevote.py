@@ -5,17 +5,21 @@ import datetime
 import asyncio
 import logging
 from logger import setup_logger
+from document_store import get_document_store
 import time
 import sqlite3
-import json
 import random
 import os
 
 logger = setup_logger('gamevote', 'bot.log')
 
-# Path for tournament game votes
+# Legacy file for tournament game votes, now imported into the document store
 TOURNAMENT_VOTES_PATH = "data/tournament_votes.json"
 
+def get_tournament_votes():
+    """Get the tournament game votes collection, shared with the tournaments cog."""
+    return get_document_store().collection('tournament_votes', legacy_file=TOURNAMENT_VOTES_PATH)
+
 def generate_random_id(length=5):
     """Generate a random alphanumeric ID.
     
@@ -680,19 +684,10 @@ class TournamentGameVoteModal(discord.ui.Modal):
             # Create vote with a unique ID
             vote_id = generate_random_id(5)
             
-            # Create tournament game votes file if it doesn't exist
-            if not os.path.exists(TOURNAMENT_VOTES_PATH):
-                os.makedirs(os.path.dirname(TOURNAMENT_VOTES_PATH), exist_ok=True)
-                tournament_votes = {}
-                with open(TOURNAMENT_VOTES_PATH, 'w') as f:
-                    json.dump(tournament_votes, f, indent=4)
-                
-            # Load existing votes
-            with open(TOURNAMENT_VOTES_PATH, 'r') as f:
-                tournament_votes = json.load(f)
+            tournament_votes = get_tournament_votes()
                 
             # Check if ID already exists, generate a new one if needed
-            while vote_id in tournament_votes:
+            while tournament_votes.get(vote_id) is not None:
                 vote_id = generate_random_id(5)
                 
             # Create tournament game vote
@@ -709,10 +704,8 @@ class TournamentGameVoteModal(discord.ui.Modal):
                 "message_id": None
             }
             
-            # Save vote to file
-            tournament_votes[vote_id] = vote
-            with open(TOURNAMENT_VOTES_PATH, 'w') as f:
-                json.dump(tournament_votes, f, indent=4)
+            # Save the vote
+            tournament_votes.put(vote_id, vote)
                 
             # Create an embed for the vote
             embed = discord.Embed(
@@ -738,9 +731,8 @@ class TournamentGameVoteModal(discord.ui.Modal):
             response = await interaction.channel.send(embed=embed, view=view)
             
             # Save the message ID in the vote data
-            tournament_votes[vote_id]["message_id"] = str(response.id)
-            with open(TOURNAMENT_VOTES_PATH, 'w') as f:
-                json.dump(tournament_votes, f, indent=4)
+            vote["message_id"] = str(response.id)
+            tournament_votes.put(vote_id, vote)
                 
             await interaction.followup.send(
                 f"Tournament game vote created successfully! The vote will end in {duration_hours} hours.",
@@ -778,16 +770,14 @@ class TournamentGameVoteButtonsView(discord.ui.View):
             custom_id = interaction.data["custom_id"]
             option_index = int(custom_id.split("_")[-1])
             
-            # Load votes from file
-            with open(TOURNAMENT_VOTES_PATH, 'r') as f:
-                tournament_votes = json.load(f)
+            tournament_votes = get_tournament_votes()
+            vote = tournament_votes.get(self.vote_id)
                 
             # Check if vote exists and is active
-            if self.vote_id not in tournament_votes:
+            if vote is None:
                 await interaction.response.send_message("This vote no longer exists.", ephemeral=True)
                 return
                 
-            vote = tournament_votes[self.vote_id]
             if vote["status"] != "active":
                 await interaction.response.send_message("This vote has ended.", ephemeral=True)
                 return
@@ -796,8 +786,7 @@ class TournamentGameVoteButtonsView(discord.ui.View):
             end_time = datetime.datetime.fromisoformat(vote["end_time"])
             if datetime.datetime.now() > end_time:
                 vote["status"] = "completed"
-                with open(TOURNAMENT_VOTES_PATH, 'w') as f:
-                    json.dump(tournament_votes, f, indent=4)
+                tournament_votes.put(self.vote_id, vote)
                 await interaction.response.send_message("This vote has ended.", ephemeral=True)
                 return
                 
@@ -824,8 +813,7 @@ class TournamentGameVoteButtonsView(discord.ui.View):
             vote["games"][option_index]["votes"] += 1
             
             # Save the updated votes
-            with open(TOURNAMENT_VOTES_PATH, 'w') as f:
-                json.dump(tournament_votes, f, indent=4)
+            tournament_votes.put(self.vote_id, vote)
                 
             # Update the embed to show current vote counts
             message = await interaction.channel.fetch_message(int(vote["message_id"]))
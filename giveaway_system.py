@@ -1,20 +1,14 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 import random
 import datetime
-import json
-import asyncio
-import logging
-import os
+from logger import setup_logger
+from scheduler import get_scheduler
+from document_store import get_document_store
 
 # Set up logging
-logger = logging.getLogger('giveaway_system')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('giveaway_system')
 
 class GiveawaySystem(commands.Cog):
     """Cog for managing server giveaways."""
@@ -22,23 +16,13 @@ class GiveawaySystem(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.active_giveaways = {}
-        self.giveaway_tasks = {}
         self.persistent_views_added = False
+        self.scheduler = get_scheduler(bot)
+        self.scheduler.register('giveaway_end', self.run_giveaway_end)
         
-        # Ensure data directory exists
-        os.makedirs('data', exist_ok=True)
-        
-        # Load active giveaways
+        # Giveaways are stored one row each, ended ones are kept for /reroll
+        self.giveaways = get_document_store().collection('giveaways', legacy_file='data/giveaways.json')
         self.load_giveaways()
-        
-        # Start the background task for checking giveaways
-        self.check_giveaways.start()
-    
-    def cog_unload(self):
-        """Called when the cog is unloaded."""
-        self.check_giveaways.cancel()
-        for task in self.giveaway_tasks.values():
-            task.cancel()
     
     @commands.Cog.listener()
     async def on_ready(self):
@@ -72,60 +56,58 @@ class GiveawaySystem(commands.Cog):
                             view = GiveawayView(self)
                             await message.edit(view=view)
                             
-                            # Schedule the end task
-                            self.schedule_giveaway_end(giveaway_id, end_time - current_time)
+                            # Make sure the end is scheduled, e.g. for giveaways started before the scheduler existed
+                            self.schedule_giveaway_end(giveaway_id, end_time)
                             logger.info(f"Resumed giveaway {giveaway_id}")
                         except discord.NotFound:
                             logger.warning(f"Could not find message for giveaway {giveaway_id}, removing it")
-                            del self.active_giveaways[giveaway_id]
-                            self.save_giveaways()
+                            self.remove_giveaway(giveaway_id)
                     else:
                         logger.warning(f"Could not find channel for giveaway {giveaway_id}, removing it")
-                        del self.active_giveaways[giveaway_id]
-                        self.save_giveaways()
+                        self.remove_giveaway(giveaway_id)
             else:
                 # Giveaway has ended, process it
                 await self.end_giveaway(giveaway_id, announce=True)
     
     def load_giveaways(self):
-        """Load active giveaways from JSON file."""
+        """Load active giveaways from the document store."""
         try:
-            if os.path.exists('data/giveaways.json'):
-                with open('data/giveaways.json', 'r') as f:
-                    self.active_giveaways = json.load(f)
-                logger.info(f"Loaded {len(self.active_giveaways)} active giveaways")
-            else:
-                self.save_giveaways()
+            self.active_giveaways = {
+                giveaway_id: giveaway for giveaway_id, giveaway in self.giveaways.all().items()
+                if not giveaway.get('ended')
+            }
+            logger.info(f"Loaded {len(self.active_giveaways)} active giveaways")
         except Exception as e:
             logger.error(f"Error loading giveaways: {e}")
             self.active_giveaways = {}
-            self.save_giveaways()
     
-    def save_giveaways(self):
-        """Save active giveaways to JSON file."""
+    def save_giveaway(self, giveaway_id):
+        """Save one giveaway to the document store."""
+        try:
+            self.giveaways.put(giveaway_id, self.active_giveaways[giveaway_id])
+        except Exception as e:
+            logger.error(f"Error saving giveaway {giveaway_id}: {e}")
+    
+    def remove_giveaway(self, giveaway_id):
+        """Remove a giveaway from the active giveaways and the document store."""
+        self.active_giveaways.pop(giveaway_id, None)
         try:
-            with open('data/giveaways.json', 'w') as f:
-                json.dump(self.active_giveaways, f, indent=4)
-            logger.info(f"Saved {len(self.active_giveaways)} active giveaways")
+            self.giveaways.delete(giveaway_id)
         except Exception as e:
-            logger.error(f"Error saving giveaways: {e}")
+            logger.error(f"Error removing giveaway {giveaway_id}: {e}")
     
     def generate_giveaway_id(self):
         """Generate a unique ID for a giveaway."""
         return f"giveaway-{len(self.active_giveaways) + 1}-{random.randint(1000, 9999)}"
     
-    def schedule_giveaway_end(self, giveaway_id, seconds):
-        """Schedule a task to end a giveaway after the specified time."""
-        if giveaway_id in self.giveaway_tasks:
-            self.giveaway_tasks[giveaway_id].cancel()
-        
-        async def end_task():
-            await asyncio.sleep(seconds)
-            await self.end_giveaway(giveaway_id, announce=True)
-        
-        task = asyncio.create_task(end_task())
-        self.giveaway_tasks[giveaway_id] = task
-        logger.info(f"Scheduled giveaway {giveaway_id} to end in {seconds} seconds")
+    def schedule_giveaway_end(self, giveaway_id, end_time):
+        """Schedule a giveaway to end at the given timestamp."""
+        self.scheduler.schedule('giveaway_end', f"giveaway_end:{giveaway_id}", end_time, {'giveaway_id': giveaway_id})
+        logger.info(f"Scheduled giveaway {giveaway_id} to end at {datetime.datetime.fromtimestamp(end_time)}")
+    
+    async def run_giveaway_end(self, job_id, payload):
+        """Scheduler job that ends a giveaway when its time is up."""
+        await self.end_giveaway(payload['giveaway_id'], announce=True)
     
     @app_commands.command(
         name="giveaway",
@@ -217,14 +199,11 @@ class GiveawaySystem(commands.Cog):
         message_id = giveaway.get('message_id')
         prize = giveaway.get('prize')
         
-        # Cancel task if it exists
-        if giveaway_id in self.giveaway_tasks:
-            self.giveaway_tasks[giveaway_id].cancel()
-            del self.giveaway_tasks[giveaway_id]
+        # Cancel the scheduled end
+        self.scheduler.cancel(f"giveaway_end:{giveaway_id}")
         
         # Remove from active giveaways
-        del self.active_giveaways[giveaway_id]
-        self.save_giveaways()
+        self.remove_giveaway(giveaway_id)
         
         # Update the message
         channel = self.bot.get_channel(int(channel_id))
@@ -345,25 +324,14 @@ class GiveawaySystem(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         
         # Check if the giveaway exists (even if it's not active anymore)
-        try:
-            with open('data/giveaways.json', 'r') as f:
-                all_giveaways = json.load(f)
-        except:
-            all_giveaways = {}
-        
-        if giveaway_id not in all_giveaways and giveaway_id not in self.active_giveaways:
+        giveaway = self.active_giveaways.get(giveaway_id) or self.giveaways.get(giveaway_id)
+        if giveaway is None:
             await interaction.followup.send(
                 f"No giveaway found with ID: {giveaway_id}",
                 ephemeral=True
             )
             return
         
-        # Get the giveaway data
-        if giveaway_id in self.active_giveaways:
-            giveaway = self.active_giveaways[giveaway_id]
-        else:
-            giveaway = all_giveaways[giveaway_id]
-        
         channel_id = giveaway.get('channel_id')
         message_id = giveaway.get('message_id')
         prize = giveaway.get('prize')
@@ -478,10 +446,10 @@ class GiveawaySystem(commands.Cog):
             'host_user_id': str(host_user.id),
             'participants': []
         }
-        self.save_giveaways()
+        self.save_giveaway(giveaway_id)
         
         # Schedule the giveaway to end
-        self.schedule_giveaway_end(giveaway_id, duration_seconds)
+        self.schedule_giveaway_end(giveaway_id, end_timestamp)
         
         return giveaway_id
     
@@ -505,24 +473,20 @@ class GiveawaySystem(commands.Cog):
         winners_count = giveaway.get('winners_count', 1)
         host_user_id = giveaway.get('host_user_id')
         
-        # Cancel task if it exists
-        if giveaway_id in self.giveaway_tasks:
-            self.giveaway_tasks[giveaway_id].cancel()
-            del self.giveaway_tasks[giveaway_id]
+        # Cancel the scheduled end in case the giveaway was ended early
+        self.scheduler.cancel(f"giveaway_end:{giveaway_id}")
         
         try:
             channel = self.bot.get_channel(int(channel_id))
             if not channel:
                 logger.warning(f"Channel {channel_id} not found for giveaway {giveaway_id}")
-                del self.active_giveaways[giveaway_id]
-                self.save_giveaways()
+                self.remove_giveaway(giveaway_id)
                 return
             
             message = await channel.fetch_message(int(message_id))
             if not message:
                 logger.warning(f"Message {message_id} not found for giveaway {giveaway_id}")
-                del self.active_giveaways[giveaway_id]
-                self.save_giveaways()
+                self.remove_giveaway(giveaway_id)
                 return
             
             # Get participants by reaction
@@ -595,36 +559,18 @@ class GiveawaySystem(commands.Cog):
                         allowed_mentions=discord.AllowedMentions(users=selected_winners + ([host_user] if host_user else []))
                     )
             
-            # Remove from active giveaways but keep in the file
+            # Remove from active giveaways but keep it stored
             # We'll just mark it as ended so it can be rerolled if needed
             giveaway['ended'] = True
             giveaway['end_time'] = datetime.datetime.now().timestamp()
-            self.save_giveaways()
+            self.save_giveaway(giveaway_id)
             del self.active_giveaways[giveaway_id]
             
         except Exception as e:
             logger.error(f"Error ending giveaway {giveaway_id}: {e}")
             # Remove problematic giveaway
             if giveaway_id in self.active_giveaways:
-                del self.active_giveaways[giveaway_id]
-                self.save_giveaways()
-    
-    @tasks.loop(minutes=1)
-    async def check_giveaways(self):
-        """Periodically check for ended giveaways."""
-        current_time = datetime.datetime.now().timestamp()
-        
-        for giveaway_id, giveaway in list(self.active_giveaways.items()):
-            end_time = giveaway.get('end_time', 0)
-            
-            if end_time <= current_time:
-                logger.info(f"Giveaway {giveaway_id} has ended, processing it")
-                await self.end_giveaway(giveaway_id)
-    
-    @check_giveaways.before_loop
-    async def before_check_giveaways(self):
-        """Wait for the bot to be ready before starting the task."""
-        await self.bot.wait_until_ready()
+                self.remove_giveaway(giveaway_id)
 
 
 class GiveawayView(discord.ui.View):
@@ -666,7 +612,7 @@ class GiveawayView(discord.ui.View):
         
         if user_id not in self.giveaway_system.active_giveaways[giveaway_id]['participants']:
             self.giveaway_system.active_giveaways[giveaway_id]['participants'].append(user_id)
-            self.giveaway_system.save_giveaways()
+            self.giveaway_system.save_giveaway(giveaway_id)
             
             await interaction.response.send_message(
                 "You have entered the giveaway! Good luck! 🍀",
@@ -9,8 +9,11 @@ import logging
 import asyncio
 import datetime
 import uuid
-from database import Database
+from database import get_database
+from rewards import CoinSource
 from logger import setup_logger
+from message_router import get_message_router
+from document_store import get_document_store
 
 logger = setup_logger('grumbleteeth')
 
@@ -19,17 +22,20 @@ class GrumbleteethCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.infected_users = {}  # Dict to store user_id -> infection_time
         self.inactive_threshold = 3 * 60 * 60  # 3 hours in seconds
         self.check_interval = 5 * 60  # Check every 5 minutes
         self.shop_items = {}  # Dict to store shop items
-        self.user_purchases = {}  # Dict to store user purchases
+        
+        # Infections and purchases are stored one row per user; purchases are shared with the shop
+        store = get_document_store()
+        self.infections = store.collection('grumbleteeth_infections', legacy_file='data/grumbleteeth_users.json')
+        self.purchases = store.collection('user_purchases', legacy_file='data/user_purchases.json')
         self.admin_user_id = "1308527904497340467"  # Admin user ID for restricted commands
 
         self.load_infected_users()
         self.load_shop_items()
-        self.load_user_purchases()
 
         if not self.shop_items:
             self.shop_items["antidote"] = {
@@ -45,26 +51,13 @@ class GrumbleteethCog(commands.Cog):
             self.save_shop_items()
 
     def load_infected_users(self):
-        """Load the infected users and their last activity time from file"""
+        """Load the infected users and their infection time from the document store"""
         try:
-            os.makedirs('data', exist_ok=True)
-            if os.path.exists('data/grumbleteeth_users.json'):
-                with open('data/grumbleteeth_users.json', 'r') as f:
-                    self.infected_users = json.load(f)
-                    logger.info(f"Loaded {len(self.infected_users)} infected users")
+            self.infected_users = self.infections.all()
+            logger.info(f"Loaded {len(self.infected_users)} infected users")
         except Exception as e:
             logger.error(f"Error loading infected users: {e}")
     
-    def save_infected_users(self):
-        """Save the infected users and their last activity time to file"""
-        try:
-            os.makedirs('data', exist_ok=True)
-            with open('data/grumbleteeth_users.json', 'w') as f:
-                json.dump(self.infected_users, f)
-                logger.info(f"Saved {len(self.infected_users)} infected users")
-        except Exception as e:
-            logger.error(f"Error saving infected users: {e}")
-    
     def is_infected(self, user_id):
         """Check if a user is infected with grumbleteeth"""
         return str(user_id) in self.infected_users
@@ -73,14 +66,14 @@ class GrumbleteethCog(commands.Cog):
         """Infect a user with grumbleteeth"""
         if not self.is_infected(user_id):
             self.infected_users[str(user_id)] = time.time()
-            self.save_infected_users()
+            self.infections.put(user_id, self.infected_users[str(user_id)])
             logger.info(f"User {user_id} infected with grumbleteeth")
     
     def cure_user(self, user_id):
         """Cure a user of grumbleteeth"""
         if self.is_infected(user_id):
             del self.infected_users[str(user_id)]
-            self.save_infected_users()
+            self.infections.delete(user_id)
             logger.info(f"User {user_id} cured of grumbleteeth")
             return True
         return False
@@ -106,35 +99,10 @@ class GrumbleteethCog(commands.Cog):
         except Exception as e:
             logger.error(f"Error saving shop items: {e}")
     
-    def load_user_purchases(self):
-        """Load user purchases from file"""
-        try:
-            os.makedirs('data', exist_ok=True)
-            if os.path.exists('data/user_purchases.json'):
-                with open('data/user_purchases.json', 'r') as f:
-                    self.user_purchases = json.load(f)
-
-                    count = sum(len(purchases) for purchases in self.user_purchases.values())
-                    logger.info(f"Loaded {count} user purchases for {len(self.user_purchases)} users")
-        except Exception as e:
-            logger.error(f"Error loading user purchases: {e}")
-    
-    def save_user_purchases(self):
-        """Save user purchases to file"""
-        try:
-            os.makedirs('data', exist_ok=True)
-            with open('data/user_purchases.json', 'w') as f:
-                json.dump(self.user_purchases, f)
-
-                count = sum(len(purchases) for purchases in self.user_purchases.values())
-                logger.info(f"Saved {count} user purchases for {len(self.user_purchases)} users")
-        except Exception as e:
-            logger.error(f"Error saving user purchases: {e}")
-    
     def get_purchase_count(self, user_id, item_id, cap_type):
         """Get the number of times a user has purchased an item within the cap period"""
-        user_id = str(user_id)
-        if user_id not in self.user_purchases:
+        purchases = self.purchases.get(user_id, [])
+        if not purchases:
             return 0
             
         count = 0
@@ -173,40 +141,40 @@ class GrumbleteethCog(commands.Cog):
 
             cap_start_time = 0
 
-        for purchase in self.user_purchases[user_id]:
-            if purchase["item_id"] == item_id and purchase["purchased_at"] >= cap_start_time:
+        for purchase in purchases:
+            # Shop purchases share this collection but have no item_id
+            if purchase.get("item_id") == item_id and purchase["purchased_at"] >= cap_start_time:
                 count += 1
                 
         return count
         
     def add_item_to_inventory(self, user_id, item_id):
         """Add an item to a user's inventory"""
-        user_id = str(user_id)
-        if user_id not in self.user_purchases:
-            self.user_purchases[user_id] = []
+        purchases = self.purchases.get(user_id, [])
 
         purchase_id = str(uuid.uuid4())
-        self.user_purchases[user_id].append({
+        purchases.append({
             "item_id": item_id,
             "purchased_at": time.time(),
             "purchase_id": purchase_id
         })
         
-        self.save_user_purchases()
+        self.purchases.put(user_id, purchases)
         return purchase_id
     
     def use_item(self, user_id, purchase_id):
         """Use an item from a user's inventory"""
         user_id = str(user_id)
-        if user_id not in self.user_purchases:
+        purchases = self.purchases.get(user_id, [])
+        if not purchases:
             return False, "You don't have any items."
 
-        for i, purchase in enumerate(self.user_purchases[user_id]):
-            if purchase["purchase_id"] == purchase_id:
+        for i, purchase in enumerate(purchases):
+            if purchase.get("purchase_id") == purchase_id:
                 item_id = purchase["item_id"]
 
-                self.user_purchases[user_id].pop(i)
-                self.save_user_purchases()
+                purchases.pop(i)
+                self.purchases.put(user_id, purchases)
 
                 if item_id == "antidote":
                     success = self.cure_user(user_id)
@@ -218,13 +186,9 @@ class GrumbleteethCog(commands.Cog):
     
     def get_user_inventory(self, user_id):
         """Get a user's inventory of purchased items"""
-        user_id = str(user_id)
-        if user_id not in self.user_purchases:
-            return []
-        
         inventory = []
-        for purchase in self.user_purchases[user_id]:
-            item_id = purchase["item_id"]
+        for purchase in self.purchases.get(user_id, []):
+            item_id = purchase.get("item_id")
             if item_id in self.shop_items:
                 item = self.shop_items[item_id].copy()
                 item["purchase_id"] = purchase["purchase_id"]
@@ -273,11 +237,13 @@ class GrumbleteethCog(commands.Cog):
     async def cog_load(self):
         """Called when the cog is loaded."""
         self.bg_task = asyncio.create_task(self.check_inactive_users())
+        get_message_router(self.bot).subscribe('grumbleteeth', self.handle_message, guild_only=False)
         
     def cog_unload(self):
         """Called when the cog is unloaded."""
         if self.bg_task:
             self.bg_task.cancel()
+        get_message_router(self.bot).unsubscribe('grumbleteeth')
     
     async def check_inactive_users(self):
         """Background task - DISABLED
@@ -448,7 +414,7 @@ class GrumbleteethCog(commands.Cog):
                 )
                 return
 
-        self.db.add_coins(user_id, username, -item_to_buy["price"])
+        self.db.add_coins(user_id, username, -item_to_buy["price"], CoinSource.SHOP)
 
         try:
             log_channel = self.bot.get_channel(1352717796336996422)
@@ -470,7 +436,7 @@ class GrumbleteethCog(commands.Cog):
 
             if not self.is_infected(user_id):
 
-                self.db.add_coins(user_id, username, item_to_buy["price"])
+                self.db.add_coins(user_id, username, item_to_buy["price"], CoinSource.REFUND)
                 await interaction.response.send_message(
                     f"❌ You don't need an antidote because you're not infected with grumbleteeth. Your {item_to_buy['price']} coins have been refunded.",
                     ephemeral=True
@@ -917,13 +883,9 @@ class GrumbleteethCog(commands.Cog):
                 ephemeral=True
             )
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def handle_message(self, message):
         """Process messages to update activity, but do not apply grumbleteeth effect as it's disabled"""
 
-        if message.author.bot:
-            return
-
         self.update_user_activity(message.author.id)
 
 class ShopView(discord.ui.View):
@@ -984,7 +946,7 @@ class ShopView(discord.ui.View):
                 )
                 return
 
-            self.cog.db.add_coins(interaction.user.id, interaction.user.name, -item["price"])
+            self.cog.db.add_coins(interaction.user.id, interaction.user.name, -item["price"], CoinSource.SHOP)
 
             self.cog.cure_user(interaction.user.id)
             
@@ -0,0 +1,320 @@
+import os
+import math
+import time
+import bisect
+import asyncio
+from aiohttp import web
+from discord.utils import MISSING
+from logger import setup_logger
+
+logger = setup_logger('instrumentation', 'bot.log')
+
+METRICS_PORT_ENV = 'METRICS_PORT'  # Instrumentation is only installed when this is set
+METRICS_HOST = '127.0.0.1'  # The endpoint is only reachable from this machine
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+LAG_SAMPLE_INTERVAL = 0.5  # Seconds between event loop lag samples
+SLOW_HANDLER_SECONDS = 0.5  # Listeners and commands slower than this are logged as warnings
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class LatencyHistogram:
+    """Call count, errors and a latency histogram for one listener, command or the event loop."""
+
+    __slots__ = ('count', 'total', 'max', 'errors', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # The last bucket is +Inf
+
+    def record(self, elapsed, failed=False):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if failed:
+            self.errors += 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def summary(self):
+        return {
+            'calls': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total * 1000 / self.count if self.count else 0.0,
+            'max_ms': self.max * 1000,
+            'total_ms': self.total * 1000
+        }
+
+def _handler_name(func):
+    func = getattr(func, '__func__', func)
+    name = getattr(func, '__qualname__', None) or repr(func)
+    return name.replace('<locals>.', '')
+
+class TimedListener:
+    """Wraps an event listener to time it. Compares equal to the listener, so remove_listener still works."""
+
+    def __init__(self, instrumentation, event, func):
+        self.func = func
+        self.__name__ = getattr(func, '__name__', event)
+        self.histogram = instrumentation.listener_histogram(event, _handler_name(func))
+
+    async def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await self.func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.histogram.record(elapsed, failed)
+            if elapsed > SLOW_HANDLER_SECONDS:
+                logger.warning(f"Listener {_handler_name(self.func)} took {elapsed:.2f}s")
+
+    def __eq__(self, other):
+        if isinstance(other, TimedListener):
+            other = other.func
+        return self.func == other
+
+    def __hash__(self):
+        return hash(self.func)
+
+class Instrumentation:
+    """
+    Timing for every event listener and app command, and event loop lag sampling.
+    Listeners registered with the bot are wrapped in TimedListener, and app commands
+    are timed from the tree's interaction check to their completion or error. The
+    results are served as Prometheus text on /metrics and as JSON on /metrics.json
+    for the web dashboard, together with the message router and scheduler stats.
+
+    Nothing is wrapped unless instrument_bot() finds METRICS_PORT set, so a bot
+    without it runs its handlers exactly as before.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.listeners = {}  # (event, listener name) -> LatencyHistogram
+        self.commands = {}  # command name -> LatencyHistogram
+        self.loop_lag = LatencyHistogram()
+        self.started_at = time.time()
+        self.lag_task = None
+        self.runner = None
+
+    def listener_histogram(self, event, name):
+        return self.listeners.setdefault((event, name), LatencyHistogram())
+
+    def _wrap(self, event, func):
+        if isinstance(func, TimedListener):
+            return func
+        return TimedListener(self, event, func)
+
+    def install(self):
+        """Wrap the listeners and command tree of the bot. Call once every cog has been set up."""
+        bot = self.bot
+
+        for event, listeners in bot.extra_events.items():
+            listeners[:] = [self._wrap(event, func) for func in listeners]
+        # Handlers registered with @bot.event are attributes of the bot itself
+        for name, func in list(vars(bot).items()):
+            if name.startswith('on_') and asyncio.iscoroutinefunction(func):
+                setattr(bot, name, self._wrap(name, func))
+
+        # Listeners added later, e.g. by a reloaded cog, are wrapped as they are added
+        add_listener = bot.add_listener
+
+        def add_timed_listener(func, name=MISSING):
+            add_listener(func, name)
+            event = func.__name__ if name is MISSING else name
+            listeners = bot.extra_events.get(event, [])
+            if listeners and listeners[-1] is func:
+                listeners[-1] = self._wrap(event, func)
+
+        bot.add_listener = add_timed_listener
+
+        tree = bot.tree
+        interaction_check = tree.interaction_check
+        on_error = tree.on_error
+
+        async def timed_interaction_check(interaction):
+            interaction.extras['instrumentation_started'] = time.perf_counter()
+            return await interaction_check(interaction)
+
+        async def timed_on_error(interaction, error):
+            self._record_command(interaction, interaction.command, failed=True)
+            await on_error(interaction, error)
+
+        async def on_app_command_completion(interaction, command):
+            self._record_command(interaction, command, failed=False)
+
+        tree.interaction_check = timed_interaction_check
+        tree.on_error = timed_on_error
+        bot.extra_events.setdefault('on_app_command_completion', []).append(on_app_command_completion)
+
+        self.lag_task = asyncio.create_task(self._sample_loop_lag())
+        logger.info(f"Instrumented {sum(len(listeners) for listeners in bot.extra_events.values())} listeners")
+
+    def _record_command(self, interaction, command, failed):
+        started = interaction.extras.pop('instrumentation_started', None)
+        if started is None or command is None:
+            return
+        elapsed = time.perf_counter() - started
+        name = command.qualified_name
+        self.commands.setdefault(name, LatencyHistogram()).record(elapsed, failed)
+        if elapsed > SLOW_HANDLER_SECONDS:
+            logger.warning(f"Command /{name} took {elapsed:.2f}s")
+
+    async def _sample_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            self.loop_lag.record(max(0.0, loop.time() - started - LAG_SAMPLE_INTERVAL))
+
+    async def start_server(self, port, host=METRICS_HOST):
+        """Serve /metrics and /metrics.json on a local port."""
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        app.router.add_get('/metrics.json', self._handle_metrics_json)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"Metrics served on http://{host}:{port}/metrics")
+
+    async def stop(self):
+        """Stop lag sampling and the metrics server."""
+        if self.lag_task:
+            self.lag_task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.render_prometheus(), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+    async def _handle_metrics_json(self, request):
+        return web.json_response(self.snapshot())
+
+    def _router_stats(self):
+        router = getattr(self.bot, 'message_router', None)
+        return router.get_stats() if router else []
+
+    def _scheduler_stats(self):
+        scheduler = getattr(self.bot, 'scheduler', None)
+        return scheduler.get_stats() if scheduler else []
+
+    def snapshot(self):
+        """Get every metric as plain data, slowest handlers first, for the web dashboard.
+
+        Returns:
+            dict: uptime, gateway_latency_ms, loop_lag, listeners, commands, message_handlers and jobs
+        """
+        listeners = [dict(event=event, listener=name, **histogram.summary())
+                     for (event, name), histogram in self.listeners.items() if histogram.count]
+        commands = [dict(command=name, **histogram.summary()) for name, histogram in self.commands.items()]
+        latency = self.bot.latency  # NaN or infinite until the gateway has sent a heartbeat
+        return {
+            'uptime': time.time() - self.started_at,
+            'gateway_latency_ms': latency * 1000 if math.isfinite(latency) else None,
+            'loop_lag': self.loop_lag.summary(),
+            'listeners': sorted(listeners, key=lambda row: row['total_ms'], reverse=True),
+            'commands': sorted(commands, key=lambda row: row['total_ms'], reverse=True),
+            'message_handlers': self._router_stats(),
+            'jobs': self._scheduler_stats()
+        }
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, histogram):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), histogram.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        header('bot_uptime_seconds', 'gauge', 'Seconds since instrumentation was installed')
+        lines.append(f"bot_uptime_seconds {time.time() - self.started_at}")
+        latency = self.bot.latency
+        if math.isfinite(latency):
+            header('bot_gateway_latency_seconds', 'gauge', 'Gateway heartbeat latency')
+            lines.append(f"bot_gateway_latency_seconds {latency}")
+
+        header('bot_event_loop_lag_seconds', 'histogram', 'How late the event loop woke up for a timer')
+        histogram('bot_event_loop_lag_seconds', {}, self.loop_lag)
+
+        header('bot_listener_duration_seconds', 'histogram', 'Time spent in event listeners')
+        for (event, name), listener in sorted(self.listeners.items()):
+            histogram('bot_listener_duration_seconds', {'event': event, 'listener': name}, listener)
+        header('bot_listener_errors_total', 'counter', 'Event listener calls that raised')
+        for (event, name), listener in sorted(self.listeners.items()):
+            lines.append(f"bot_listener_errors_total{_labels({'event': event, 'listener': name})} {listener.errors}")
+
+        header('bot_command_duration_seconds', 'histogram', 'Time from an app command interaction to its completion')
+        for name, command in sorted(self.commands.items()):
+            histogram('bot_command_duration_seconds', {'command': name}, command)
+        header('bot_command_errors_total', 'counter', 'App commands that failed')
+        for name, command in sorted(self.commands.items()):
+            lines.append(f"bot_command_errors_total{_labels({'command': name})} {command.errors}")
+
+        router_stats = self._router_stats()
+        header('bot_message_handler_calls_total', 'counter', 'Messages dispatched to each message router stage')
+        for row in router_stats:
+            lines.append(f"bot_message_handler_calls_total{_labels({'stage': row['stage']})} {row['calls']}")
+        header('bot_message_handler_seconds_total', 'counter', 'Time spent in each message router stage')
+        for row in router_stats:
+            lines.append(f"bot_message_handler_seconds_total{_labels({'stage': row['stage']})} {row['total_ms'] / 1000}")
+        header('bot_message_handler_errors_total', 'counter', 'Message router subscriber calls that raised')
+        for row in router_stats:
+            lines.append(f"bot_message_handler_errors_total{_labels({'stage': row['stage']})} {row['errors']}")
+
+        scheduler_stats = self._scheduler_stats()
+        header('bot_scheduler_jobs_pending', 'gauge', 'Scheduled jobs waiting to run')
+        for row in scheduler_stats:
+            lines.append(f"bot_scheduler_jobs_pending{_labels({'kind': row['kind']})} {row['pending']}")
+        header('bot_scheduler_job_runs_total', 'counter', 'Scheduled jobs run')
+        for row in scheduler_stats:
+            lines.append(f"bot_scheduler_job_runs_total{_labels({'kind': row['kind']})} {row['runs']}")
+        header('bot_scheduler_job_failures_total', 'counter', 'Scheduled jobs that raised')
+        for row in scheduler_stats:
+            lines.append(f"bot_scheduler_job_failures_total{_labels({'kind': row['kind']})} {row['failures']}")
+
+        return '\n'.join(lines) + '\n'
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+async def instrument_bot(bot):
+    """Install instrumentation and start the metrics endpoint if METRICS_PORT is set.
+
+    Call after every cog is set up and every @bot.event handler is defined.
+
+    Returns:
+        Instrumentation: The installed instrumentation, or None if it's disabled
+    """
+    port = os.getenv(METRICS_PORT_ENV)
+    if not port:
+        return None
+
+    instrumentation = Instrumentation(bot)
+    instrumentation.install()
+    try:
+        await instrumentation.start_server(int(port))
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not serve metrics on port {port}: {e}")
+    bot.instrumentation = instrumentation
+    return instrumentation
@@ -7,9 +7,10 @@ import asyncio
 import random
 import datetime
 from datetime import timedelta
-import logging
+from logger import setup_logger
 from typing import Dict, List, Optional, Tuple, Union
-from database import Database
+from database import get_database
+from rewards import CoinSource
 from income_breakdown import format_income_breakdown, get_property_income_contribution
 
 def format_collection_cooldown(investment):
@@ -37,12 +38,7 @@ def format_collection_cooldown(investment):
     return f"Cooldown: {minutes}m {seconds}s remaining"
 
 # Set up logging
-logger = logging.getLogger('investment_system')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('investment_system')
 
 # Define business investment categories with correct stats
 LUXURY_PROPERTIES = {
@@ -169,7 +165,7 @@ class Investment:
 class InvestmentManager:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.data_path = "data/luxury_properties.json"
         self.investments = {}  # {user_id: [Investment objects]}
         self.properties = LUXURY_PROPERTIES  # Our defined luxury properties
@@ -243,7 +239,7 @@ class InvestmentManager:
             return False, f"You already own {property_name}."
             
         # Purchase the property
-        success = self.db.remove_coins(user_id, price)
+        success = self.db.remove_coins(user_id, price, CoinSource.INVESTMENT_PURCHASE)
         if not success:
             return False, "Failed to deduct coins from your account."
             
@@ -287,7 +283,7 @@ class InvestmentManager:
             del self.investments[user_id]  # Clean up empty lists
             
         # Add coins to user
-        success = self.db.add_coins(user_id, sell_price)
+        success = self.db.add_coins(user_id, None, sell_price, CoinSource.INVESTMENT_SALE)
         if not success:
             # Put the property back if coins couldn't be added
             if user_id not in self.investments:
@@ -340,7 +336,7 @@ class InvestmentManager:
             return False, f"You don't have enough coins to maintain this property. You need {maintenance_cost:,} coins, but you only have {user_coins:,} coins."
             
         # Perform maintenance
-        success = self.db.remove_coins(user_id, maintenance_cost)
+        success = self.db.remove_coins(user_id, maintenance_cost, CoinSource.INVESTMENT_MAINTENANCE)
         if not success:
             return False, "Failed to deduct coins from your account."
             
@@ -389,7 +385,7 @@ class InvestmentManager:
             return False, f"You don't have enough coins to repair this property. You need {repair_cost:,} coins, but you only have {user_coins:,} coins."
             
         # Perform repair
-        success = self.db.remove_coins(user_id, repair_cost)
+        success = self.db.remove_coins(user_id, repair_cost, CoinSource.INVESTMENT_REPAIR)
         if not success:
             return False, "Failed to deduct coins from your account."
             
@@ -454,7 +450,7 @@ class InvestmentManager:
         
         try:
             # Add coins to user - using explicit try/except to catch any DB errors
-            success = self.db.add_coins_simple(user_id, income)
+            success = self.db.add_coins_simple(user_id, income, CoinSource.INVESTMENT_INCOME)
             if not success:
                 # Return the income if coins couldn't be added
                 investment.accumulated_income = income
@@ -540,7 +536,7 @@ class InvestmentManager:
         
         try:
             # Add coins to user
-            success = self.db.add_coins_simple(user_id, total_collected)
+            success = self.db.add_coins_simple(user_id, total_collected, CoinSource.INVESTMENT_INCOME)
             if not success:
                 # Rollback the accumulated income changes
                 for i, investment in enumerate(investments_with_income):
@@ -605,7 +601,7 @@ class InvestmentManager:
             return False, f"You don't have enough coins to maintain all properties. You need {total_cost:,} coins, but you only have {user_coins:,} coins.", 0
             
         # Perform maintenance on all properties
-        success = self.db.remove_coins(user_id, total_cost)
+        success = self.db.remove_coins(user_id, total_cost, CoinSource.INVESTMENT_MAINTENANCE)
         if not success:
             return False, "Failed to deduct coins from your account.", 0
             
@@ -884,7 +880,7 @@ class InvestmentCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.investment_manager = InvestmentManager(bot)
-        self.db = Database()
+        self.db = get_database()
         logger.info("Investment cog initialized")
         
     async def cog_load(self):
@@ -11,7 +11,8 @@ import time
 
 logger = logging.getLogger('investments')
 from typing import Dict, List, Optional, Tuple, Union
-from database import Database
+from database import get_database
+from rewards import CoinSource
 from logger import setup_logger
 
 logger = setup_logger('investments')
@@ -135,7 +136,7 @@ class UserInvestment:
 class InvestmentSystem:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.data_file = "data/investments.json"
         self.maintenance_file = 'data/maintenance_times.json'
         self.last_update = datetime.datetime.now()
@@ -615,7 +616,7 @@ class InvestmentsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.investment_system = InvestmentSystem(bot)
-        self.db = Database()
+        self.db = get_database()
         self.investment_task = None
         logger.info("Investments cog initialized")
         
@@ -1095,7 +1096,7 @@ class InvestmentView(discord.ui.View):
                         )
                         return
 
-                    self.db.add_coins(self.user_id, user_data["username"], -investment.cost)
+                    self.db.add_coins(self.user_id, user_data["username"], -investment.cost, CoinSource.INVESTMENT_PURCHASE)
                     success = self.investment_system.add_investment(self.user_id, name)
                     
                     if success:
@@ -1203,7 +1204,7 @@ class InvestmentPurchaseView(discord.ui.View):
                     return
                 
                 # Try to purchase the investment
-                self.db.add_coins(self.user_id, user_data.get('username', 'User'), -investment.cost)
+                self.db.add_coins(self.user_id, user_data.get('username', 'User'), -investment.cost, CoinSource.INVESTMENT_PURCHASE)
                 success = self.investment_system.add_investment(self.user_id, name)
                 
                 if success:
@@ -1294,7 +1295,7 @@ class InvestmentPurchaseView(discord.ui.View):
                     await interaction.followup.send(embed=embed, view=view)
                 else:
                     # Refund the coins if purchase failed
-                    self.db.add_coins(self.user_id, user_data.get('username', 'User'), investment.cost)
+                    self.db.add_coins(self.user_id, user_data.get('username', 'User'), investment.cost, CoinSource.REFUND)
                     
                     await interaction.followup.send(
                         f"❌ Error purchasing {name}. You may already own this property. Your coins have been refunded.",
@@ -1400,7 +1401,7 @@ class ManageInvestmentsView(discord.ui.View):
                 elif collected > 0:
                     total_collected += collected
                     collected_businesses.append((inv.investment_name, collected))
-                    self.db.add_coins(self.user_id, None, collected)
+                    self.db.add_coins(self.user_id, None, collected, CoinSource.INVESTMENT_INCOME)
             
             rainbow_color = random.randint(0, 0xFFFFFF)
             embed = discord.Embed(
@@ -1730,7 +1731,7 @@ class BusinessManagementView(discord.ui.View):
             
             if collected > 0:
                 # Add the coins to the user's balance
-                self.db.add_coins(self.user_id, None, collected)
+                self.db.add_coins(self.user_id, None, collected, CoinSource.INVESTMENT_INCOME)
                 
                 # Get the updated user data
                 user_data = self.db.get_user(self.user_id)
@@ -2126,7 +2127,7 @@ class BusinessManagementView(discord.ui.View):
                     cooldowns.append(inv.investment_name)
 
         if total_collected > 0:
-            self.db.add_coins(self.user_id, user_data["username"], total_collected)
+            self.db.add_coins(self.user_id, user_data["username"], total_collected, CoinSource.INVESTMENT_INCOME)
 
             frames = [
                 f"💰 Collecting coins... `[⬛⬛⬛⬛⬛⬛⬛⬛⬛⬛]` 0%",
@@ -2253,7 +2254,7 @@ class BusinessManagementView(discord.ui.View):
         self.investment_system.save_last_maintenance_time()
                 
         if businesses_maintained > 0:
-            self.db.add_coins(self.user_id, user_data["username"], -total_maintenance_cost)
+            self.db.add_coins(self.user_id, user_data["username"], -total_maintenance_cost, CoinSource.INVESTMENT_MAINTENANCE)
 
             final_message = f"✅ Performed maintenance on {businesses_maintained} businesses (+25% maintenance on each) for {total_maintenance_cost:,} coins total."
 
@@ -2341,7 +2342,7 @@ class BusinessDetailView(discord.ui.View):
             
             if coins > 0:
 
-                self.db.add_coins(self.user_id, user_data["username"], coins)
+                self.db.add_coins(self.user_id, user_data["username"], coins, CoinSource.INVESTMENT_INCOME)
 
                 message = await interaction.followup.send(
                     f"🧮 Counting coins from your {self.business_name}...",
@@ -2487,7 +2488,7 @@ class BusinessDetailView(discord.ui.View):
             success = self.investment_system.maintain_investment(self.user_id, self.business_name)
             
             if success:
-                self.db.add_coins(self.user_id, user_data["username"], -maintenance_cost)
+                self.db.add_coins(self.user_id, user_data["username"], -maintenance_cost, CoinSource.INVESTMENT_MAINTENANCE)
 
                 self.investment_system.save_last_maintenance_time()
 
@@ -2522,7 +2523,7 @@ class BusinessDetailView(discord.ui.View):
             success = self.investment_system.maintain_investment(self.user_id, self.business_name)
             
             if success:
-                self.db.add_coins(self.user_id, user_data["username"], -maintenance_cost)
+                self.db.add_coins(self.user_id, user_data["username"], -maintenance_cost, CoinSource.INVESTMENT_MAINTENANCE)
 
                 self.investment_system.save_last_maintenance_time()
 
@@ -2603,7 +2604,7 @@ class BusinessDetailView(discord.ui.View):
             success = self.investment_system.repair_investment(self.user_id, self.business_name)
 
             if success:
-                self.db.add_coins(self.user_id, user_data["username"], -repair_cost)
+                self.db.add_coins(self.user_id, user_data["username"], -repair_cost, CoinSource.INVESTMENT_REPAIR)
 
                 success_frames = []
                 if "fire" in risk_type.lower():
@@ -2865,7 +2866,7 @@ class ConfirmSellView(discord.ui.View):
             success = self.investment_system.remove_investment(self.user_id, self.business_name)
             
             if success:
-                self.db.add_coins(self.user_id, user_data["username"], self.sell_price)
+                self.db.add_coins(self.user_id, user_data["username"], self.sell_price, CoinSource.INVESTMENT_SALE)
                 await interaction.response.edit_message(
                     content=f"💸 CHA-CHING! You sold your {self.business_name} for {self.sell_price} coins! 💵",
                     embed=None,
@@ -1,20 +1,46 @@
 import re
+import os
+import json
+import time
 import discord
 from discord import app_commands
 from discord.ext import commands
 import logging
 import asyncio
+from collections import deque
 from logger import setup_logger
-from database import Database
+from database import get_database
 
 logger = setup_logger('legacy_finder', 'bot.log')
 
+CHECKPOINT_FILE = 'data/legacy_scan_checkpoint.json'
+CHECKPOINT_INTERVAL = 10  # seconds between checkpoint writes
+MAX_CONCURRENT_CHANNELS = 4
+HISTORY_PAGES_PER_SECOND = 4  # shared across all channels being scanned
+HISTORY_PAGE_SIZE = 100  # messages returned per history request
+RESPONSE_WINDOW = 5  # messages after a rank command checked for the bot's response
+PROGRESS_UPDATE_INTERVAL = 5  # seconds
+
+RANK_COMMAND_PATTERNS = [
+    r"(?:\/|!)rank",
+    r"(?:\/|!)level",
+    r"(?:\/|!)lvl",
+    r"(?:\/|!)xp"
+]
+
+DATA_PATTERNS = {
+    'level': r"(?:Level|LVL):\s*(\d+)",
+    'xp': r"(?:XP|Experience):\s*(\d+)(?:\s*\/\s*\d+)?",
+    'coins': r"(?:Coins|Money|Balance):\s*(\d+)",
+    'prestige': r"(?:Prestige|Prestige Level):\s*(\d+)"
+}
+
 class LegacyDataFinderCog(commands.Cog):
     """Cog for finding and migrating data from old bot commands in message history."""
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.is_scanning = False
         self.current_task = None
         logger.info("Legacy data finder cog initialized")
@@ -28,7 +54,8 @@ class LegacyDataFinderCog(commands.Cog):
         self, 
         interaction: discord.Interaction,
         days_to_scan: int = 30,
-        channel: discord.TextChannel = None
+        channel: discord.TextChannel = None,
+        restart: bool = False
     ):
         """
         Scan message history for old /rank commands and import the data.
@@ -36,6 +63,7 @@ class LegacyDataFinderCog(commands.Cog):
         Parameters:
         - days_to_scan: How many days of history to scan (default: 30)
         - channel: Specific channel to scan (default: all channels)
+        - restart: Discard saved progress from an interrupted scan (default: resume it)
         """
 
         if not interaction.user.guild_permissions.administrator:
@@ -84,7 +112,8 @@ class LegacyDataFinderCog(commands.Cog):
                     interaction.guild,
                     progress_message,
                     days_to_scan,
-                    channel
+                    channel,
+                    restart
                 )
             )
             
@@ -132,220 +161,84 @@ class LegacyDataFinderCog(commands.Cog):
         guild, 
         progress_message, 
         days_to_scan=30, 
-        specific_channel=None
+        specific_channel=None,
+        restart=False
     ):
         """
         Scan message history for old rank commands and import the data.
         
+        Channels are scanned concurrently under a shared rate budget. Each channel is
+        read once, oldest first, and bot responses are matched to rank commands through
+        a sliding window of the messages that follow each command. Progress is
+        checkpointed per channel so a cancelled or crashed scan resumes where it stopped.
+        
         Parameters:
         - guild: The Discord guild to scan
         - progress_message: Message to update with progress
         - days_to_scan: How many days of history to scan
         - specific_channel: Specific channel to scan (if None, scan all channels)
+        - restart: Discard any saved progress and start a fresh scan
         """
+        checkpoint = ScanCheckpoint(guild.id, days_to_scan, specific_channel.id if specific_channel else None)
+        if restart:
+            checkpoint.reset()
+        stats = checkpoint.state['stats']
+        found_data = checkpoint.state['found_data']  # User ID -> Data
+        total_channels = 0
+        users_imported = 0
+        progress_task = None
+
         try:
 
             import datetime
-            time_limit = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days_to_scan)
-
-            channels_scanned = 0
-            total_channels = 0
-            messages_scanned = 0
-            rank_commands_found = 0
-            users_imported = 0
-            errors = 0
-
-            rank_command_patterns = [
-
-                r"(?:\/|!)rank",
-
-                r"(?:\/|!)level",
-                r"(?:\/|!)lvl",
-                r"(?:\/|!)xp"
-            ]
-
-            data_patterns = {
-                'level': r"(?:Level|LVL):\s*(\d+)",
-                'xp': r"(?:XP|Experience):\s*(\d+)(?:\s*\/\s*\d+)?",
-                'coins': r"(?:Coins|Money|Balance):\s*(\d+)",
-                'prestige': r"(?:Prestige|Prestige Level):\s*(\d+)"
-            }
+            time_limit = datetime.datetime.fromisoformat(checkpoint.state['time_limit'])
 
             if specific_channel:
                 channels = [specific_channel]
-                total_channels = 1
             else:
                 channels = [channel for channel in guild.text_channels 
                            if channel.permissions_for(guild.me).read_message_history]
-                total_channels = len(channels)
+            total_channels = len(channels)
 
             embed = discord.Embed(
                 title="🔍 Legacy Data Scan In Progress",
-                description=f"Scanning message history from the last {days_to_scan} days...",
+                description=(
+                    f"Resuming the previous scan of the last {days_to_scan} days..."
+                    if checkpoint.resumed else
+                    f"Scanning message history from the last {days_to_scan} days..."
+                ),
                 color=discord.Color.blue()
             )
             
             embed.add_field(
                 name="Progress",
-                value=f"Channels: 0/{total_channels}\nMessages scanned: 0\nRank commands found: 0\nUsers imported: 0",
+                value=self._format_progress(stats, total_channels),
                 inline=False
             )
             
             await progress_message.edit(embed=embed)
 
-            processed_users = set()
-            found_data = {}  # User ID -> Data
+            progress_task = asyncio.create_task(
+                self._report_progress(progress_message, embed, stats, total_channels)
+            )
 
-            for channel in channels:
-                channels_scanned += 1
-                channel_messages_scanned = 0
-                
-                try:
-
-                    if channels_scanned % 5 == 0 or channels_scanned == total_channels:
-                        embed.set_field_at(
-                            0,
-                            name="Progress",
-                            value=(
-                                f"Channels: {channels_scanned}/{total_channels}\n"
-                                f"Messages scanned: {messages_scanned}\n"
-                                f"Rank commands found: {rank_commands_found}\n"
-                                f"Users imported: {users_imported}"
-                            ),
-                            inline=False
-                        )
-                        await progress_message.edit(embed=embed)
-
-                    async for message in channel.history(limit=None, after=time_limit):
-
-                        if not self.is_scanning:
-                            raise asyncio.CancelledError("Scan cancelled")
-                        
-                        messages_scanned += 1
-                        channel_messages_scanned += 1
-
-                        if messages_scanned % 1000 == 0:
-                            embed.set_field_at(
-                                0,
-                                name="Progress",
-                                value=(
-                                    f"Channels: {channels_scanned}/{total_channels}\n"
-                                    f"Messages scanned: {messages_scanned}\n"
-                                    f"Rank commands found: {rank_commands_found}\n"
-                                    f"Users imported: {users_imported}"
-                                ),
-                                inline=False
-                            )
-                            await progress_message.edit(embed=embed)
-
-                        is_rank_command = False
-                        for pattern in rank_command_patterns:
-                            if re.search(pattern, message.content, re.IGNORECASE):
-                                is_rank_command = True
-                                break
-                        
-                        if is_rank_command:
-                            rank_commands_found += 1
-
-                            user_id = message.author.id
-
-                            if user_id in processed_users:
-                                continue
-
-                            response_limit = 5
-                            response_count = 0
-
-                            user_data = {
-                                'user_id': user_id,
-                                'username': message.author.display_name,
-                                'found_in_channel': channel.name,
-                                'command_time': message.created_at.isoformat()
-                            }
-                            
-                            try:
-                                async for response in channel.history(
-                                    limit=response_limit, 
-                                    after=message.created_at
-                                ):
-                                    response_count += 1
-
-                                    if response.author.bot:
-
-                                        if response.embeds:
-                                            for embed_obj in response.embeds:
-                                                embed_dict = embed_obj.to_dict()
-
-                                                embed_text = str(embed_dict)
-
-                                                for data_type, pattern in data_patterns.items():
-                                                    match = re.search(pattern, embed_text, re.IGNORECASE)
-                                                    if match:
-                                                        user_data[data_type] = int(match.group(1))
-
-                                        for data_type, pattern in data_patterns.items():
-                                            match = re.search(pattern, response.content, re.IGNORECASE)
-                                            if match and data_type not in user_data:
-                                                user_data[data_type] = int(match.group(1))
-
-                                    if all(k in user_data for k in data_patterns.keys()):
-                                        break
-
-                                data_found = False
-                                for key in data_patterns.keys():
-                                    if key in user_data:
-                                        data_found = True
-                                        break
-                                
-                                if data_found:
-                                    found_data[user_id] = user_data
-                                    processed_users.add(user_id)
-                            except Exception as e:
-                                logger.error(f"Error processing responses for user {user_id}: {e}")
-                                errors += 1
-                
-                except Exception as e:
-                    logger.error(f"Error scanning channel {channel.name}: {e}")
-                    errors += 1
-                    continue
-
-            for user_id, data in found_data.items():
-                try:
-
-                    level = data.get('level', 1)
-                    xp = data.get('xp', 0)
-                    coins = data.get('coins', 0)
-                    prestige = data.get('prestige', 0)
-                    username = data.get('username', f"User_{user_id}")
-
-                    self.db.cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-                    current_user = self.db.cursor.fetchone()
-                    
-                    if current_user:
-
-                        self.db.cursor.execute('''
-                            UPDATE users SET 
-                                username = ?,
-                                xp = ?,
-                                level = ?,
-                                coins = ?,
-                                prestige = ?
-                            WHERE user_id = ?
-                        ''', (username, xp, level, coins, prestige, user_id))
-                    else:
-
-                        self.db.cursor.execute('''
-                            INSERT INTO users (
-                                user_id, username, xp, level, coins, prestige
-                            ) VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (user_id, username, xp, level, coins, prestige))
-                    
-                    users_imported += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error importing data for user {user_id}: {e}")
-                    errors += 1
-
-            self.db.conn.commit()
+            rate_budget = RateBudget(HISTORY_PAGES_PER_SECOND)
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+
+            await asyncio.gather(*(
+                self._scan_channel(channel, time_limit, checkpoint, rate_budget, semaphore)
+                for channel in channels
+            ))
+
+            progress_task.cancel()
+            checkpoint.save(force=True)
+
+            users_imported, skipped = self.db.import_users(found_data.values())
+            stats['users_imported'] = users_imported
+            stats['errors'] += skipped
+
+            # The data is imported, so the next scan starts from scratch
+            checkpoint.clear()
 
             final_embed = discord.Embed(
                 title="✅ Legacy Data Scan Complete",
@@ -355,13 +248,7 @@ class LegacyDataFinderCog(commands.Cog):
             
             final_embed.add_field(
                 name="Scan Results",
-                value=(
-                    f"📊 Channels Scanned: {channels_scanned}/{total_channels}\n"
-                    f"💬 Messages Scanned: {messages_scanned}\n"
-                    f"🔍 Rank Commands Found: {rank_commands_found}\n"
-                    f"👥 Users Imported: {users_imported}\n"
-                    f"❌ Errors: {errors}"
-                ),
+                value=self._format_results(stats, total_channels),
                 inline=False
             )
 
@@ -379,26 +266,21 @@ class LegacyDataFinderCog(commands.Cog):
                 )
             
             await progress_message.edit(embed=final_embed)
-            logger.info(f"Legacy data scan completed. Found {rank_commands_found} commands, imported {users_imported} users.")
+            logger.info(f"Legacy data scan completed. Found {stats['rank_commands_found']} commands, imported {users_imported} users.")
             
         except asyncio.CancelledError:
             logger.info("Legacy data scan was cancelled")
+            checkpoint.save(force=True)
 
             cancelled_embed = discord.Embed(
                 title="🛑 Legacy Data Scan Cancelled",
-                description="The scan was cancelled before completion.",
+                description="The scan was cancelled before completion. Progress has been saved; run `/findlegacydata` again to resume.",
                 color=discord.Color.red()
             )
             
             cancelled_embed.add_field(
                 name="Partial Results",
-                value=(
-                    f"📊 Channels Scanned: {channels_scanned}/{total_channels}\n"
-                    f"💬 Messages Scanned: {messages_scanned}\n"
-                    f"🔍 Rank Commands Found: {rank_commands_found}\n"
-                    f"👥 Users Imported: {users_imported}\n"
-                    f"❌ Errors: {errors}"
-                ),
+                value=self._format_results(stats, total_channels),
                 inline=False
             )
             
@@ -406,22 +288,18 @@ class LegacyDataFinderCog(commands.Cog):
             
         except Exception as e:
             logger.error(f"Error during legacy data scan: {e}")
+            stats['errors'] += 1
+            checkpoint.save(force=True)
 
             error_embed = discord.Embed(
                 title="❌ Legacy Data Scan Error",
-                description=f"An error occurred during the scan: {str(e)}",
+                description=f"An error occurred during the scan: {str(e)}\nProgress has been saved; run `/findlegacydata` again to resume.",
                 color=discord.Color.red()
             )
             
             error_embed.add_field(
                 name="Partial Results",
-                value=(
-                    f"📊 Channels Scanned: {channels_scanned}/{total_channels}\n"
-                    f"💬 Messages Scanned: {messages_scanned}\n"
-                    f"🔍 Rank Commands Found: {rank_commands_found}\n"
-                    f"👥 Users Imported: {users_imported}\n"
-                    f"❌ Errors: {errors + 1}"
-                ),
+                value=self._format_results(stats, total_channels),
                 inline=False
             )
             
@@ -429,8 +307,263 @@ class LegacyDataFinderCog(commands.Cog):
         
         finally:
 
+            if progress_task:
+                progress_task.cancel()
             self.is_scanning = False
 
+    async def _scan_channel(self, channel, time_limit, checkpoint, rate_budget, semaphore):
+        """Scan a single channel in one oldest-first pass, resuming from its checkpoint."""
+        channel_state = checkpoint.get_channel(channel.id)
+        if channel_state.get('done'):
+            return
+
+        stats = checkpoint.state['stats']
+
+        async with semaphore:
+            resume_after = channel_state.get('resume_after')
+            after = discord.Object(id=resume_after) if resume_after else time_limit
+            # Resuming re-reads the response window of pending commands; those messages were already counted
+            last_counted = channel_state.get('last_counted', 0)
+
+            # Rank commands still waiting for their bot responses, oldest first
+            pending = deque()
+            channel_messages_scanned = 0
+
+            try:
+                await rate_budget.acquire()
+
+                async for message in channel.history(limit=None, after=after, oldest_first=True):
+
+                    if not self.is_scanning:
+                        raise asyncio.CancelledError("Scan cancelled")
+
+                    counted = message.id <= last_counted
+                    if not counted:
+                        stats['messages_scanned'] += 1
+                        channel_state['last_counted'] = message.id
+                    channel_messages_scanned += 1
+
+                    # channel.history fetches a new page from the API every HISTORY_PAGE_SIZE messages
+                    if channel_messages_scanned % HISTORY_PAGE_SIZE == 0:
+                        await rate_budget.acquire()
+
+                    if pending:
+                        for entry in pending:
+                            entry['remaining'] -= 1
+                            if message.author.bot:
+                                self._merge_response_data(entry['user_data'], message)
+
+                        while pending and self._window_complete(pending[0]):
+                            self._record_found(checkpoint, pending.popleft()['user_data'])
+
+                    if self.is_rank_command(message.content):
+                        if not counted:
+                            stats['rank_commands_found'] += 1
+                        pending.append({
+                            'message_id': message.id,
+                            'remaining': RESPONSE_WINDOW,
+                            'user_data': {
+                                'user_id': message.author.id,
+                                'username': message.author.display_name,
+                                'found_in_channel': channel.name,
+                                'command_time': message.created_at.isoformat()
+                            }
+                        })
+
+                    # Resume from just before the oldest command whose window is still open
+                    channel_state['resume_after'] = pending[0]['message_id'] - 1 if pending else message.id
+                    checkpoint.save()
+
+                # Commands near the end of the channel get whatever responses followed them
+                while pending:
+                    self._record_found(checkpoint, pending.popleft()['user_data'])
+
+                channel_state['done'] = True
+                stats['channels_scanned'] += 1
+                checkpoint.save()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error scanning channel {channel.name}: {e}")
+                stats['errors'] += 1
+
+    @staticmethod
+    def is_rank_command(content):
+        """Check whether a message looks like an old rank command."""
+        return any(re.search(pattern, content, re.IGNORECASE) for pattern in RANK_COMMAND_PATTERNS)
+
+    @staticmethod
+    def _merge_response_data(user_data, response):
+        """Merge leveling data found in a bot response into a user's data."""
+        if response.embeds:
+            for embed_obj in response.embeds:
+                embed_text = str(embed_obj.to_dict())
+
+                for data_type, pattern in DATA_PATTERNS.items():
+                    match = re.search(pattern, embed_text, re.IGNORECASE)
+                    if match:
+                        user_data[data_type] = int(match.group(1))
+
+        for data_type, pattern in DATA_PATTERNS.items():
+            match = re.search(pattern, response.content, re.IGNORECASE)
+            if match and data_type not in user_data:
+                user_data[data_type] = int(match.group(1))
+
+    @staticmethod
+    def _window_complete(entry):
+        """Check whether a rank command has seen all the responses it will be matched with."""
+        return entry['remaining'] <= 0 or all(k in entry['user_data'] for k in DATA_PATTERNS)
+
+    @staticmethod
+    def _record_found(checkpoint, user_data):
+        """Keep a user's data if it's the earliest rank command with data for that user."""
+        if not any(key in user_data for key in DATA_PATTERNS):
+            return
+
+        found_data = checkpoint.state['found_data']
+        user_key = str(user_data['user_id'])
+        existing = found_data.get(user_key)
+        if existing is None or user_data['command_time'] < existing['command_time']:
+            found_data[user_key] = user_data
+
+    async def _report_progress(self, progress_message, embed, stats, total_channels):
+        """Periodically update the progress message while channels are being scanned."""
+        try:
+            while True:
+                await asyncio.sleep(PROGRESS_UPDATE_INTERVAL)
+                embed.set_field_at(
+                    0,
+                    name="Progress",
+                    value=self._format_progress(stats, total_channels),
+                    inline=False
+                )
+                await progress_message.edit(embed=embed)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error updating legacy scan progress: {e}")
+
+    @staticmethod
+    def _format_progress(stats, total_channels):
+        """Format the in-progress scan counters."""
+        return (
+            f"Channels: {stats['channels_scanned']}/{total_channels}\n"
+            f"Messages scanned: {stats['messages_scanned']}\n"
+            f"Rank commands found: {stats['rank_commands_found']}\n"
+            f"Users imported: {stats['users_imported']}"
+        )
+
+    @staticmethod
+    def _format_results(stats, total_channels):
+        """Format the scan counters for the final results embed."""
+        return (
+            f"📊 Channels Scanned: {stats['channels_scanned']}/{total_channels}\n"
+            f"💬 Messages Scanned: {stats['messages_scanned']}\n"
+            f"🔍 Rank Commands Found: {stats['rank_commands_found']}\n"
+            f"👥 Users Imported: {stats['users_imported']}\n"
+            f"❌ Errors: {stats['errors']}"
+        )
+
+class RateBudget:
+    """Token bucket shared by all channel scanners to cap history requests per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request can be made within the budget."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ScanCheckpoint:
+    """Per-guild scan progress saved to disk so an interrupted scan can resume."""
+
+    def __init__(self, guild_id, days_to_scan, channel_id=None, path=CHECKPOINT_FILE):
+        self.path = path
+        self.guild_key = str(guild_id)
+        self.days_to_scan = days_to_scan
+        self.channel_id = channel_id
+        self.last_saved = 0
+        self.resumed = False
+
+        saved = self._load_all().get(self.guild_key)
+        if saved and saved.get('days_to_scan') == days_to_scan and saved.get('channel_id') == channel_id:
+            self.state = saved
+            self.resumed = True
+            logger.info(f"Resuming legacy data scan for guild {guild_id} from checkpoint")
+        else:
+            self.reset()
+
+    def reset(self):
+        """Start a fresh scan state, discarding any saved progress."""
+        import datetime
+        time_limit = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.days_to_scan)
+        self.resumed = False
+        self.state = {
+            'days_to_scan': self.days_to_scan,
+            'channel_id': self.channel_id,
+            'time_limit': time_limit.isoformat(),
+            'channels': {},
+            'found_data': {},
+            'stats': {
+                'channels_scanned': 0,
+                'messages_scanned': 0,
+                'rank_commands_found': 0,
+                'users_imported': 0,
+                'errors': 0
+            }
+        }
+
+    def get_channel(self, channel_id):
+        """Get the saved progress for a channel."""
+        return self.state['channels'].setdefault(str(channel_id), {})
+
+    def save(self, force=False):
+        """Write the checkpoint, at most once every CHECKPOINT_INTERVAL seconds unless forced."""
+        now = time.monotonic()
+        if not force and now - self.last_saved < CHECKPOINT_INTERVAL:
+            return
+        self.last_saved = now
+
+        data = self._load_all()
+        data[self.guild_key] = self.state
+        self._write_all(data)
+
+    def clear(self):
+        """Remove this guild's checkpoint once the scan has completed."""
+        data = self._load_all()
+        if data.pop(self.guild_key, None) is not None:
+            self._write_all(data)
+
+    def _load_all(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading legacy scan checkpoint: {e}")
+        return {}
+
+    def _write_all(self, data):
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving legacy scan checkpoint: {e}")
+
 async def setup(bot):
     """Add the legacy data finder cog to the bot."""
     await bot.add_cog(LegacyDataFinderCog(bot))
@@ -0,0 +1,66 @@
+import math
+from functools import lru_cache
+
+class LevelCurve:
+    """
+    XP requirements for every level, shared by leveling, the rank card and the dashboard.
+    Going from level n to n + 1 costs base_xp + (n - 1) * xp_per_level XP, so the XP
+    needed to reach a level is an arithmetic series and the level for any amount of
+    XP can be solved directly instead of stepping through one level at a time.
+    """
+
+    def __init__(self, base_xp, xp_per_level=None):
+        self.base_xp = max(1, int(base_xp))
+        self.xp_per_level = self.base_xp if xp_per_level is None else max(0, int(xp_per_level))
+
+    def required_xp(self, level):
+        """Get the XP needed to go from a level to the next one."""
+        return self.base_xp + (max(1, level) - 1) * self.xp_per_level
+
+    def total_xp_for_level(self, level):
+        """Get the total XP needed to reach a level from level 1."""
+        steps = max(1, level) - 1
+        return steps * self.base_xp + self.xp_per_level * steps * (steps - 1) // 2
+
+    def level_from_total_xp(self, total_xp):
+        """Get the level and XP into that level for a total amount of XP.
+
+        Returns:
+            tuple: (level, xp)
+        """
+        total_xp = max(0, int(total_xp))
+        if self.xp_per_level == 0:
+            steps = total_xp // self.base_xp
+        else:
+            # Largest n with n * base + step * n * (n - 1) / 2 <= total, from the quadratic formula
+            offset = 2 * self.base_xp - self.xp_per_level
+            discriminant = offset * offset + 8 * self.xp_per_level * total_xp
+            steps = max(0, (math.isqrt(discriminant) - offset) // (2 * self.xp_per_level))
+
+            # isqrt is exact, but the floor division can land one step off
+            while self.total_xp_for_level(steps + 2) <= total_xp:
+                steps += 1
+            while steps > 0 and self.total_xp_for_level(steps + 1) > total_xp:
+                steps -= 1
+
+        level = steps + 1
+        return level, total_xp - self.total_xp_for_level(level)
+
+    def add_xp(self, level, xp, amount):
+        """Apply an XP gain to a level and XP, resolving any number of level ups at once.
+
+        Returns:
+            tuple: (new_level, new_xp)
+        """
+        if xp + amount < self.required_xp(level):
+            return level, xp + amount
+        return self.level_from_total_xp(self.total_xp_for_level(level) + xp + amount)
+
+    def progress(self, level, xp):
+        """Get how far through a level the XP is, as a percentage from 0 to 100."""
+        return min(100, int(xp / self.required_xp(level) * 100))
+
+@lru_cache(maxsize=16)
+def get_level_curve(base_xp, xp_per_level=None):
+    """Get the level curve for a set of XP settings."""
+    return LevelCurve(base_xp, xp_per_level)
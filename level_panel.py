@@ -7,11 +7,14 @@ import datetime
 import logging
 import json
 from logger import setup_logger
-from database import Database
+from database import get_database
 from settings_storage import settings_storage
+from drop_engine import get_drop_engine
 
 logger = setup_logger('level_panel', 'bot.log')
 
+XP_DROP_CLAIM_SECONDS = 60  # How long an XP drop can be claimed
+
 class XPDropSettings:
     """Class to store XP drop settings."""
     def __init__(self):
@@ -41,8 +44,10 @@ class LevelPanelCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.xp_drop_settings = {}  # Guild ID -> XPDropSettings
+        self.engine = get_drop_engine(bot)
+        self.engine.register('xp', self.on_xp_drop_claimed, self.on_xp_drop_expired)
         self.load_settings()
         logger.info("Level panel cog initialized")
         
@@ -244,13 +249,7 @@ class LevelPanelCog(commands.Cog):
             if xp is None:
                 xp = self.db.calculate_required_xp(level) // 2  # Middle of the level
 
-            self.db.cursor.execute('''
-                UPDATE users SET 
-                    level = ?,
-                    xp = ?
-                WHERE user_id = ?
-            ''', (level, xp, user_id))
-            self.db.conn.commit()
+            self.db.update_user(user_id, {'level': level, 'xp': xp})
             
             return True, f"Set {username}'s level to {level} with {xp} XP."
             
@@ -324,6 +323,43 @@ class LevelPanelCog(commands.Cog):
             logger.error(f"Error toggling XP drops: {e}")
             return False, f"Error toggling XP drops: {str(e)}"
     
+    def _next_drop_text(self, guild_id):
+        settings = self.xp_drop_settings.get(guild_id)
+        if settings and settings.is_active and settings.next_drop_time:
+            return f"Next drop at {settings.next_drop_time.strftime('%I:%M %p')}"
+        return None
+
+    async def on_xp_drop_claimed(self, interaction, drop, result):
+        """Show who claimed an XP drop and whether they leveled up."""
+        user = interaction.user
+        level_message = ""
+        if result['level_after'] > result['level_before']:
+            level_message = f"and **leveled up to {result['level_after']}**! 🎊"
+
+        embed = interaction.message.embeds[0]
+        embed.title = "⭐ XP Drop Claimed!"
+        embed.description = f"🎉 **{user.display_name}** claimed {result['xp']} XP! {level_message}"
+        embed.color = discord.Color.green()
+        embed.set_footer(text=self._next_drop_text(drop['guild_id']))
+
+        await interaction.response.edit_message(embed=embed, view=None)
+        await interaction.channel.send(f"🎉 Congratulations {user.mention}! You won {result['xp']} XP! {level_message} 🎉")
+
+    async def on_xp_drop_expired(self, drop):
+        """Mark an unclaimed XP drop as expired."""
+        message = await self.engine.fetch_drop_message(drop)
+        if message is None or not message.embeds:
+            return
+
+        embed = message.embeds[0]
+        embed.title = "⭐ XP Drop Expired!"
+        embed.description = "No one claimed the XP in time."
+        embed.color = discord.Color.red()
+        embed.set_footer(text=self._next_drop_text(drop['guild_id']))
+
+        await message.edit(embed=embed, view=None)
+        logger.info(f"XP drop expired with no claims")
+
     async def _run_xp_drops(self, guild_id):
         """Background task to handle XP drops at intervals."""
         try:
@@ -384,13 +420,14 @@ class LevelPanelCog(commands.Cog):
 
                     embed = discord.Embed(
                         title="⭐ XP Drop!",
-                        description=f"React with {emoji} to claim {xp_amount} XP!",
+                        description=f"Click {emoji} to claim {xp_amount} XP!",
                         color=discord.Color.blue()
                     )
 
-                    drop_message = await channel.send(embed=embed)
-
-                    await drop_message.add_reaction(emoji)
+                    # Claimed through the drop engine; the first click wins and expiry is scheduled
+                    drop = self.engine.create_drop('xp', channel.id, xp=xp_amount, duration=XP_DROP_CLAIM_SECONDS, guild_id=guild_id)
+                    drop_message = await channel.send(embed=embed, view=self.engine.claim_view(label="Claim", emoji=emoji))
+                    self.engine.attach_message(drop, drop_message.id)
 
                     settings.last_drop_time = datetime.datetime.now()
                     settings.next_drop_time = settings.last_drop_time + datetime.timedelta(seconds=interval_seconds)
@@ -398,54 +435,6 @@ class LevelPanelCog(commands.Cog):
                     self.save_settings(guild_id)
                     logger.info(f"XP drop sent in guild {guild_id}, next drop at {next_drop_formatted}")
 
-                    def check(reaction, user):
-                        return user != self.bot.user and str(reaction.emoji) == emoji and reaction.message.id == drop_message.id
-                    
-                    try:
-
-                        reaction, user = await self.bot.wait_for('reaction_add', timeout=60.0, check=check)
-
-                        user_data_before = self.db.get_user(user.id)
-                        level_before = 1
-                        if isinstance(user_data_before, (list, tuple)) and len(user_data_before) > 2:
-                            level_before = user_data_before[2]
-                        elif isinstance(user_data_before, dict) and 'level' in user_data_before:
-                            level_before = user_data_before['level']
-                        
-                        self.db.add_xp(user.id, user.display_name, xp_amount)
-
-                        user_data_after = self.db.get_user(user.id)
-                        level_after = 1
-                        if isinstance(user_data_after, (list, tuple)) and len(user_data_after) > 2:
-                            level_after = user_data_after[2]
-                        elif isinstance(user_data_after, dict) and 'level' in user_data_after:
-                            level_after = user_data_after['level']
-
-                        level_message = ""
-                        if level_after > level_before:
-                            level_message = f"and **leveled up to {level_after}**! 🎊"
-
-                        embed.title = "⭐ XP Drop Claimed!"
-                        embed.description = f"🎉 **{user.display_name}** claimed {xp_amount} XP! {level_message}"
-                        embed.color = discord.Color.green()
-                        embed.set_footer(text=f"Next drop at {next_drop_formatted}")
-
-                        await drop_message.edit(embed=embed)
-
-                        await channel.send(f"🎉 Congratulations {user.mention}! You won {xp_amount} XP! {level_message} 🎉")
-                        
-                        logger.info(f"XP drop claimed by {user.id} ({user.display_name}) for {xp_amount} XP")
-                    
-                    except asyncio.TimeoutError:
-
-                        embed.title = "⭐ XP Drop Expired!"
-                        embed.description = "No one claimed the XP in time."
-                        embed.color = discord.Color.red()
-                        embed.set_footer(text=f"Next drop at {next_drop_formatted}")
-                        
-                        await drop_message.edit(embed=embed)
-                        logger.info(f"XP drop expired with no claims")
-
                 except asyncio.CancelledError:
                     logger.info(f"XP drop task cancelled for guild {guild_id}")
                     settings.is_active = False
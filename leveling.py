@@ -4,12 +4,14 @@ from discord.ext import commands
 import time
 import asyncio
 import random
-from logger import setup_logger
-from database import Database
+from logger import setup_logger, HOT_PATH_RATE_LIMIT
+from database import get_database
+from rewards import CoinSource
+from message_router import get_message_router
 import os
 from typing import Optional, Union
 
-logger = setup_logger('leveling')
+logger = setup_logger('leveling', rate_limit=HOT_PATH_RATE_LIMIT)
 
 def get_rainbow_color():
     """Generate a random rainbow color."""
@@ -36,10 +38,15 @@ class LevelingCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.xp_cooldowns = {}  # Memory cache of cooldowns
+        get_message_router(bot).subscribe('leveling', self.handle_message)
         logger.info("Leveling system initialized")
     
+    def cog_unload(self):
+        """Stop receiving messages when the cog is unloaded."""
+        get_message_router(self.bot).unsubscribe('leveling')
+    
     async def create_rank_embed(self, user_data, member):
         """Create a cool, visually appealing rank card with all details."""
         next_level_xp = self.db.calculate_required_xp(user_data['level'])
@@ -58,8 +65,7 @@ class LevelingCog(commands.Cog):
         else:
             prestige_display = "⭐ **NOVICE** ⭐"
 
-        leaderboard = self.db.get_leaderboard(100)  # Get top 100 to find position
-        rank_position = next((i for i, user in enumerate(leaderboard, 1) if user['user_id'] == user_data['user_id']), "???")
+        rank_position = self.db.get_user_rank(user_data['user_id']) or "???"
         
         # Cooler rank display with badges
         try:
@@ -415,12 +421,9 @@ class LevelingCog(commands.Cog):
 
         new_level = initial_level + amount
 
-        settings = self.db.get_settings()
-        base_xp = settings['base_xp_required']
-
         current_xp = user_data['xp']
 
-        next_level_xp = base_xp * new_level
+        next_level_xp = self.db.calculate_required_xp(new_level)
 
         self.db.update_user(user_id, {'level': new_level, 'xp': current_xp})
 
@@ -490,12 +493,9 @@ class LevelingCog(commands.Cog):
 
         new_level = max(1, initial_level - amount)
 
-        settings = self.db.get_settings()
-        base_xp = settings['base_xp_required']
-
         current_xp = user_data['xp']
 
-        next_level_xp = base_xp * new_level
+        next_level_xp = self.db.calculate_required_xp(new_level)
 
         self.db.update_user(user_id, {'level': new_level, 'xp': current_xp})
 
@@ -561,7 +561,7 @@ class LevelingCog(commands.Cog):
         user_id = member.id
         username = member.name
 
-        self.db.add_coins(user_id, username, amount)
+        self.db.add_coins(user_id, username, amount, CoinSource.ADMIN)
 
         user_data = self.db.get_or_create_user(user_id, username)
 
@@ -628,7 +628,7 @@ class LevelingCog(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        self.db.add_coins(user_id, username, -amount)
+        self.db.add_coins(user_id, username, -amount, CoinSource.ADMIN)
 
         user_data = self.db.get_or_create_user(user_id, username)
 
@@ -649,20 +649,13 @@ class LevelingCog(commands.Cog):
 
         await interaction.response.send_message(embed=embed, ephemeral=True)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Award XP when users send messages."""
-
-        if message.author.bot:
-            return
-
-        if not message.guild:
-            return
+    async def handle_message(self, message):
+        """Award XP when users send messages in a server."""
 
         user_id = message.author.id
         username = str(message.author)
         
-        logger.info(f"Processing message from {username} (ID: {user_id}) for XP")
+        logger.debug("Processing message from %s (ID: %s) for XP", username, user_id)
 
         xp_multiplier = 1.0
         coin_multiplier = 1.0
@@ -676,14 +669,11 @@ class LevelingCog(commands.Cog):
             if event_system_cog.settings.xp_race_active:
                 await event_system_cog.add_xp_race_points(user_id, username, 1)
         
-        logger.info(f"Multipliers - XP: {xp_multiplier}x, Coins: {coin_multiplier}x")
-
-        settings = self.db.get_settings()
-        logger.info(f"XP Enabled: {settings.get('xp_enabled', 1)}")
+        logger.debug("Multipliers - XP: %sx, Coins: %sx", xp_multiplier, coin_multiplier)
 
         updated_user, leveled_up, xp_earned = self.db.add_xp(user_id, username, xp_multiplier=xp_multiplier, coin_multiplier=coin_multiplier)
         
-        logger.info(f"XP add result: User updated: {updated_user is not None}, Leveled up: {leveled_up}, XP earned: {xp_earned}")
+        logger.debug("XP add result: User updated: %s, Leveled up: %s, XP earned: %s", updated_user is not None, leveled_up, xp_earned)
 
         if leveled_up and updated_user:
 
@@ -1,34 +1,184 @@
 import os
+import copy
+import json
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
-import sys
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
-def setup_logger(name, log_file='bot.log', level=logging.INFO):
-    """Set up logger with specified configuration."""
+LOG_QUEUE_SIZE = 10000  # Records waiting to be written per log file; more are dropped rather than blocking
+HOT_PATH_RATE_LIMIT = (20, 10.0)  # At most 20 records per call site every 10 seconds, for loggers on hot paths
+
+LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL
+}
+
+_pipelines = {}  # log file -> (queue handler, listener)
+_pipelines_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line, for LOG_FORMAT=json."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry)
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue for the file writer thread.
+    If the writer falls behind and the queue fills up, records are dropped and
+    counted instead of blocking the caller, and the count is logged once there
+    is room again.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Resolve the message and traceback before the record changes threads.
+
+        Unlike QueueHandler.prepare, the traceback is kept in exc_text instead of
+        being merged into the message, so the writer's formatter lays it out.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.message = record.msg
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': 'logger',
+                    'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'msg': f"Dropped {self.dropped} log records because the log queue was full"
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` records from each call site through every `interval`
+    seconds. The first record after a suppressed stretch says how many were
+    suppressed. Warnings and errors always pass.
+    """
+
+    def __init__(self, burst, interval):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sites = {}  # (pathname, lineno) -> [window start, records let through, records suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or record.created - site[0] >= self.interval:
+                suppressed = site[2] if site else 0
+                self.sites[key] = [record.created, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+def _subsystem_levels():
+    """Parse LOG_LEVELS, e.g. "database=WARNING,leveling=DEBUG"."""
+    levels = {}
+    for entry in os.environ.get('LOG_LEVELS', '').split(','):
+        name, _, level = entry.partition('=')
+        if name.strip() and level.strip().upper() in LEVELS:
+            levels[name.strip()] = LEVELS[level.strip().upper()]
+    return levels
+
+def _get_pipeline(log_file):
+    """Get the queue handler for a log file, starting its writer thread on first use."""
+    with _pipelines_lock:
+        if log_file not in _pipelines:
+            f_handler = RotatingFileHandler(
+                os.path.join('logs', log_file),
+                maxBytes=10*1024*1024,  # 10 MB
+                backupCount=3
+            )
+            if os.environ.get('LOG_FORMAT', '').lower() == 'json':
+                f_handler.setFormatter(JsonFormatter())
+            else:
+                f_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+            log_queue = queue.Queue(LOG_QUEUE_SIZE)
+            listener = QueueListener(log_queue, f_handler, respect_handler_level=True)
+            listener.start()
+            _pipelines[log_file] = (DroppingQueueHandler(log_queue), listener)
+        return _pipelines[log_file][0]
+
+def stop_logging():
+    """Write out queued records and stop the writer threads. Runs automatically at exit."""
+    with _pipelines_lock:
+        for _, listener in _pipelines.values():
+            listener.stop()
+        _pipelines.clear()
+
+atexit.register(stop_logging)
+
+def setup_logger(name, log_file='bot.log', level=logging.INFO, rate_limit=None):
+    """Set up logger with specified configuration.
+
+    Records are handed to a background thread that formats and writes them, so
+    logging doesn't block the event loop on file I/O. Every logger writing to the
+    same file shares one handler and rotation.
+
+    The level comes from LOG_LEVELS for this logger's name, e.g.
+    LOG_LEVELS="database=WARNING", and otherwise from LOG_LEVEL (INFO by default).
+    Set LOG_FORMAT=json to write one JSON object per line.
+
+    Args:
+        name (str): Logger name
+        log_file (str): File in logs/ to write to
+        level (int): Unused, kept for existing callers; see LOG_LEVEL and LOG_LEVELS
+        rate_limit (tuple): (records, seconds) allowed per call site for info and debug
+            records, for loggers on hot paths; see HOT_PATH_RATE_LIMIT
+    """
 
     os.makedirs('logs', exist_ok=True)
 
     logger = logging.getLogger(name)
 
     log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
-    level_dict = {
-        'DEBUG': logging.DEBUG,
-        'INFO': logging.INFO,
-        'WARNING': logging.WARNING,
-        'ERROR': logging.ERROR,
-        'CRITICAL': logging.CRITICAL
-    }
-    logger.setLevel(level_dict.get(log_level, logging.INFO))
-
-    f_handler = RotatingFileHandler(
-        os.path.join('logs', log_file),
-        maxBytes=10*1024*1024,  # 10 MB
-        backupCount=3
-    )
-
-    f_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    f_handler.setFormatter(f_format)
-
-    logger.addHandler(f_handler)
-    
+    logger.setLevel(_subsystem_levels().get(name, LEVELS.get(log_level, logging.INFO)))
+
+    handler = _get_pipeline(log_file)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+
+    if rate_limit and not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(*rate_limit))
+
     return logger
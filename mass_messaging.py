@@ -2,18 +2,13 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import asyncio
-import logging
+from logger import setup_logger
 import random
 from typing import List, Dict, Optional, Union
 import datetime
 
 # Set up logging
-logger = logging.getLogger('mass_messaging')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('mass_messaging')
 
 def get_rainbow_color():
     """Generate a random rainbow color."""
@@ -0,0 +1,210 @@
+import time
+import asyncio
+from logger import setup_logger
+
+logger = setup_logger('message_router', 'bot.log')
+
+SLOW_HANDLER_SECONDS = 0.5  # Handlers slower than this are logged as warnings
+
+class MessageContext:
+    """Facts about a message that every subscriber filters on, worked out once per message."""
+
+    __slots__ = ('message', 'author_id', 'channel_id', 'guild_id', 'is_bot', 'is_self', 'is_dm')
+
+    def __init__(self, message, bot_user_id):
+        self.message = message
+        self.author_id = message.author.id
+        self.channel_id = message.channel.id
+        self.guild_id = message.guild.id if message.guild else None
+        self.is_bot = message.author.bot
+        self.is_self = message.author.id == bot_user_id
+        self.is_dm = message.guild is None
+
+class Subscription:
+    """A handler registered with the router and the messages it wants.
+
+    channels and users can be a collection of IDs or a callable returning one, for
+    cogs whose interest changes at runtime (e.g. channels with an active game).
+    """
+
+    def __init__(self, name, handler, guild_only=True, include_bots=False,
+                 channels=None, users=None, predicate=None):
+        self.name = name
+        self.handler = handler
+        self.guild_only = guild_only
+        self.include_bots = include_bots
+        self.channels = channels
+        self.users = users
+        self.predicate = predicate
+
+    @staticmethod
+    def _contains(ids, value):
+        if ids is None:
+            return True
+        if callable(ids):
+            ids = ids()
+        return value in ids
+
+    def matches(self, ctx):
+        """Check whether a message should be sent to this subscriber."""
+        if ctx.is_self or (ctx.is_bot and not self.include_bots):
+            return False
+        if self.guild_only and ctx.is_dm:
+            return False
+        if not self._contains(self.channels, ctx.channel_id):
+            return False
+        if not self._contains(self.users, ctx.author_id):
+            return False
+        if self.predicate and not self.predicate(ctx):
+            return False
+        return True
+
+class StageStats:
+    """Call count and timings for one stage of the message pipeline."""
+
+    __slots__ = ('calls', 'total', 'max', 'errors')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+class MessageRouter:
+    """
+    Single on_message pipeline for the bot.
+    Each message is classified once and only dispatched to the subscribers whose
+    filters match, instead of every cog receiving every message and re-checking
+    the author and channel itself. Waiters registered with wait_for are indexed
+    by channel so one-off checks only run for messages in their channel.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.subscriptions = {}
+        self.waiters = {}  # channel_id (or None for any channel) -> list of (future, user_id, check)
+        self.stats = {}
+        self.messages_routed = 0
+
+    def subscribe(self, name, handler, **filters):
+        """Register a coroutine handler(message) for messages matching the given filters.
+
+        Args:
+            name (str): Unique subscriber name, used for stats and unsubscribe
+            handler (coroutine function): Called with the discord.Message
+            **filters: guild_only, include_bots, channels, users, predicate (see Subscription)
+        """
+        self.subscriptions[name] = Subscription(name, handler, **filters)
+        self.stats.setdefault(name, StageStats())
+        logger.info(f"Message subscriber '{name}' registered")
+
+    def unsubscribe(self, name):
+        """Remove a subscriber."""
+        if self.subscriptions.pop(name, None):
+            logger.info(f"Message subscriber '{name}' removed")
+
+    async def wait_for(self, channel_id=None, user_id=None, check=None, timeout=None):
+        """Wait for the next message in a channel, optionally from a user and passing a check.
+
+        Works like bot.wait_for('message', ...) but the waiter is only tested against
+        messages in its channel.
+
+        Raises:
+            asyncio.TimeoutError: If no matching message arrives in time
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, user_id, check)
+        self.waiters.setdefault(channel_id, []).append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self.waiters.get(channel_id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self.waiters[channel_id]
+
+    def _resolve_waiters(self, message, channel_id):
+        for key in (channel_id, None):
+            for waiter in list(self.waiters.get(key, ())):
+                future, user_id, check = waiter
+                if future.done() or (user_id is not None and message.author.id != user_id):
+                    continue
+                try:
+                    if check is None or check(message):
+                        future.set_result(message)
+                except Exception as e:
+                    future.set_exception(e)
+
+    async def _run_handler(self, subscription, message):
+        stats = self.stats[subscription.name]
+        started = time.perf_counter()
+        try:
+            await subscription.handler(message)
+        except Exception as e:
+            stats.errors += 1
+            logger.error(f"Error in message subscriber '{subscription.name}': {e}", exc_info=True)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.record(elapsed)
+            if elapsed > SLOW_HANDLER_SECONDS:
+                logger.warning(f"Message subscriber '{subscription.name}' took {elapsed:.2f}s")
+
+    async def on_message(self, message):
+        """Classify a message and dispatch it to matching waiters and subscribers."""
+        started = time.perf_counter()
+        self.messages_routed += 1
+
+        ctx = MessageContext(message, self.bot.user.id if self.bot.user else None)
+        if self.waiters:
+            self._resolve_waiters(message, ctx.channel_id)
+
+        matched = []
+        for subscription in list(self.subscriptions.values()):
+            try:
+                if subscription.matches(ctx):
+                    matched.append(subscription)
+            except Exception as e:
+                logger.error(f"Error in filter for message subscriber '{subscription.name}': {e}")
+
+        self.stats.setdefault('classify', StageStats()).record(time.perf_counter() - started)
+
+        if len(matched) == 1:
+            await self._run_handler(matched[0], message)
+        elif matched:
+            # Handlers run concurrently, as they did as separate listeners
+            await asyncio.gather(*(self._run_handler(subscription, message) for subscription in matched))
+
+    def get_stats(self):
+        """Get per-stage timings, slowest total time first.
+
+        Returns:
+            list: Dicts with stage, calls, total_ms, avg_ms, max_ms and errors
+        """
+        rows = []
+        for stage, stats in self.stats.items():
+            rows.append({
+                'stage': stage,
+                'calls': stats.calls,
+                'total_ms': stats.total * 1000,
+                'avg_ms': stats.total * 1000 / stats.calls if stats.calls else 0.0,
+                'max_ms': stats.max * 1000,
+                'errors': stats.errors
+            })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+def get_message_router(bot):
+    """Get the bot's message router, creating it and hooking it into on_message on first use."""
+    router = getattr(bot, 'message_router', None)
+    if router is None:
+        router = MessageRouter(bot)
+        bot.message_router = router
+        bot.add_listener(router.on_message, 'on_message')
+        logger.info("Message router attached to bot")
+    return router
@@ -5,21 +5,29 @@ from discord import app_commands
 from discord.ext import commands
 import logging
 from logger import setup_logger
-from database import Database
+from database import get_database
 
 logger = setup_logger('migration', 'bot.log')
 
+MERGE_CHOICES = [
+    app_commands.Choice(name="Overwrite existing values", value="overwrite"),
+    app_commands.Choice(name="Keep the higher values", value="max"),
+    app_commands.Choice(name="Add XP and coins together", value="sum")
+]
+
 class MigrationCog(commands.Cog):
     """Cog for migrating user data from old databases."""
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         logger.info("Migration cog initialized")
     
     @app_commands.command(name="migratedata", description="Migrate user data from an old database (Admin only)")
     @app_commands.default_permissions(administrator=True)
-    async def migrate_data(self, interaction: discord.Interaction, old_db_path: str = None):
+    @app_commands.describe(merge="How to combine migrated data with users that already exist")
+    @app_commands.choices(merge=MERGE_CHOICES)
+    async def migrate_data(self, interaction: discord.Interaction, old_db_path: str = None, merge: str = "overwrite"):
         """Migrate user data from an old database file."""
 
         if not interaction.user.guild_permissions.administrator:
@@ -71,49 +79,20 @@ class MigrationCog(commands.Cog):
                 old_conn.close()
                 return
 
-            migrated_count = 0
-            skipped_count = 0
-            error_count = 0
-
-            for old_user in old_users:
-                try:
-                    user_id = old_user['user_id']
-
-                    self.db.cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-                    current_user = self.db.cursor.fetchone()
-
-                    username = old_user['username'] if 'username' in old_columns else f"User_{user_id}"
-                    xp = old_user['xp'] if 'xp' in old_columns else 0
-                    level = old_user['level'] if 'level' in old_columns else 1
-                    coins = old_user['coins'] if 'coins' in old_columns else 0
-                    prestige = old_user['prestige'] if 'prestige' in old_columns else 0
-                    
-                    if current_user:
-
-                        self.db.cursor.execute('''
-                            UPDATE users SET 
-                                username = ?,
-                                xp = ?,
-                                level = ?,
-                                coins = ?,
-                                prestige = ?
-                            WHERE user_id = ?
-                        ''', (username, xp, level, coins, prestige, user_id))
-                    else:
-
-                        self.db.cursor.execute('''
-                            INSERT INTO users (
-                                user_id, username, xp, level, coins, prestige
-                            ) VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (user_id, username, xp, level, coins, prestige))
-                    
-                    migrated_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error migrating user {old_user['user_id']}: {e}")
-                    error_count += 1
+            records = (
+                {
+                    'user_id': old_user['user_id'],
+                    'username': old_user['username'] if 'username' in old_columns else None,
+                    'xp': old_user['xp'] if 'xp' in old_columns else 0,
+                    'level': old_user['level'] if 'level' in old_columns else 1,
+                    'coins': old_user['coins'] if 'coins' in old_columns else 0,
+                    'prestige': old_user['prestige'] if 'prestige' in old_columns else 0
+                }
+                for old_user in old_users
+            )
 
-            self.db.conn.commit()
+            migrated_count, skipped_count = self.db.import_users(records, merge_policy=merge)
+            error_count = 0
 
             old_conn.close()
 
@@ -143,7 +122,9 @@ class MigrationCog(commands.Cog):
     
     @app_commands.command(name="importusers", description="Import data for specific users (Admin only)")
     @app_commands.default_permissions(administrator=True)
-    async def import_users(self, interaction: discord.Interaction, user_data: str):
+    @app_commands.describe(merge="How to combine imported data with users that already exist")
+    @app_commands.choices(merge=MERGE_CHOICES)
+    async def import_users(self, interaction: discord.Interaction, user_data: str, merge: str = "overwrite"):
         """Import data for specific users in format: user_id,level,xp,coins,prestige;user_id,level,xp,coins,prestige"""
 
         if not interaction.user.guild_permissions.administrator:
@@ -163,6 +144,7 @@ class MigrationCog(commands.Cog):
             imported_count = 0
             error_count = 0
             results = []
+            records = []
             
             for entry in user_entries:
                 try:
@@ -187,27 +169,14 @@ class MigrationCog(commands.Cog):
                     coins = int(fields[3]) if len(fields) > 3 else 0
                     prestige = int(fields[4]) if len(fields) > 4 else 0
 
-                    self.db.cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-                    current_user = self.db.cursor.fetchone()
-                    
-                    if current_user:
-
-                        self.db.cursor.execute('''
-                            UPDATE users SET 
-                                username = ?,
-                                xp = ?,
-                                level = ?,
-                                coins = ?,
-                                prestige = ?
-                            WHERE user_id = ?
-                        ''', (username, xp, level, coins, prestige, user_id))
-                    else:
-
-                        self.db.cursor.execute('''
-                            INSERT INTO users (
-                                user_id, username, xp, level, coins, prestige
-                            ) VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (user_id, username, xp, level, coins, prestige))
+                    records.append({
+                        'user_id': user_id,
+                        'username': username,
+                        'xp': xp,
+                        'level': level,
+                        'coins': coins,
+                        'prestige': prestige
+                    })
                     
                     imported_count += 1
                     results.append(f"✅ {username}: Level {level}, XP {xp}, Coins {coins}, Prestige {prestige}")
@@ -217,7 +186,7 @@ class MigrationCog(commands.Cog):
                     results.append(f"❌ Error with entry '{entry}': {str(e)}")
                     error_count += 1
 
-            self.db.conn.commit()
+            self.db.import_users(records, merge_policy=merge)
 
             embed = discord.Embed(
                 title="✅ User Data Import Complete",
@@ -3,16 +3,19 @@ from discord import app_commands
 from discord.ext import commands
 import random
 import asyncio
-import json
 import os
 import logging
 import string
 import sqlite3
 from datetime import datetime, timedelta
 from permissions import has_admin_permissions
+from message_router import get_message_router
+from document_store import get_document_store
 
 logger = logging.getLogger(__name__)
 
+MINI_GAMES = ("type_race", "memory_game", "reverse_spelling", "true_false")
+
 class MiniGameSettings:
     """Class to store mini-game settings."""
     def __init__(self):
@@ -115,7 +118,8 @@ class MiniGamesCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.settings_file = "data/mini_games.json"
+        self.settings_store = get_document_store().collection('mini_games', legacy_file='data/mini_games.json')
+        self.saved_settings = {}  # Last stored copy of each game's settings
         self.settings = MiniGameSettings()
         self.type_race_task = None
         self.memory_game_task = None
@@ -218,39 +222,24 @@ class MiniGamesCog(commands.Cog):
             self.true_false_task = asyncio.create_task(self.run_true_false())
     
     def load_settings(self):
-        """Load mini-game settings from JSON file."""
+        """Load mini-game settings from the document store."""
         try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r') as f:
-                    data = json.load(f)
-                    
-                    # Update settings from file
-                    if "type_race" in data:
-                        self.settings.type_race.update(data["type_race"])
-                    if "memory_game" in data:
-                        self.settings.memory_game.update(data["memory_game"])
-                    if "reverse_spelling" in data:
-                        self.settings.reverse_spelling.update(data["reverse_spelling"])
-                    if "true_false" in data:
-                        self.settings.true_false.update(data["true_false"])
-            else:
-                # Create default settings file
-                self.save_settings()
+            for game in MINI_GAMES:
+                stored = self.settings_store.get(game)
+                if stored is not None:
+                    getattr(self.settings, game).update(stored)
+                self.saved_settings[game] = dict(getattr(self.settings, game))
         except Exception as e:
             logger.error(f"Error loading mini-game settings: {e}")
     
     def save_settings(self):
-        """Save mini-game settings to JSON file."""
+        """Save the mini-game settings that changed since they were last saved, one row per game."""
         try:
-            data = {
-                "type_race": self.settings.type_race,
-                "memory_game": self.settings.memory_game,
-                "reverse_spelling": self.settings.reverse_spelling,
-                "true_false": self.settings.true_false
-            }
-            
-            with open(self.settings_file, 'w') as f:
-                json.dump(data, f, indent=4)
+            for game in MINI_GAMES:
+                game_settings = getattr(self.settings, game)
+                if self.saved_settings.get(game) != game_settings:
+                    self.settings_store.put(game, game_settings)
+                    self.saved_settings[game] = dict(game_settings)
                 
             return True
         except Exception as e:
@@ -261,14 +250,15 @@ class MiniGamesCog(commands.Cog):
         """Award XP and coins to a user."""
         try:
             # Get the database from Database module
-            from database import Database
-            db = Database()
+            from database import get_database
+            from rewards import CoinSource
+            db = get_database()
             
             # Add XP directly to the database
             db.add_xp(user_id, username, xp_amount=xp)
             
             # Add coins directly to the database
-            db.add_coins(user_id, username, coins)
+            db.add_coins(user_id, username, coins, CoinSource.MINI_GAME)
             
             return True
         except Exception as e:
@@ -531,13 +521,11 @@ class MiniGamesCog(commands.Cog):
                 
                 # Wait for correct answer
                 def check(message):
-                    if message.channel.id != channel.id:
-                        return False
                     return message.content.strip().lower() == sentence.lower()
                 
                 try:
                     # Wait for correct answer (timeout after 5 minutes)
-                    winner_message = await self.bot.wait_for('message', check=check, timeout=300)
+                    winner_message = await get_message_router(self.bot).wait_for(channel.id, check=check, timeout=300)
                     
                     # Generate rewards
                     coins = random.randint(self.settings.type_race["min_coins"], self.settings.type_race["max_coins"])
@@ -650,13 +638,11 @@ class MiniGamesCog(commands.Cog):
                 correct_sequence = " ".join(emoji_sequence)
                 
                 def check(message):
-                    if message.channel.id != channel.id:
-                        return False
                     return message.content.strip() == correct_sequence
                 
                 try:
                     # Wait for correct answer (timeout after 2 minutes)
-                    winner_message = await self.bot.wait_for('message', check=check, timeout=120)
+                    winner_message = await get_message_router(self.bot).wait_for(channel.id, check=check, timeout=120)
                     
                     # Generate rewards
                     coins = random.randint(self.settings.memory_game["min_coins"], self.settings.memory_game["max_coins"])
@@ -751,13 +737,11 @@ class MiniGamesCog(commands.Cog):
                 
                 # Wait for correct answer
                 def check(message):
-                    if message.channel.id != channel.id:
-                        return False
                     return message.content.strip().lower() == word.lower()
                 
                 try:
                     # Wait for correct answer (timeout after 3 minutes)
-                    winner_message = await self.bot.wait_for('message', check=check, timeout=180)
+                    winner_message = await get_message_router(self.bot).wait_for(channel.id, check=check, timeout=180)
                     
                     # Generate rewards
                     coins = random.randint(self.settings.reverse_spelling["min_coins"], self.settings.reverse_spelling["max_coins"])
@@ -4,6 +4,8 @@ import asyncio
 from discord.ext import commands
 from dotenv import load_dotenv
 from logger import setup_logger
+from instrumentation import instrument_bot
+from command_sync import sync_commands
 
 # Import cogs to sync 89 commands but still stay under the 100 command limit
 from leveling import setup as setup_leveling
@@ -105,25 +107,12 @@ async def initialize_bot():
             for cmd in bot.tree.get_commands():
                 logger.info(f"Command: {cmd.name}")
             
-            # Force sync the commands globally first
-            try:
-                global_commands = await bot.tree.sync()
-                logger.info(f"Synced {len(global_commands)} commands globally")
-                total_synced = len(global_commands)
-            except Exception as e:
-                logger.error(f"Failed to sync commands globally: {e}")
-                total_synced = 0
-                
-            # Now sync to each guild separately for guild-specific commands
-            for guild_id in guild_ids:
-                try:
-                    guild_commands = await bot.tree.sync(guild=discord.Object(id=guild_id))
-                    total_synced += len(guild_commands)
-                    logger.info(f"Synced {len(guild_commands)} commands to guild ID: {guild_id}")
-                except Exception as e:
-                    logger.error(f"Failed to sync commands to guild ID {guild_id}: {e}")
-            
-            print(f"Synced {total_synced} total command(s) across {len(guild_ids)} guild(s)")
+            # Sync the global commands, then each guild's, skipping scopes whose commands haven't changed
+            report = await sync_commands(bot, guild_ids)
+            total_synced = sum(report['synced'].values())
+
+            print(f"Synced {total_synced} total command(s) to {len(report['synced'])} scope(s), "
+                  f"skipped {len(report['skipped'])} unchanged scope(s) across {len(guild_ids)} guild(s)")
             print(f"Bot is online as {bot.user.name}")
             
             # Log the registered commands
@@ -134,6 +123,9 @@ async def initialize_bot():
         except Exception as e:
             print(f"Failed to sync commands: {e}")
 
+    # Times every listener and command when METRICS_PORT is set; a no-op otherwise
+    await instrument_bot(bot)
+
     max_retries = 5
     retry_count = 0
     
@@ -9,6 +9,7 @@ import asyncio
 import random
 import sqlite3
 from logger import setup_logger
+from database import tune_connection
 
 logger = setup_logger('mining', 'bot.log')
 
@@ -50,9 +51,11 @@ PRESTIGE_BENEFITS = {
     "base_cost": 50000  # Base cost for first prestige
 }
 
+MINING_LEADERBOARD_SCORE = f"(money + prestige_level * {int(PRESTIGE_BENEFITS['base_cost'])})"
+
 def get_db_connection():
     """Get a connection to the SQLite database."""
-    conn = sqlite3.connect('data/leveling.db')
+    conn = tune_connection(sqlite3.connect('data/leveling.db'))
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -88,6 +91,12 @@ def initialize_db():
         PRIMARY KEY (user_id, item_name)
     )
     ''')
+
+    # Expression index matching the ordering used by get_mining_leaderboard
+    cursor.execute(f'''
+    CREATE INDEX IF NOT EXISTS idx_mining_stats_leaderboard
+    ON mining_stats ({MINING_LEADERBOARD_SCORE} DESC, prestige_level DESC, user_id, money)
+    ''')
     
     conn.commit()
     conn.close()
@@ -253,11 +262,12 @@ def get_mining_leaderboard(limit=10):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("""
+    # The score is inlined rather than bound so SQLite can use idx_mining_stats_leaderboard
+    cursor.execute(f"""
     SELECT user_id, money, prestige_level FROM mining_stats
-    ORDER BY (money + prestige_level * ?) DESC, prestige_level DESC
+    ORDER BY {MINING_LEADERBOARD_SCORE} DESC, prestige_level DESC
     LIMIT ?
-    """, (PRESTIGE_BENEFITS["base_cost"], limit))
+    """, (limit,))
     
     leaderboard = [dict(row) for row in cursor.fetchall()]
     
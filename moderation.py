@@ -3,8 +3,13 @@ from discord import app_commands
 from discord.ext import commands
 import logging
 import datetime
-import json
 import asyncio
+from scheduler import get_scheduler
+from moderation_store import ModerationStore
+from settings_storage import settings_storage
+
+MAX_CONCURRENT_UNMUTES = 5  # Expired mutes lifted at the same time
+EXPIRY_RETRY_DELAY = 60  # Seconds before retrying mutes that failed to lift
 
 class ModerationCog(commands.Cog):
     """Cog for moderation commands like ban, mute, kick, and warn."""
@@ -14,87 +19,46 @@ class ModerationCog(commands.Cog):
         self.logger = logging.getLogger('moderation')
         self.log_channel_id = None
         self.load_settings()
+        settings_storage.subscribe('moderation_log_channel_id', self.on_settings_changed)
         
-        # Track active mutes
-        self.active_mutes = {}
-        self.active_warns = {}
-        
-        # Load active mutes/warns from file
-        self.load_active_moderation_actions()
-        
-        # We'll start the check loop when the bot is ready
-        self.expired_actions_task = None
+        # Active mutes and warnings, stored per action with an expiry index
+        self.store = ModerationStore()
         
-        # Register on_ready event listener
-        self.bot.add_listener(self.on_ready, 'on_ready')
+        # Expiries and temporary bans are handled by the shared scheduler so they survive restarts
+        self.scheduler = get_scheduler(bot)
+        self.scheduler.register('moderation_expiry', self.run_expiry_check)
+        self.scheduler.register('moderation_unban', self.run_scheduled_unban)
+        self.schedule_expiry_check()
     
     def load_settings(self):
-        """Load moderation settings from settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-                self.log_channel_id = settings.get('moderation_log_channel_id')
-        except Exception as e:
-            self.logger.error(f"Failed to load moderation settings: {e}")
+        """Load moderation settings from the shared settings store."""
+        self.log_channel_id = settings_storage.get('moderation_log_channel_id')
     
     def save_settings(self):
-        """Save moderation settings to settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-            
-            settings['moderation_log_channel_id'] = self.log_channel_id
-            
-            with open('settings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
-        except Exception as e:
-            self.logger.error(f"Failed to save moderation settings: {e}")
+        """Save moderation settings to the shared settings store."""
+        settings_storage.set('moderation_log_channel_id', self.log_channel_id)
     
-    def load_active_moderation_actions(self):
-        """Load active mutes and warns from file."""
-        try:
-            with open('data/moderation_actions.json', 'r') as f:
-                data = json.load(f)
-                self.active_mutes = data.get('mutes', {})
-                self.active_warns = data.get('warns', {})
-        except FileNotFoundError:
-            self.logger.info("No active moderation actions found. Creating new file.")
-            self.save_active_moderation_actions()
-        except Exception as e:
-            self.logger.error(f"Failed to load active moderation actions: {e}")
-    
-    def save_active_moderation_actions(self):
-        """Save active mutes and warns to file."""
-        try:
-            # Ensure the directory exists
-            import os
-            os.makedirs('data', exist_ok=True)
-            
-            data = {
-                'mutes': self.active_mutes,
-                'warns': self.active_warns
-            }
-            
-            with open('data/moderation_actions.json', 'w') as f:
-                json.dump(data, f, indent=4)
-        except Exception as e:
-            self.logger.error(f"Failed to save active moderation actions: {e}")
+    def on_settings_changed(self, key, value):
+        """Pick up a new log channel when settings.json changes."""
+        self.log_channel_id = value
     
     def cog_unload(self):
         """Clean up when the cog is unloaded."""
-        # Save active moderation actions
-        self.save_active_moderation_actions()
-        
-        # Cancel the task if it exists
-        if self.expired_actions_task:
-            self.expired_actions_task.cancel()
-            
-    async def on_ready(self):
-        """Start checking for expired actions when the bot is ready."""
-        if self.expired_actions_task is None or self.expired_actions_task.done():
-            # Start the check loop
-            self.expired_actions_task = self.bot.loop.create_task(self.check_expired_actions_loop())
-            self.logger.info("Started expired actions check loop")
+        settings_storage.unsubscribe('moderation_log_channel_id', self.on_settings_changed)
+        self.store.close()
+    
+    def schedule_expiry_check(self, after_check=False):
+        """Schedule the expiry check for the next mute or warning to expire."""
+        next_expiry = self.store.next_expiry()
+        if next_expiry is None:
+            self.scheduler.cancel('moderation_expiry')
+            return
+        
+        # Anything still overdue after a check is a mute that failed to lift; retry it later
+        now = datetime.datetime.now().timestamp()
+        if after_check and next_expiry <= now:
+            next_expiry = now + EXPIRY_RETRY_DELAY
+        self.scheduler.schedule('moderation_expiry', 'moderation_expiry', next_expiry)
     
     async def log_moderation_action(self, action_type, moderator, user, reason, duration=None):
         """Log a moderation action to the log channel."""
@@ -196,81 +160,84 @@ class ModerationCog(commands.Cog):
         
         return datetime.datetime.now().timestamp() + duration_seconds
     
-    async def check_expired_actions_loop(self):
-        """Loop to check for and remove expired mutes and warns every minute."""
-        await self.bot.wait_until_ready()
-        while not self.bot.is_closed():
-            await self.check_expired_actions()
-            await asyncio.sleep(60)
+    async def run_expiry_check(self, job_id, payload):
+        """Scheduler job that runs when the earliest mute or warning expires."""
+        await self.check_expired_actions()
             
     async def check_expired_actions(self):
-        """Check for and remove expired mutes and warns."""
+        """Remove expired warnings and lift expired mutes, then schedule the next check."""
         current_time = datetime.datetime.now().timestamp()
         
-        # Check mutes
-        expired_mutes = []
-        for user_id, mute_data in self.active_mutes.items():
-            if mute_data.get('expiry') and mute_data['expiry'] <= current_time:
-                expired_mutes.append(user_id)
-        
-        # Remove expired mutes
-        for user_id in expired_mutes:
-            await self.unmute_user(user_id)
-        
-        # Check warns
-        expired_warns = []
-        for user_id, warns_data in self.active_warns.items():
-            expired_for_user = []
-            for warn_id, warn_data in warns_data.items():
-                if warn_data.get('expiry') and warn_data['expiry'] <= current_time:
-                    expired_for_user.append(warn_id)
-            
-            if expired_for_user:
-                new_warns = {k: v for k, v in warns_data.items() if k not in expired_for_user}
-                if new_warns:
-                    self.active_warns[user_id] = new_warns
-                else:
-                    expired_warns.append(user_id)
-        
-        # Remove users with no active warns
-        for user_id in expired_warns:
-            if user_id in self.active_warns:
-                del self.active_warns[user_id]
-        
-        # Save changes if any actions expired
-        if expired_mutes or expired_warns:
-            self.save_active_moderation_actions()
+        try:
+            expired_warns = self.store.delete_expired_warns(current_time)
+            if expired_warns:
+                self.logger.info(f"Removed {expired_warns} expired warnings")
+            
+            expired_mutes = self.store.get_due_mutes(current_time)
+            if expired_mutes:
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_UNMUTES)
+                
+                async def unmute_limited(user_id, mute_data):
+                    async with semaphore:
+                        await self.unmute_user(user_id, mute_data)
+                
+                await asyncio.gather(*(unmute_limited(user_id, mute_data) for user_id, mute_data in expired_mutes))
+                self.logger.info(f"Lifted {len(expired_mutes)} expired mutes")
+        finally:
+            self.schedule_expiry_check(after_check=True)
     
-    # Function no longer needed as we have this logic in check_expired_actions_loop
+    async def run_scheduled_unban(self, job_id, payload):
+        """Scheduler job that lifts a temporary ban."""
+        guild = self.bot.get_guild(int(payload['guild_id']))
+        if not guild:
+            self.logger.warning(f"Could not find guild {payload['guild_id']} to lift temporary ban of {payload['user_id']}")
+            return
+        
+        try:
+            user = await self.bot.fetch_user(int(payload['user_id']))
+            await guild.unban(user, reason=f"Temporary ban duration expired ({payload['duration_text']})")
+            # Log the unban
+            if self.log_channel_id:
+                channel = self.bot.get_channel(int(self.log_channel_id))
+                if channel:
+                    embed = discord.Embed(
+                        title="Unban Action",
+                        description=f"{user.mention} ({user.name}) has been automatically unbanned",
+                        color=discord.Color.green(),
+                        timestamp=datetime.datetime.now()
+                    )
+                    embed.add_field(name="Reason", value="Temporary ban duration expired", inline=False)
+                    embed.set_footer(text=f"User ID: {user.id}")
+                    await channel.send(embed=embed)
+        except Exception as e:
+            self.logger.error(f"Failed to unban user {payload['user_id']}: {e}")
     
-    async def unmute_user(self, user_id):
+    async def unmute_user(self, user_id, mute_data=None):
         """Remove a mute from a user."""
         try:
             user_id = str(user_id)
-            if user_id not in self.active_mutes:
+            mute_data = mute_data or self.store.get_mute(user_id)
+            if not mute_data:
                 return
             
             # Get the guild and user
-            guild_id = self.active_mutes[user_id].get('guild_id')
+            guild_id = mute_data.get('guild_id')
             if not guild_id:
-                del self.active_mutes[user_id]
-                self.save_active_moderation_actions()
+                self.store.remove_mute(user_id)
                 return
             
             guild = self.bot.get_guild(int(guild_id))
             if not guild:
-                del self.active_mutes[user_id]
-                self.save_active_moderation_actions()
+                self.store.remove_mute(user_id)
                 return
             
             member = guild.get_member(int(user_id))
             if not member:
-                del self.active_mutes[user_id]
-                self.save_active_moderation_actions()
+                self.store.remove_mute(user_id)
                 return
             
             # Remove the muted role
-            muted_role_id = self.active_mutes[user_id].get('role_id')
+            muted_role_id = mute_data.get('role_id')
             if muted_role_id:
                 role = guild.get_role(int(muted_role_id))
                 if role and role in member.roles:
@@ -298,8 +265,7 @@ class ModerationCog(commands.Cog):
                 pass
             
             # Remove the mute from active mutes
-            del self.active_mutes[user_id]
-            self.save_active_moderation_actions()
+            self.store.remove_mute(user_id)
         except Exception as e:
             self.logger.error(f"Failed to unmute user {user_id}: {e}")
     
@@ -376,29 +342,12 @@ class ModerationCog(commands.Cog):
             
             # If temporary ban, schedule unban
             if duration_seconds is not None:
-                # Schedule an unban after the duration
-                async def unban_later():
-                    await asyncio.sleep(duration_seconds)
-                    try:
-                        await interaction.guild.unban(user, reason=f"Temporary ban duration expired ({duration_text})")
-                        # Log the unban
-                        if self.log_channel_id:
-                            channel = self.bot.get_channel(int(self.log_channel_id))
-                            if channel:
-                                embed = discord.Embed(
-                                    title="Unban Action",
-                                    description=f"{user.mention} ({user.name}) has been automatically unbanned",
-                                    color=discord.Color.green(),
-                                    timestamp=datetime.datetime.now()
-                                )
-                                embed.add_field(name="Reason", value="Temporary ban duration expired", inline=False)
-                                embed.set_footer(text=f"User ID: {user.id}")
-                                await channel.send(embed=embed)
-                    except Exception as e:
-                        self.logger.error(f"Failed to unban user {user.id}: {e}")
-                
-                # Start the task to unban later
-                self.bot.loop.create_task(unban_later())
+                self.scheduler.schedule(
+                    'moderation_unban',
+                    f"unban:{interaction.guild.id}:{user.id}",
+                    self.calculate_expiry(duration_seconds),
+                    {'guild_id': interaction.guild.id, 'user_id': user.id, 'duration_text': duration_text}
+                )
         
         except discord.Forbidden:
             await interaction.response.send_message("I don't have permission to ban that user.", ephemeral=True)
@@ -561,17 +510,15 @@ class ModerationCog(commands.Cog):
             expiry = self.calculate_expiry(duration_seconds)
             
             # Store the mute information
-            self.active_mutes[str(user.id)] = {
+            self.store.set_mute(user.id, {
                 'guild_id': str(interaction.guild.id),
                 'role_id': str(muted_role.id),
                 'moderator_id': str(interaction.user.id),
                 'reason': reason,
                 'expiry': expiry,
                 'duration': duration_text
-            }
-            
-            # Save active mutes
-            self.save_active_moderation_actions()
+            })
+            self.schedule_expiry_check()
             
             # Log the mute
             await self.log_moderation_action(
@@ -624,9 +571,7 @@ class ModerationCog(commands.Cog):
             await user.remove_roles(muted_role, reason=f"Unmuted by {interaction.user.name}: {reason}")
             
             # Remove from active mutes
-            if str(user.id) in self.active_mutes:
-                del self.active_mutes[str(user.id)]
-                self.save_active_moderation_actions()
+            self.store.remove_mute(user.id)
             
             # Log the unmute
             await self.log_moderation_action(
@@ -674,26 +619,19 @@ class ModerationCog(commands.Cog):
         # Generate a unique warn ID
         warn_id = f"{datetime.datetime.now().timestamp()}"
         
-        # Create or update the user's warnings
-        user_id = str(user.id)
-        if user_id not in self.active_warns:
-            self.active_warns[user_id] = {}
-        
         # Add the new warning
-        self.active_warns[user_id][warn_id] = {
+        self.store.add_warn(user.id, warn_id, {
             'guild_id': str(interaction.guild.id),
             'moderator_id': str(interaction.user.id),
             'reason': reason,
             'timestamp': datetime.datetime.now().timestamp(),
             'expiry': expiry,
             'duration': duration_text
-        }
-        
-        # Save active warnings
-        self.save_active_moderation_actions()
+        })
+        self.schedule_expiry_check()
         
         # Count the user's active warnings
-        warning_count = len(self.active_warns[user_id])
+        warning_count = len(self.store.get_warns(user.id))
         
         # DM the user about the warning
         dm_sent = await self.dm_user(
@@ -728,9 +666,9 @@ class ModerationCog(commands.Cog):
             interaction: The interaction that triggered this command
             user: The user to show warnings for
         """
-        user_id = str(user.id)
+        warns = self.store.get_warns(user.id)
         
-        if user_id not in self.active_warns or not self.active_warns[user_id]:
+        if not warns:
             await interaction.response.send_message(
                 f"{user.mention} has no active warnings.",
                 ephemeral=True
@@ -740,13 +678,13 @@ class ModerationCog(commands.Cog):
         # Create an embed to display warnings
         embed = discord.Embed(
             title=f"Warnings for {user.name}",
-            description=f"{user.mention} has {len(self.active_warns[user_id])} active warnings.",
+            description=f"{user.mention} has {len(warns)} active warnings.",
             color=discord.Color.gold(),
             timestamp=datetime.datetime.now()
         )
         
         # Add each warning to the embed
-        for i, (warn_id, warning) in enumerate(self.active_warns[user_id].items(), 1):
+        for i, (warn_id, warning) in enumerate(warns.items(), 1):
             moderator = interaction.guild.get_member(int(warning.get('moderator_id', 0)))
             moderator_name = moderator.name if moderator else "Unknown Moderator"
             
@@ -775,22 +713,16 @@ class ModerationCog(commands.Cog):
             interaction: The interaction that triggered this command
             user: The user to clear warnings for
         """
-        user_id = str(user.id)
+        # Clear the warnings, counting how many were removed
+        warning_count = self.store.clear_warns(user.id)
         
-        if user_id not in self.active_warns or not self.active_warns[user_id]:
+        if not warning_count:
             await interaction.response.send_message(
                 f"{user.mention} has no active warnings to clear.",
                 ephemeral=True
             )
             return
         
-        # Count how many warnings were cleared
-        warning_count = len(self.active_warns[user_id])
-        
-        # Clear the warnings
-        del self.active_warns[user_id]
-        self.save_active_moderation_actions()
-        
         # Log the action
         await self.log_moderation_action(
             "Clear Warnings",
@@ -941,27 +873,17 @@ class ModerationCog(commands.Cog):
             )
             return
         
-        # Update permissions in settings.json
+        # Update permissions in the shared settings store
         try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-            
-            # Initialize the roles dictionary if it doesn't exist
-            if 'permission_roles' not in settings:
-                settings['permission_roles'] = {}
-            
-            # Initialize the permission level array if it doesn't exist
-            if permission_level not in settings['permission_roles']:
-                settings['permission_roles'][permission_level] = []
+            permission_roles = settings_storage.get('permission_roles', {})
             
             # Add the role ID if it's not already in the list
             role_id = str(role.id)
-            if role_id not in settings['permission_roles'][permission_level]:
-                settings['permission_roles'][permission_level].append(role_id)
+            level_roles = permission_roles.setdefault(permission_level, [])
+            if role_id not in level_roles:
+                level_roles.append(role_id)
             
-            # Save the updated settings
-            with open('settings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
+            settings_storage.set('permission_roles', permission_roles)
             
             await interaction.response.send_message(
                 f"The role {role.mention} has been given {permission_level} permissions.",
@@ -0,0 +1,152 @@
+import os
+import json
+import sqlite3
+import logging
+
+logger = logging.getLogger('moderation')
+
+MODERATION_DB_PATH = 'data/moderation.db'
+LEGACY_ACTIONS_FILE = 'data/moderation_actions.json'
+
+class ModerationStore:
+    """
+    SQLite storage for active mutes and warnings.
+    Each action is its own row, so adding or expiring one action doesn't rewrite
+    the others, and the partial index on expiry lets due actions be found
+    without scanning every active mute and warning.
+    """
+
+    def __init__(self, db_path=MODERATION_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self._create_tables()
+        self._import_legacy_file()
+
+    def _create_tables(self):
+        """Create the moderation actions table and expiry index if they don't exist."""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS moderation_actions (
+                action_type TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                action_id TEXT NOT NULL,
+                guild_id TEXT,
+                expiry REAL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (action_type, user_id, action_id)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_moderation_actions_expiry
+            ON moderation_actions (action_type, expiry) WHERE expiry IS NOT NULL
+        ''')
+        self.conn.commit()
+
+    def _import_legacy_file(self):
+        """Move actions from the old moderation_actions.json file into the table, once."""
+        if not os.path.exists(LEGACY_ACTIONS_FILE):
+            return
+
+        try:
+            with open(LEGACY_ACTIONS_FILE, 'r') as f:
+                data = json.load(f)
+
+            with self.conn:
+                for user_id, mute in data.get('mutes', {}).items():
+                    self._upsert('mute', user_id, 'mute', mute)
+                for user_id, warns in data.get('warns', {}).items():
+                    for warn_id, warn in warns.items():
+                        self._upsert('warn', user_id, warn_id, warn)
+
+            os.replace(LEGACY_ACTIONS_FILE, f"{LEGACY_ACTIONS_FILE}.migrated")
+            logger.info(f"Imported moderation actions from {LEGACY_ACTIONS_FILE} into {self.db_path}")
+        except Exception as e:
+            logger.error(f"Failed to import moderation actions from {LEGACY_ACTIONS_FILE}: {e}")
+
+    def _upsert(self, action_type, user_id, action_id, data):
+        self.conn.execute('''
+            INSERT OR REPLACE INTO moderation_actions (action_type, user_id, action_id, guild_id, expiry, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (action_type, str(user_id), action_id, data.get('guild_id'), data.get('expiry'), json.dumps(data)))
+
+    def set_mute(self, user_id, data):
+        """Store a user's active mute, replacing any previous one."""
+        with self.conn:
+            self._upsert('mute', user_id, 'mute', data)
+
+    def get_mute(self, user_id):
+        """Get a user's active mute, or None."""
+        row = self.conn.execute(
+            "SELECT data FROM moderation_actions WHERE action_type = 'mute' AND user_id = ?", (str(user_id),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def remove_mute(self, user_id):
+        """Remove a user's active mute."""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM moderation_actions WHERE action_type = 'mute' AND user_id = ?", (str(user_id),)
+            )
+
+    def add_warn(self, user_id, warn_id, data):
+        """Store a warning."""
+        with self.conn:
+            self._upsert('warn', user_id, warn_id, data)
+
+    def get_warns(self, user_id):
+        """Get a user's active warnings, oldest first.
+
+        Returns:
+            dict: warn_id -> warning data
+        """
+        rows = self.conn.execute(
+            "SELECT action_id, data FROM moderation_actions WHERE action_type = 'warn' AND user_id = ? ORDER BY action_id",
+            (str(user_id),)
+        ).fetchall()
+        return {warn_id: json.loads(data) for warn_id, data in rows}
+
+    def clear_warns(self, user_id):
+        """Remove all of a user's warnings. Returns the number removed."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM moderation_actions WHERE action_type = 'warn' AND user_id = ?", (str(user_id),)
+            )
+        return cursor.rowcount
+
+    def get_due_mutes(self, now):
+        """Get mutes that have expired by the given timestamp.
+
+        Returns:
+            list: (user_id, mute data) pairs
+        """
+        rows = self.conn.execute(
+            "SELECT user_id, data FROM moderation_actions WHERE action_type = 'mute' AND expiry IS NOT NULL AND expiry <= ?",
+            (now,)
+        ).fetchall()
+        return [(user_id, json.loads(data)) for user_id, data in rows]
+
+    def delete_expired_warns(self, now):
+        """Delete warnings that have expired by the given timestamp. Returns the number removed."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM moderation_actions WHERE action_type = 'warn' AND expiry IS NOT NULL AND expiry <= ?",
+                (now,)
+            )
+        return cursor.rowcount
+
+    def next_expiry(self):
+        """Get the earliest expiry timestamp of any active action, or None."""
+        # One indexed lookup per action type rather than a MIN over the whole table
+        row = self.conn.execute('''
+            SELECT MIN(expiry) FROM (
+                SELECT MIN(expiry) AS expiry FROM moderation_actions WHERE action_type = 'mute' AND expiry IS NOT NULL
+                UNION ALL
+                SELECT MIN(expiry) AS expiry FROM moderation_actions WHERE action_type = 'warn' AND expiry IS NOT NULL
+            )
+        ''').fetchone()
+        return row[0]
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
@@ -7,6 +7,8 @@ import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import DictCursor
 from logger import setup_logger
+from rank_index import get_rank_index
+from level_curve import get_level_curve
 
 logger = setup_logger('pg_database')
 
@@ -23,6 +25,7 @@ class PGDatabase:
             raise ValueError("DATABASE_URL environment variable is required")
         
         self.conn = None
+        self.rank_index = get_rank_index(self.database_url)
         self.connect()
         self._create_tables()
         
@@ -178,6 +181,7 @@ class PGDatabase:
                 ON CONFLICT (user_id) DO NOTHING
             ''', (user_id, username))
         
+        self._update_rank_index(user_id)
         return self.get_user(user_id) or {"user_id": user_id, "username": username, "xp": 0, "level": 1, "coins": 0}
     
     def update_user(self, user_id, data):
@@ -204,6 +208,9 @@ class PGDatabase:
         
         with self.conn.cursor() as cursor:
             cursor.execute(update_query, values)
+        
+        if 'level' in data or 'xp' in data:
+            self._update_rank_index(user_id)
     
     def add_xp(self, user_id, username, xp_amount):
         """Add XP to a user and handle level ups."""
@@ -218,26 +225,12 @@ class PGDatabase:
         current_xp = user_data.get('xp', 0)
         current_level = user_data.get('level', 1)
         
-        new_xp = current_xp + xp_amount
-        
-        # Calculate if level up occurred
-        base_xp = self.settings.get('base_xp', 75)
-        xp_per_level = self.settings.get('xp_per_level', 75)
+        # Calculate if level up occurred (may be multiple)
+        level_curve = get_level_curve(self.settings.get('base_xp', 75), self.settings.get('xp_per_level', 75))
         coins_per_level = self.settings.get('coins_per_level', 35)
         
-        xp_needed = base_xp + (current_level - 1) * xp_per_level
-        
-        coins_earned = 0
-        new_level = current_level
-        
-        # Check for level ups (may be multiple)
-        while new_xp >= xp_needed:
-            new_xp -= xp_needed
-            new_level += 1
-            coins_earned += coins_per_level
-            
-            # Calculate next level's XP requirement
-            xp_needed = base_xp + (new_level - 1) * xp_per_level
+        new_level, new_xp = level_curve.add_xp(current_level, current_xp, xp_amount)
+        coins_earned = (new_level - current_level) * coins_per_level
         
         # Update user data
         user_data['xp'] = new_xp
@@ -308,7 +301,7 @@ class PGDatabase:
         """Get the top users ranked by XP or coins."""
         self.ensure_connection()
         
-        order_by = "level DESC, xp DESC" if by_xp else "coins DESC"
+        order_by = "level DESC, xp DESC, user_id" if by_xp else "coins DESC, user_id"
         
         with self.conn.cursor(cursor_factory=DictCursor) as cursor:
             cursor.execute(f"SELECT * FROM users ORDER BY {order_by} LIMIT %s OFFSET %s", 
@@ -317,16 +310,33 @@ class PGDatabase:
             
             return [dict(row) for row in rows]
     
+    def _update_rank_index(self, user_id):
+        """Move a user to their current position in the rank index."""
+        if not self.rank_index.loaded:
+            return
+        
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT level, xp FROM users WHERE user_id = %s", (user_id,))
+            result = cursor.fetchone()
+            if result:
+                self.rank_index.update(user_id, (result[0], result[1]))
+    
     def get_user_rank(self, user_id, by_xp=True):
         """Get a user's rank position."""
         self.ensure_connection()
         
-        order_by = "level DESC, xp DESC" if by_xp else "coins DESC"
+        if by_xp:
+            # Ranked from the in-memory index, loaded from the users table on first use
+            if not self.rank_index.loaded:
+                with self.conn.cursor() as cursor:
+                    cursor.execute("SELECT user_id, level, xp FROM users")
+                    self.rank_index.load((row[0], (row[1], row[2])) for row in cursor.fetchall())
+            return self.rank_index.get_rank(user_id)
         
         with self.conn.cursor() as cursor:
-            cursor.execute(f"""
+            cursor.execute("""
                 SELECT position FROM (
-                    SELECT user_id, ROW_NUMBER() OVER (ORDER BY {order_by}) as position
+                    SELECT user_id, ROW_NUMBER() OVER (ORDER BY coins DESC, user_id) as position
                     FROM users
                 ) ranks
                 WHERE user_id = %s
@@ -746,6 +756,7 @@ class PGDatabase:
                     logger.warning(f"Could not migrate table {table}: {e}")
             
             sqlite_conn.close()
+            self.rank_index.invalidate()
             logger.info(f"Migration from SQLite database {sqlite_db_path} completed successfully")
             return True
             
@@ -3,22 +3,27 @@ from discord import app_commands
 from discord.ext import commands
 import json
 import os
-import logging
-from database import Database
+from logger import setup_logger
+import sqlite3
+from collections import OrderedDict
+from database import get_database
 import datetime
 import asyncio
 import pytz
 
 # Set up logging
-logger = logging.getLogger('profile_system')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('profile_system')
 
 # Path to profiles data
 PROFILES_PATH = "data/profiles.db"
+PROFILE_CACHE_SIZE = 1000  # Profiles kept in memory, least recently used are evicted
+
+# Single-row fetch, kept as one constant string so sqlite3 reuses the prepared statement
+SELECT_PROFILE_SQL = '''
+    SELECT user_id, mini_bio, standing_level, behavioral_stance, timezone,
+           preferred_languages, announcement_preferences, infractions
+    FROM profiles WHERE user_id = ?
+'''
 
 # Available timezones
 TIMEZONES = [
@@ -68,52 +73,75 @@ class ProfileManager:
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        self.profiles = {}
+        self.db = get_database()
+        self.profiles = OrderedDict()  # user_id -> profile, most recently used last
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.preference_index = {}  # announcement_id -> set of user IDs opted in
+        self.conn = None
         self.load_profiles()
         
     def load_profiles(self):
-        """Load profiles from the profiles database."""
+        """Open the profiles database and load the announcement preference index.
+
+        Profiles themselves are loaded on demand by get_profile.
+        """
         try:
-            if os.path.exists(PROFILES_PATH):
-                from sqlite3 import connect
-                conn = connect(PROFILES_PATH)
-                cursor = conn.cursor()
-                
-                # Check if the table exists
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='profiles'")
-                if not cursor.fetchone():
-                    self.create_profiles_table(cursor)
-                    conn.commit()
-                
-                # Load all profiles
-                cursor.execute("SELECT * FROM profiles")
-                for row in cursor.fetchall():
-                    user_id = row[0]
-                    self.profiles[user_id] = {
-                        'mini_bio': row[1],
-                        'standing_level': row[2],
-                        'behavioral_stance': row[3],
-                        'timezone': row[4],
-                        'preferred_languages': json.loads(row[5]) if row[5] else [],
-                        'announcement_preferences': json.loads(row[6]) if row[6] else [],
-                        'infractions': json.loads(row[7]) if row[7] else {"warnings": 0, "mutes": 0, "kicks": 0, "bans": 0}
-                    }
-                
-                conn.close()
-                logger.info(f"Loaded {len(self.profiles)} profiles from database")
-            else:
-                # Create the database and table
-                from sqlite3 import connect
-                conn = connect(PROFILES_PATH)
-                cursor = conn.cursor()
+            os.makedirs(os.path.dirname(PROFILES_PATH), exist_ok=True)
+            self.conn = sqlite3.connect(PROFILES_PATH)
+            cursor = self.conn.cursor()
+            
+            # Check if the table exists
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='profiles'")
+            if not cursor.fetchone():
                 self.create_profiles_table(cursor)
-                conn.commit()
-                conn.close()
-                logger.info("Created new profiles database")
+            self.create_preferences_table(cursor)
+            self.conn.commit()
+            
+            # Load the opt-ins for every announcement type
+            self.preference_index = {}
+            cursor.execute("SELECT announcement_id, user_id FROM profile_announcement_prefs")
+            for announcement_id, user_id in cursor.fetchall():
+                self.preference_index.setdefault(announcement_id, set()).add(user_id)
+            
+            opt_ins = sum(len(users) for users in self.preference_index.values())
+            logger.info(f"Opened profiles database, {opt_ins} announcement opt-ins indexed")
         except Exception as e:
             logger.error(f"Error loading profiles: {e}", exc_info=True)
     
+    def _cache_profile(self, user_id, profile):
+        """Add or refresh a profile in the cache, evicting the least recently used one if it's full."""
+        self.profiles[user_id] = profile
+        self.profiles.move_to_end(user_id)
+        if len(self.profiles) > PROFILE_CACHE_SIZE:
+            self.profiles.popitem(last=False)
+    
+    def get_cache_stats(self):
+        """Get the profile cache size and hit rate.
+        
+        Returns:
+            dict: size, max_size, hits, misses and hit_rate
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self.profiles),
+            'max_size': PROFILE_CACHE_SIZE,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0
+        }
+    
+    def _profile_from_row(self, row, announcement_preferences):
+        return {
+            'mini_bio': row[1],
+            'standing_level': row[2],
+            'behavioral_stance': row[3],
+            'timezone': row[4],
+            'preferred_languages': json.loads(row[5]) if row[5] else [],
+            'announcement_preferences': announcement_preferences,
+            'infractions': json.loads(row[7]) if row[7] else {"warnings": 0, "mutes": 0, "kicks": 0, "bans": 0}
+        }
+    
     def create_profiles_table(self, cursor):
         """Create the profiles table in the database."""
         # First drop the old table if it exists (to fix schema issues)
@@ -136,49 +164,72 @@ class ProfileManager:
         ''')
         logger.info("Created profiles table in database")
     
+    def create_preferences_table(self, cursor):
+        """Create the announcement preferences table, moving over preferences stored in the profiles table."""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='profile_announcement_prefs'")
+        if cursor.fetchone():
+            return
+        
+        # One row per opt-in, keyed by announcement type first so fan-out reads only its subscribers
+        cursor.execute('''
+            CREATE TABLE profile_announcement_prefs (
+                announcement_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                PRIMARY KEY (announcement_id, user_id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX idx_profile_announcement_prefs_user ON profile_announcement_prefs (user_id)")
+        
+        migrated = 0
+        cursor.execute("SELECT user_id, announcement_preferences FROM profiles WHERE announcement_preferences IS NOT NULL")
+        for user_id, preferences in cursor.fetchall():
+            for announcement_id in json.loads(preferences):
+                cursor.execute(
+                    "INSERT OR IGNORE INTO profile_announcement_prefs (announcement_id, user_id) VALUES (?, ?)",
+                    (announcement_id, user_id)
+                )
+                migrated += 1
+        cursor.execute("UPDATE profiles SET announcement_preferences = NULL")
+        logger.info(f"Created announcement preferences table, moved {migrated} preferences from profiles")
+    
+    def _sync_preferences(self, user_id, preferences):
+        """Write the difference between a user's stored and new announcement preferences."""
+        wanted = set(preferences)
+        current = {announcement_id for announcement_id, users in self.preference_index.items() if user_id in users}
+        
+        for announcement_id in wanted - current:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO profile_announcement_prefs (announcement_id, user_id) VALUES (?, ?)",
+                (announcement_id, user_id)
+            )
+            self.preference_index.setdefault(announcement_id, set()).add(user_id)
+        for announcement_id in current - wanted:
+            self.conn.execute(
+                "DELETE FROM profile_announcement_prefs WHERE announcement_id = ? AND user_id = ?",
+                (announcement_id, user_id)
+            )
+            self.preference_index[announcement_id].discard(user_id)
+    
     def save_profile(self, user_id, profile_data):
         """Save a profile to the database."""
         try:
-            from sqlite3 import connect
-            conn = connect(PROFILES_PATH)
-            cursor = conn.cursor()
-            
             # Convert dictionaries to JSON strings
             preferred_languages = json.dumps(profile_data.get('preferred_languages', []))
-            announcement_preferences = json.dumps(profile_data.get('announcement_preferences', []))
             infractions = json.dumps(profile_data.get('infractions', {"warnings": 0, "mutes": 0, "kicks": 0, "bans": 0}))
             
-            # Check if the profile already exists
-            cursor.execute("SELECT 1 FROM profiles WHERE user_id = ?", (user_id,))
-            if cursor.fetchone():
-                # Update existing profile
-                cursor.execute('''
-                    UPDATE profiles SET 
-                    mini_bio = ?,
-                    standing_level = ?,
-                    behavioral_stance = ?,
-                    timezone = ?,
-                    preferred_languages = ?,
-                    announcement_preferences = ?,
-                    infractions = ?
-                    WHERE user_id = ?
-                ''', (
-                    profile_data.get('mini_bio', ''),
-                    profile_data.get('standing_level', 'Clear'),
-                    profile_data.get('behavioral_stance', 'Casual'),
-                    profile_data.get('timezone', 'UTC'),
-                    preferred_languages,
-                    announcement_preferences,
-                    infractions,
-                    user_id
-                ))
-            else:
-                # Insert new profile
-                cursor.execute('''
+            with self.conn:
+                self.conn.execute('''
                     INSERT INTO profiles (
-                        user_id, mini_bio, standing_level, behavioral_stance, 
-                        timezone, preferred_languages, announcement_preferences, infractions
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        user_id, mini_bio, standing_level, behavioral_stance,
+                        timezone, preferred_languages, infractions
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        mini_bio = excluded.mini_bio,
+                        standing_level = excluded.standing_level,
+                        behavioral_stance = excluded.behavioral_stance,
+                        timezone = excluded.timezone,
+                        preferred_languages = excluded.preferred_languages,
+                        infractions = excluded.infractions
                 ''', (
                     user_id,
                     profile_data.get('mini_bio', ''),
@@ -186,15 +237,13 @@ class ProfileManager:
                     profile_data.get('behavioral_stance', 'Casual'),
                     profile_data.get('timezone', 'UTC'),
                     preferred_languages,
-                    announcement_preferences,
                     infractions
                 ))
-            
-            conn.commit()
-            conn.close()
+                # Announcement preferences are stored in their own table; only changes are written
+                self._sync_preferences(user_id, profile_data.get('announcement_preferences', []))
             
             # Update in-memory cache
-            self.profiles[user_id] = profile_data
+            self._cache_profile(user_id, profile_data)
             
             logger.info(f"Saved profile for user {user_id}")
             return True
@@ -205,33 +254,23 @@ class ProfileManager:
     def get_profile(self, user_id):
         """Get a user's profile."""
         # Check if profile is in memory cache
-        if user_id in self.profiles:
-            return self.profiles[user_id]
+        profile = self.profiles.get(user_id)
+        if profile is not None:
+            self.cache_hits += 1
+            self.profiles.move_to_end(user_id)
+            return profile
+        self.cache_misses += 1
         
         # Try to load from database
         try:
-            from sqlite3 import connect
-            conn = connect(PROFILES_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
+            row = self.conn.execute(SELECT_PROFILE_SQL, (user_id,)).fetchone()
             
             if row:
-                profile = {
-                    'mini_bio': row[1],
-                    'standing_level': row[2],
-                    'behavioral_stance': row[3],
-                    'timezone': row[4],
-                    'preferred_languages': json.loads(row[5]) if row[5] else [],
-                    'announcement_preferences': json.loads(row[6]) if row[6] else [],
-                    'infractions': json.loads(row[7]) if row[7] else {"warnings": 0, "mutes": 0, "kicks": 0, "bans": 0}
-                }
+                preferences = [announcement_id for announcement_id, users in self.preference_index.items() if user_id in users]
+                profile = self._profile_from_row(row, preferences)
                 
                 # Cache in memory
-                self.profiles[user_id] = profile
-                
-                conn.close()
+                self._cache_profile(user_id, profile)
                 return profile
             else:
                 # Create default profile
@@ -247,8 +286,6 @@ class ProfileManager:
                 
                 # Save the default profile
                 self.save_profile(user_id, default_profile)
-                
-                conn.close()
                 return default_profile
         except Exception as e:
             logger.error(f"Error getting profile for user {user_id}: {e}", exc_info=True)
@@ -321,7 +358,19 @@ class ProfileManager:
         else:
             profile['announcement_preferences'].append(announcement_id)
             
-        return self.save_profile(user_id, profile)
+        return self.set_announcement_preferences(user_id, profile['announcement_preferences'])
+        
+    def set_announcement_preferences(self, user_id, preferences):
+        """Set a user's announcement preferences, writing only the ones that changed."""
+        profile = self.get_profile(user_id)
+        try:
+            with self.conn:
+                self._sync_preferences(user_id, preferences)
+            profile['announcement_preferences'] = list(preferences)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving announcement preferences for user {user_id}: {e}", exc_info=True)
+            return False
         
     def get_current_time_in_timezone(self, timezone):
         """Get the current time in a specified timezone."""
@@ -335,18 +384,11 @@ class ProfileManager:
             
     def should_send_announcement(self, user_id, announcement_type):
         """Check if a user should receive a specific announcement."""
-        profile = self.get_profile(user_id)
-        return announcement_type in profile.get('announcement_preferences', [])
+        return user_id in self.preference_index.get(announcement_type, ())
         
     def get_users_with_preference(self, announcement_type):
         """Get all users who have opted in to a specific announcement type."""
-        users = []
-        
-        for user_id, profile in self.profiles.items():
-            if announcement_type in profile.get('announcement_preferences', []):
-                users.append(user_id)
-                
-        return users
+        return list(self.preference_index.get(announcement_type, ()))
         
     def get_language_emoji(self, language_code):
         """Get the emoji for a language code."""
@@ -1341,9 +1383,7 @@ class AnnouncementPreferencesView(discord.ui.View):
             return
             
         # Update the profile with current preferences
-        profile = self.profile_manager.get_profile(self.user_id)
-        profile['announcement_preferences'] = self.current_preferences
-        success = self.profile_manager.save_profile(self.user_id, profile)
+        success = self.profile_manager.set_announcement_preferences(self.user_id, self.current_preferences)
         
         if success:
             # Create display of selected preferences
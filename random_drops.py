@@ -2,23 +2,26 @@ import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 import random
-import asyncio
 import json
 import os
 import time
 from logger import setup_logger
-from database import Database
+from database import get_database
+from drop_engine import get_drop_engine
 
 logger = setup_logger('random_drops')
 
+MAX_RAIN_DURATION = 24 * 60 * 60  # Longest a rain drop can stay open, in seconds
+
 class RandomDropsCog(commands.Cog):
     """Cog for random XP and coin drops."""
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.settings = self.load_settings()
-        self.active_drops = {}
+        self.engine = get_drop_engine(bot)
+        self.engine.register('random', self.on_drop_claimed, self.on_drop_expired, self.on_rain_settled)
         self.drop_task.start()
         
     def cog_unload(self):
@@ -156,8 +159,11 @@ class RandomDropsCog(commands.Cog):
         coins = random.randint(min_coins, max_coins)
         xp = random.randint(min_xp, max_xp)
         
-        # Create the drop message
-        drop_id = f"drop_{int(time.time())}"
+        drop = self.engine.create_drop(
+            'random', channel.id, coins=coins, xp=xp,
+            duration=self.settings.get('drop_duration', 120), guild_id=channel.guild.id
+        )
+        drop_id = drop['drop_id']
         
         embed = discord.Embed(
             title="🎁 Random Drop!",
@@ -167,48 +173,101 @@ class RandomDropsCog(commands.Cog):
         
         embed.set_footer(text=f"First to click gets the reward! • ID: {drop_id}")
         
-        # Create view with button
-        view = DropClaimView(self, drop_id, coins, xp)
+        view = self.engine.claim_view(label="Claim Reward!", emoji="🎁")
         
-        # Send the drop message
+        # Send the drop message; it expires through the scheduler, see on_drop_expired
         try:
             drop_message = await channel.send(embed=embed, view=view)
-            
-            # Store drop info
-            self.active_drops[drop_id] = {
-                'message_id': drop_message.id,
-                'channel_id': channel.id,
-                'coins': coins,
-                'xp': xp,
-                'claimed_by': None,
-                'created_at': int(time.time()),
-                'expires_at': int(time.time()) + self.settings.get('drop_duration', 120)
-            }
+            self.engine.attach_message(drop, drop_message.id)
             
             logger.info(f"Created random drop in {channel.name} (ID: {channel.id}): {coins} coins, {xp} XP (ID: {drop_id})")
-            
-            # Set expiration for this drop
-            await asyncio.sleep(self.settings.get('drop_duration', 120))
-            
-            # If drop still exists and is unclaimed, remove it
-            if drop_id in self.active_drops and self.active_drops[drop_id]['claimed_by'] is None:
-                self.active_drops.pop(drop_id, None)
-                
-                # Update the message if it still exists
-                try:
-                    message = await channel.fetch_message(drop_message.id)
-                    if message:
-                        embed = message.embeds[0]
-                        embed.description = "This drop has expired! Better luck next time."
-                        embed.color = discord.Color.darker_grey()
-                        
-                        await message.edit(embed=embed, view=None)
-                        logger.info(f"Drop {drop_id} expired (unclaimed)")
-                except:
-                    logger.warning(f"Could not update expired drop message for {drop_id}")
-                    
         except Exception as e:
             logger.error(f"Error creating random drop: {e}")
+
+    async def on_drop_expired(self, drop):
+        """Mark an unclaimed drop's message as expired."""
+        message = await self.engine.fetch_drop_message(drop)
+        if message is None or not message.embeds:
+            logger.warning(f"Could not update expired drop message for {drop['drop_id']}")
+            return
+
+        embed = message.embeds[0]
+        embed.description = "This drop has expired! Better luck next time."
+        embed.color = discord.Color.darker_grey()
+        
+        await message.edit(embed=embed, view=None)
+        logger.info(f"Drop {drop['drop_id']} expired (unclaimed)")
+
+    async def on_drop_claimed(self, interaction, drop, result):
+        """Show who claimed a drop and send them their new balance."""
+        coins = result['coins']
+        xp = result['xp']
+        level_up = result['level_after'] > result['level_before']
+        new_level = result['level_after']
+        final_user = self.db.get_user(interaction.user.id)
+        
+        # Update the message
+        embed = interaction.message.embeds[0]
+        
+        embed.title = "🎁 Drop Claimed!"
+        embed.description = f"{interaction.user.mention} claimed this drop and received:\n\n<:activitycoin:1350889157676761088> **{coins}** coins\n⭐ **{xp}** XP"
+        embed.color = discord.Color.green()
+        
+        if level_up:
+            embed.description += f"\n\n**LEVEL UP!** 🎉 {interaction.user.mention} reached level **{new_level}**!"
+            
+        await interaction.response.edit_message(embed=embed, view=None)
+            
+        # Create claim confirmation embed
+        claim_embed = discord.Embed(
+            title="🎁 Reward Claimed!",
+            description=f"You successfully claimed the random drop and received:\n\n<:activitycoin:1350889157676761088> **{coins}** coins\n⭐ **{xp}** XP",
+            color=discord.Color.green()
+        )
+        
+        if level_up:
+            claim_embed.description += f"\n\n**LEVEL UP!** 🎉 You reached level **{new_level}**!"
+            
+        if final_user:
+            claim_embed.add_field(
+                name="Your New Balance",
+                value=f"<:activitycoin:1350889157676761088> **{int(final_user['coins']):,}** coins\n⭐ **{final_user['xp']}** / **{self.db.calculate_required_xp(final_user['level'])}** XP",
+                inline=False
+            )
+        
+        await interaction.followup.send(embed=claim_embed, ephemeral=True)
+    
+    async def on_rain_settled(self, drop, result):
+        """Show how a rain drop was shared once everyone who joined was paid."""
+        message = await self.engine.fetch_drop_message(drop)
+        if message is None or not message.embeds:
+            logger.warning(f"Could not update settled rain drop message for {drop['drop_id']}")
+            return
+
+        embed = message.embeds[0]
+        embed.title = "🌧️ Rain Drop Ended!"
+        embed.description = (
+            f"**{result['claims']}** users shared this drop and each received:\n\n"
+            f"<:activitycoin:1350889157676761088> **{result['coins']}** coins\n⭐ **{result['xp']}** XP"
+        )
+        # What didn't divide evenly went one each to the first users to join
+        extras = []
+        if result['coins_extra']:
+            extras.append(f"1 extra coin for the first **{result['coins_extra']}**")
+        if result['xp_extra']:
+            extras.append(f"1 extra XP for the first **{result['xp_extra']}**")
+        if extras:
+            embed.description += f"\n\nLeft over after sharing evenly: {' and '.join(extras)} to join"
+        embed.color = discord.Color.green()
+
+        if result['level_ups']:
+            # Mentions are capped so a large rain can't exceed the embed length limit
+            mentions = ", ".join(f"<@{user_id}> (level **{level}**)" for user_id, level in result['level_ups'][:20])
+            if len(result['level_ups']) > 20:
+                mentions += f" and {len(result['level_ups']) - 20} more"
+            embed.description += f"\n\n**LEVEL UP!** 🎉 {mentions}"
+
+        await message.edit(embed=embed, view=None)
     
     @app_commands.command(name="drops_config", description="Configure random XP and coin drops (Admin only)")
     @app_commands.default_permissions(administrator=True)
@@ -335,99 +394,63 @@ class RandomDropsCog(commands.Cog):
         if original_channels is not None:
             self.settings['drop_channels'] = original_channels
 
-class DropClaimView(discord.ui.View):
-    """View with button to claim a random drop."""
-    
-    def __init__(self, cog, drop_id, coins, xp):
-        super().__init__(timeout=cog.settings.get('drop_duration', 120))
-        self.cog = cog
-        self.drop_id = drop_id
-        self.coins = coins
-        self.xp = xp
-        
-    @discord.ui.button(label="Claim Reward!", style=discord.ButtonStyle.success, emoji="🎁", custom_id="claim_drop")
-    async def claim_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """Handle claim button press."""
-        
-        # Check if drop exists and is not already claimed
-        if self.drop_id not in self.cog.active_drops:
-            await interaction.response.send_message("This drop no longer exists!", ephemeral=True)
+    @app_commands.command(name="rain_drop", description="Start a drop shared by everyone who joins it (Admin only)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        coins="Coins shared between everyone who joins",
+        xp="XP shared between everyone who joins",
+        duration="Seconds users can join for",
+        winners="Only the first this many users share the reward (0 for everyone)"
+    )
+    async def rain_drop(self, interaction: discord.Interaction,
+                        coins: int = 1000,
+                        xp: int = 0,
+                        duration: int = 60,
+                        winners: int = 0,
+                        channel: discord.TextChannel = None):
+        """Start a rain drop, whose reward is shared by the users who join it."""
+        if coins < 0 or xp < 0 or coins + xp == 0:
+            await interaction.response.send_message("A rain drop needs some coins or XP, and neither can be negative.", ephemeral=True)
             return
-            
-        drop_info = self.cog.active_drops[self.drop_id]
-        
-        if drop_info['claimed_by'] is not None:
-            await interaction.response.send_message("This drop has already been claimed!", ephemeral=True)
+        if not 1 <= duration <= MAX_RAIN_DURATION:
+            await interaction.response.send_message(f"Duration must be between 1 and {MAX_RAIN_DURATION} seconds.", ephemeral=True)
             return
-            
-        # Mark as claimed
-        drop_info['claimed_by'] = interaction.user.id
-        
-        # Add coins and XP to the user
-        user_id = str(interaction.user.id)
-        username = str(interaction.user)
-        
+        if winners < 0:
+            await interaction.response.send_message("Winners can't be negative; use 0 to let everyone join.", ephemeral=True)
+            return
+
+        channel = channel or interaction.channel
+        drop = self.engine.create_rain(
+            'random', channel.id, coins=coins, xp=xp, duration=duration,
+            max_claims=winners or None, guild_id=channel.guild.id
+        )
+
+        # Joins are capped so every share is at least 1 coin or XP
+        if winners:
+            who = f"The first **{drop['max_claims']}** users to join in the next **{duration}** seconds share"
+        else:
+            who = f"Everyone who joins in the next **{duration}** seconds (up to **{drop['max_claims']}** users) shares"
+        embed = discord.Embed(
+            title="🌧️ Rain Drop!",
+            description=(
+                f"{who}:\n\n"
+                f"<:activitycoin:1350889157676761088> **{coins}** coins\n⭐ **{xp}** XP"
+            ),
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Click to join! • ID: {drop['drop_id']}")
+
         try:
-            # Add coins
-            user = self.cog.db.add_coins(user_id, username, self.coins)
-            if user is None:
-                logger.error(f"Failed to add coins to user {username} ({user_id})")
-                await interaction.response.send_message("Error claiming reward. Please try again later.", ephemeral=True)
-                return
-                
-            # Add XP (using a simplified version since we don't need coin calculation from level ups)
-            xp_result = self.cog.db.add_xp(user_id, username, self.xp)
-            if xp_result[0] is None:
-                logger.error(f"Failed to add XP to user {username} ({user_id})")
-            
-            # Get final user data
-            final_user = self.cog.db.get_user(user_id)
-            
-            # Check if a level up happened
-            level_up = xp_result[1]
-            new_level = final_user['level'] if final_user else None
-            
-            # Update the message
-            message = interaction.message
-            embed = message.embeds[0]
-            
-            embed.title = "🎁 Drop Claimed!"
-            embed.description = f"{interaction.user.mention} claimed this drop and received:\n\n<:activitycoin:1350889157676761088> **{self.coins}** coins\n⭐ **{self.xp}** XP"
-            embed.color = discord.Color.green()
-            
-            if level_up:
-                embed.description += f"\n\n**LEVEL UP!** 🎉 {interaction.user.mention} reached level **{new_level}**!"
-                
-            await message.edit(embed=embed, view=None)
-            
-            # Disable all buttons
-            for child in self.children:
-                child.disabled = True
-                
-            # Create claim confirmation embed
-            claim_embed = discord.Embed(
-                title="🎁 Reward Claimed!",
-                description=f"You successfully claimed the random drop and received:\n\n<:activitycoin:1350889157676761088> **{self.coins}** coins\n⭐ **{self.xp}** XP",
-                color=discord.Color.green()
-            )
-            
-            if level_up:
-                claim_embed.description += f"\n\n**LEVEL UP!** 🎉 You reached level **{new_level}**!"
-                
-            claim_embed.add_field(
-                name="Your New Balance",
-                value=f"<:activitycoin:1350889157676761088> **{int(final_user['coins']):,}** coins\n⭐ **{final_user['xp']}** / **{self.cog.db.calculate_required_xp(final_user['level'])}** XP",
-                inline=False
-            )
-            
-            await interaction.response.send_message(embed=claim_embed, ephemeral=True)
-            
-            # Log the claim
-            logger.info(f"Drop {self.drop_id} claimed by {username} ({user_id}): {self.coins} coins, {self.xp} XP")
-            
+            drop_message = await channel.send(embed=embed, view=self.engine.claim_view(label="Join", emoji="🌧️"))
+            self.engine.attach_message(drop, drop_message.id)
         except Exception as e:
-            logger.error(f"Error processing drop claim: {e}")
-            await interaction.response.send_message("An error occurred while claiming the reward. Please try again later.", ephemeral=True)
+            logger.error(f"Error creating rain drop: {e}")
+            self.db.close_drop(drop['drop_id'])
+            await interaction.response.send_message("Couldn't post the rain drop in that channel.", ephemeral=True)
+            return
+
+        logger.info(f"Created rain drop in {channel.name} (ID: {channel.id}): {coins} coins, {xp} XP (ID: {drop['drop_id']})")
+        await interaction.response.send_message(f"Rain drop started in {channel.mention}!", ephemeral=True)
 
 async def setup(bot):
     """Add the random drops cog to the bot."""
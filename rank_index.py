@@ -0,0 +1,170 @@
+import math
+import random
+import threading
+from logger import setup_logger
+
+logger = setup_logger('rank_index')
+
+MAX_LEVELS = 32
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+class _OrderStatisticSkiplist:
+    """
+    Skiplist that keeps keys sorted and tracks how many bottom-level nodes each
+    link skips over, so inserts, removals and position lookups are O(log n).
+    """
+
+    def __init__(self):
+        self.tail = _Node(None, 0)
+        self.head = _Node(None, MAX_LEVELS)
+        self.head.next = [self.tail] * MAX_LEVELS
+        self.size = 0
+
+    def _find_chain(self, key):
+        """Get the last node before key on every level and the position of each."""
+        chain = [None] * MAX_LEVELS
+        positions = [0] * MAX_LEVELS
+        node = self.head
+        position = 0
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not self.tail and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key):
+        chain, positions = self._find_chain(key)
+        levels = min(MAX_LEVELS, 1 - int(math.log(1.0 - random.random(), 2.0)))
+        new_node = _Node(key, levels)
+        new_position = positions[0] + 1
+
+        for level in range(levels):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            skipped = new_position - positions[level]
+            new_node.width[level] = prev_node.width[level] - skipped + 1
+            prev_node.width[level] = skipped
+
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._find_chain(key)
+        node = chain[0].next[0]
+        if node is self.tail or node.key != key:
+            raise KeyError(key)
+
+        for level in range(len(node.next)):
+            prev_node = chain[level]
+            prev_node.width[level] += node.width[level] - 1
+            prev_node.next[level] = node.next[level]
+
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+
+        self.size -= 1
+
+    def position(self, key):
+        """Get the 1-based position of key, or None if it isn't present."""
+        node = self.head
+        position = 0
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not self.tail and node.next[level].key <= key:
+                position += node.width[level]
+                node = node.next[level]
+        if node is not self.head and node.key == key:
+            return position
+        return None
+
+class RankIndex:
+    """
+    In-memory index of every user's leaderboard position.
+    Users are ordered by a score tuple (highest first) with the user ID breaking
+    ties, matching the leaderboard query. The index is kept in sync by the
+    database layer on every XP, level or prestige write.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.skiplist = _OrderStatisticSkiplist()
+        self.loaded = False
+
+    @staticmethod
+    def _make_key(user_id, score):
+        # Negated so that the highest scores sort first in the ascending skiplist
+        return tuple(-value for value in score) + (user_id,)
+
+    def load(self, rows):
+        """Rebuild the index from (user_id, score) pairs."""
+        with self.lock:
+            self.keys = {}
+            self.skiplist = _OrderStatisticSkiplist()
+            for user_id, score in rows:
+                key = self._make_key(user_id, score)
+                self.keys[user_id] = key
+                self.skiplist.insert(key)
+            self.loaded = True
+        logger.info(f"Rank index loaded with {len(self.keys)} users")
+
+    def update(self, user_id, score):
+        """Set a user's score, adding them to the index if needed."""
+        if not self.loaded:
+            return
+
+        key = self._make_key(user_id, score)
+        with self.lock:
+            old_key = self.keys.get(user_id)
+            if old_key == key:
+                return
+            if old_key is not None:
+                self.skiplist.remove(old_key)
+            self.skiplist.insert(key)
+            self.keys[user_id] = key
+
+    def remove(self, user_id):
+        """Remove a user from the index."""
+        with self.lock:
+            old_key = self.keys.pop(user_id, None)
+            if old_key is not None:
+                self.skiplist.remove(old_key)
+
+    def invalidate(self):
+        """Drop the index so it's rebuilt on the next lookup, e.g. after a bulk import."""
+        with self.lock:
+            self.loaded = False
+            self.keys = {}
+            self.skiplist = _OrderStatisticSkiplist()
+
+    def get_rank(self, user_id):
+        """Get a user's 1-based leaderboard position, or None if they aren't ranked."""
+        with self.lock:
+            key = self.keys.get(user_id)
+            if key is None:
+                return None
+            return self.skiplist.position(key)
+
+    def __len__(self):
+        return len(self.keys)
+
+_rank_indexes = {}
+_rank_indexes_lock = threading.Lock()
+
+def get_rank_index(name):
+    """Get the process-wide rank index for a database, shared by all connections to it."""
+    with _rank_indexes_lock:
+        if name not in _rank_indexes:
+            _rank_indexes[name] = RankIndex()
+        return _rank_indexes[name]
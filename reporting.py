@@ -1,10 +1,9 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
 import datetime
 import logging
-import os
+from document_store import get_document_store
 
 logger = logging.getLogger(__name__)
 
@@ -14,31 +13,25 @@ class ReportingCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.report_channel_id = 1356731160704716991  # Channel ID for report logs
-        self.reports_file = 'data/reports.json'
-        self.reports = self.load_reports()
+        # One row per report, so filing a report doesn't rewrite every earlier one
+        self.reports = get_document_store().collection(
+            'reports', legacy_file='data/reports.json', legacy_transform=self._import_legacy_reports
+        )
+        self.counters = get_document_store().collection('counters')
         
-    def load_reports(self):
-        """Load reports from JSON file"""
-        if not os.path.exists('data'):
-            os.makedirs('data')
-            
-        if os.path.exists(self.reports_file):
-            try:
-                with open(self.reports_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading reports file: {e}")
-                return {'reports': []}
-        else:
-            return {'reports': []}
-        
-    def save_reports(self):
-        """Save reports to JSON file"""
-        try:
-            with open(self.reports_file, 'w') as f:
-                json.dump(self.reports, f, indent=4)
-        except Exception as e:
-            logger.error(f"Error saving reports file: {e}")
+    @staticmethod
+    def _import_legacy_reports(data):
+        """Key the reports list from the old reports.json by report ID."""
+        return {str(report['report_id']): report for report in data.get('reports', [])}
+
+    def _next_report_id(self):
+        """Take the next report ID from the counter, so IDs aren't reused after a report is deleted."""
+        last_id = self.counters.get('reports')
+        if last_id is None:
+            # Reports stored before the counter existed
+            last_id = max((int(key) for key in self.reports.all()), default=0)
+        self.counters.put('reports', last_id + 1)
+        return last_id + 1
             
     @app_commands.command(
         name="report",
@@ -55,7 +48,7 @@ class ReportingCog(commands.Cog):
         try:
             # Create the report data
             report_data = {
-                'report_id': len(self.reports['reports']) + 1,
+                'report_id': self._next_report_id(),
                 'reporter_id': str(interaction.user.id),
                 'reporter_name': interaction.user.display_name,
                 'reported_user_id': str(user.id),
@@ -68,8 +61,7 @@ class ReportingCog(commands.Cog):
             }
             
             # Add to reports list
-            self.reports['reports'].append(report_data)
-            self.save_reports()
+            self.reports.put(report_data['report_id'], report_data)
             
             # Send confirmation to the user
             await interaction.followup.send(
@@ -0,0 +1,61 @@
+from enum import Enum
+from collections import namedtuple
+
+class CoinSource(str, Enum):
+    """Where a coin change came from. Stored in the coin ledger and used to look up its RewardPolicy."""
+
+    ADMIN = 'admin'
+    LEVEL_UP = 'level_up'
+    PRESTIGE = 'prestige'
+    VOICE = 'voice'
+    STREAMING = 'streaming'
+    WORK = 'work'
+    DROP = 'drop'
+    MINI_GAME = 'mini_game'
+    GAME = 'game'
+    SHOP = 'shop'
+    REFUND = 'refund'
+    INVESTMENT_PURCHASE = 'investment_purchase'
+    INVESTMENT_MAINTENANCE = 'investment_maintenance'
+    INVESTMENT_REPAIR = 'investment_repair'
+    INVESTMENT_SALE = 'investment_sale'
+    INVESTMENT_INCOME = 'investment_income'
+    ADJUSTMENT = 'adjustment'
+    IMPORT = 'import'
+    OPENING_BALANCE = 'opening_balance'
+
+# ignores_xp_toggle: the change still applies while /xpstop has disabled XP and coin gain
+# coin_boost: the user's shop coin boost multiplies the amount
+RewardPolicy = namedtuple('RewardPolicy', ['ignores_xp_toggle', 'coin_boost'])
+
+# Rewards for activity respect /xpstop. Admin actions, purchases and their refunds
+# always apply, otherwise a purchase made while gain is disabled would be free.
+REWARD_POLICIES = {
+    CoinSource.ADMIN: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.LEVEL_UP: RewardPolicy(ignores_xp_toggle=False, coin_boost=True),
+    CoinSource.PRESTIGE: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.VOICE: RewardPolicy(ignores_xp_toggle=False, coin_boost=True),
+    CoinSource.STREAMING: RewardPolicy(ignores_xp_toggle=False, coin_boost=True),
+    CoinSource.WORK: RewardPolicy(ignores_xp_toggle=False, coin_boost=False),
+    CoinSource.DROP: RewardPolicy(ignores_xp_toggle=False, coin_boost=False),
+    CoinSource.MINI_GAME: RewardPolicy(ignores_xp_toggle=False, coin_boost=False),
+    CoinSource.GAME: RewardPolicy(ignores_xp_toggle=False, coin_boost=False),
+    CoinSource.SHOP: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.REFUND: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.INVESTMENT_PURCHASE: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.INVESTMENT_MAINTENANCE: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.INVESTMENT_REPAIR: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.INVESTMENT_SALE: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.INVESTMENT_INCOME: RewardPolicy(ignores_xp_toggle=False, coin_boost=False),
+    CoinSource.ADJUSTMENT: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.IMPORT: RewardPolicy(ignores_xp_toggle=True, coin_boost=False),
+    CoinSource.OPENING_BALANCE: RewardPolicy(ignores_xp_toggle=True, coin_boost=False)
+}
+
+def get_reward_policy(source):
+    """Get the policy for a coin source.
+
+    Raises:
+        ValueError: If source isn't a CoinSource or one of their values
+    """
+    return REWARD_POLICIES[CoinSource(source)]
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import heapq
+import sqlite3
+import asyncio
+import itertools
+from logger import setup_logger
+
+logger = setup_logger('scheduler', 'bot.log')
+
+SCHEDULER_DB_PATH = 'data/scheduler.db'
+UNHANDLED_RETRY_DELAY = 60  # Seconds to wait before retrying a job whose handler isn't registered yet
+MAX_IDLE_SLEEP = 3600  # Longest time the scheduler sleeps without re-checking its queue
+
+class JobStats:
+    """Run counts and lag (seconds between a job's due time and when it ran) for one job kind."""
+
+    __slots__ = ('runs', 'failures', 'total_lag', 'max_lag', 'last_lag')
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+    def record(self, lag, failed):
+        self.runs += 1
+        if failed:
+            self.failures += 1
+        self.total_lag += lag
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+
+class Scheduler:
+    """
+    Persistent scheduler for delayed bot actions.
+    Jobs are stored in SQLite so they survive restarts, and kept in an in-memory
+    min-heap ordered by due time. A single task sleeps until the earliest job is
+    due instead of each cog polling on its own interval.
+
+    Cogs register a handler per job kind with register() and add jobs with
+    schedule(). Handlers are coroutines called as handler(job_id, payload).
+    """
+
+    def __init__(self, bot, db_path=SCHEDULER_DB_PATH):
+        self.bot = bot
+        self.db_path = db_path
+        self.handlers = {}
+        self.jobs = {}  # job_id -> (due_at, kind, payload)
+        self.heap = []  # (due_at, sequence, job_id); entries are skipped if the job changed since
+        self.sequence = itertools.count()
+        self.stats = {}
+        self.task = None
+        self.wakeup = asyncio.Event()
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                due_at REAL NOT NULL,
+                payload TEXT,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (due_at)')
+        self.conn.commit()
+
+        self._load_jobs()
+
+    def _load_jobs(self):
+        """Load persisted jobs into the heap."""
+        for job_id, kind, due_at, payload in self.conn.execute(
+            'SELECT job_id, kind, due_at, payload FROM scheduled_jobs'
+        ):
+            self._push(job_id, kind, due_at, json.loads(payload) if payload else None)
+        logger.info(f"Scheduler loaded {len(self.jobs)} pending jobs from {self.db_path}")
+
+    def _push(self, job_id, kind, due_at, payload):
+        self.jobs[job_id] = (due_at, kind, payload)
+        heapq.heappush(self.heap, (due_at, next(self.sequence), job_id))
+
+    def register(self, kind, handler):
+        """Register the coroutine that runs jobs of a kind."""
+        self.handlers[kind] = handler
+        self.stats.setdefault(kind, JobStats())
+        # Jobs of this kind may have been waiting for their handler
+        self.wakeup.set()
+
+    def schedule(self, kind, job_id, due_at, payload=None):
+        """Schedule a job, replacing any existing job with the same ID.
+
+        Args:
+            kind (str): Job kind, selects the registered handler
+            job_id (str): Unique ID, e.g. "giveaway_end:giveaway-1-1234"
+            due_at (float): Unix timestamp when the job should run
+            payload (dict): JSON-serializable data passed to the handler
+        """
+        self.conn.execute('''
+            INSERT OR REPLACE INTO scheduled_jobs (job_id, kind, due_at, payload, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (job_id, kind, due_at, json.dumps(payload) if payload is not None else None, time.time()))
+        self.conn.commit()
+
+        self._push(job_id, kind, due_at, payload)
+        if self.heap[0][2] == job_id:
+            self.wakeup.set()
+        logger.debug(f"Scheduled {kind} job {job_id} for {due_at:.0f}")
+
+    def cancel(self, job_id):
+        """Cancel a pending job. Returns True if the job existed."""
+        if self.jobs.pop(job_id, None) is None:
+            return False
+        self.conn.execute('DELETE FROM scheduled_jobs WHERE job_id = ?', (job_id,))
+        self.conn.commit()
+        logger.debug(f"Cancelled job {job_id}")
+        return True
+
+    def get_job(self, job_id):
+        """Get a pending job as a dict, or None."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        due_at, kind, payload = job
+        return {'job_id': job_id, 'kind': kind, 'due_at': due_at, 'payload': payload}
+
+    def get_jobs(self, kind):
+        """Get all pending jobs of a kind, earliest first."""
+        jobs = [self.get_job(job_id) for job_id, job in self.jobs.items() if job[1] == kind]
+        return sorted(jobs, key=lambda job: job['due_at'])
+
+    def start(self):
+        """Start the scheduler loop if it isn't running."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+            logger.info("Scheduler started")
+
+    def stop(self):
+        """Stop the scheduler loop. Pending jobs stay persisted."""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def _pop_due(self, now):
+        """Pop the next due job that is still current, or return the delay until one is due."""
+        while self.heap:
+            due_at, _, job_id = self.heap[0]
+            job = self.jobs.get(job_id)
+            if job is None or job[0] != due_at:
+                heapq.heappop(self.heap)  # Cancelled or rescheduled since this entry was pushed
+                continue
+            if due_at > now:
+                return None, due_at - now
+
+            heapq.heappop(self.heap)
+            return job_id, 0
+        return None, MAX_IDLE_SLEEP
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            job_id, delay = self._pop_due(time.time())
+
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=min(delay, MAX_IDLE_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due_at, kind, payload = self.jobs[job_id]
+            handler = self.handlers.get(kind)
+            if handler is None:
+                logger.warning(f"No handler registered for {kind} job {job_id}, retrying in {UNHANDLED_RETRY_DELAY}s")
+                retry_at = time.time() + UNHANDLED_RETRY_DELAY
+                # Persisted too, so the row still matches the due_at deleted when the job finally runs
+                self.conn.execute('UPDATE scheduled_jobs SET due_at = ? WHERE job_id = ?', (retry_at, job_id))
+                self.conn.commit()
+                self._push(job_id, kind, retry_at, payload)
+                continue
+
+            # Removed before running so a handler can schedule a follow-up job with the same ID
+            del self.jobs[job_id]
+            self.conn.execute('DELETE FROM scheduled_jobs WHERE job_id = ? AND due_at = ?', (job_id, due_at))
+            self.conn.commit()
+
+            asyncio.create_task(self._run_job(kind, handler, job_id, due_at, payload))
+
+    async def _run_job(self, kind, handler, job_id, due_at, payload):
+        lag = max(0.0, time.time() - due_at)
+        failed = False
+        try:
+            await handler(job_id, payload)
+        except Exception as e:
+            failed = True
+            logger.error(f"Error running {kind} job {job_id}: {e}", exc_info=True)
+        finally:
+            self.stats.setdefault(kind, JobStats()).record(lag, failed)
+            if lag > 5:
+                logger.warning(f"{kind} job {job_id} ran {lag:.1f}s late")
+
+    def get_stats(self):
+        """Get per-kind run counts and lag in seconds.
+
+        Returns:
+            list: Dicts with kind, pending, runs, failures, avg_lag, max_lag and last_lag
+        """
+        pending = {}
+        for _, kind, _ in self.jobs.values():
+            pending[kind] = pending.get(kind, 0) + 1
+
+        rows = []
+        for kind in sorted(set(self.stats) | set(pending)):
+            stats = self.stats.get(kind, JobStats())
+            rows.append({
+                'kind': kind,
+                'pending': pending.get(kind, 0),
+                'runs': stats.runs,
+                'failures': stats.failures,
+                'avg_lag': stats.total_lag / stats.runs if stats.runs else 0.0,
+                'max_lag': stats.max_lag,
+                'last_lag': stats.last_lag
+            })
+        return rows
+
+def get_scheduler(bot):
+    """Get the bot's scheduler, creating it on first use. It starts once the bot is ready."""
+    scheduler = getattr(bot, 'scheduler', None)
+    if scheduler is None:
+        scheduler = Scheduler(bot)
+        bot.scheduler = scheduler
+
+        async def start_scheduler():
+            scheduler.start()
+
+        bot.add_listener(start_scheduler, 'on_ready')
+    return scheduler
@@ -1,18 +1,37 @@
 import os
+import copy
 import json
-import logging
+import atexit
+import asyncio
+import tempfile
+import threading
 from logger import setup_logger
 
 logger = setup_logger('settings_storage')
 
+SETTINGS_FILE = 'settings.json'
+SAVE_DELAY = 1.0  # Seconds to wait for further changes before writing settings.json
+
 class SettingsStorage:
     """
-    Class for managing persistent storage of bot settings.
-    This ensures all settings are saved even when the bot restarts.
+    Process-wide store for settings.json.
+    The file is parsed once and every cog reads its settings from the cached copy.
+    Changes are coalesced into a single write shortly after the last change, and
+    written to a temporary file that replaces settings.json atomically, so a crash
+    mid-write can't leave a truncated file and cogs can't overwrite each other's
+    changes with a stale copy.
+
+    Cogs that keep settings in attributes can subscribe() to the keys they use and
+    are notified whenever those keys change, including when the file is reloaded.
     """
-    
-    def __init__(self):
-        self.settings_file = 'settings.json'
+
+    def __init__(self, settings_file=SETTINGS_FILE):
+        self.settings_file = settings_file
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()  # Keeps writes in the order their snapshots were taken
+        self.subscribers = {}  # key -> list of callback(key, value)
+        self.save_handle = None
+        self.dirty = False
 
         self.settings = {
             "coin_drop_settings": {},
@@ -20,70 +39,204 @@ class SettingsStorage:
         }
 
         self.load_settings()
+        atexit.register(self.flush)
         logger.info("Settings storage initialized")
-    
+
+    def _read_file(self):
+        with open(self.settings_file, 'r') as f:
+            return json.load(f)
+
     def load_settings(self):
         """Load settings from file."""
         try:
             if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r') as f:
-                    loaded_settings = json.load(f)
-
+                loaded_settings = self._read_file()
+                with self.lock:
                     self.settings.update(loaded_settings)
                 logger.info("Settings loaded from file")
             else:
                 logger.info("No settings file found, using defaults")
-                self.save_settings()  # Create the file with defaults
+                self.flush(force=True)  # Create the file with defaults
         except Exception as e:
             logger.error(f"Error loading settings: {e}")
-    
-    def save_settings(self):
-        """Save settings to file."""
+
+    def reload(self):
+        """Re-read settings.json after it was edited outside the bot and notify subscribers of changed keys."""
         try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(self.settings, f, indent=4)
-            logger.info("Settings saved to file")
+            loaded_settings = self._read_file()
         except Exception as e:
-            logger.error(f"Error saving settings: {e}")
-    
+            logger.error(f"Error reloading settings: {e}")
+            return
+
+        with self.lock:
+            changed = [key for key in set(self.settings) | set(loaded_settings)
+                       if self.settings.get(key) != loaded_settings.get(key)]
+            for key in changed:
+                if key in loaded_settings:
+                    self.settings[key] = loaded_settings[key]
+                else:
+                    self.settings.pop(key, None)
+
+        logger.info(f"Settings reloaded from file, {len(changed)} keys changed")
+        for key in changed:
+            self._notify(key)
+
+    def save_settings(self):
+        """Queue the settings to be written to file.
+
+        Inside the bot's event loop, writes are delayed by SAVE_DELAY so a burst of
+        changes is written once, and the file is written in a worker thread so the
+        loop doesn't wait on the disk. Outside an event loop the file is written immediately.
+        """
+        with self.lock:
+            self.dirty = True
+            if self.save_handle is not None:
+                return
+
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+
+            if loop is not None:
+                self.save_handle = loop.call_later(SAVE_DELAY, self._flush_in_background)
+                return
+
+        self.flush()
+
+    def _flush_in_background(self):
+        with self.lock:
+            self.save_handle = None
+        asyncio.get_running_loop().run_in_executor(None, self._write)
+
+    def flush(self, force=False):
+        """Write pending changes to file now, replacing it atomically."""
+        with self.lock:
+            if self.save_handle is not None:
+                self.save_handle.cancel()
+                self.save_handle = None
+        self._write(force)
+
+    def _write(self, force=False):
+        with self.write_lock:
+            with self.lock:
+                if not self.dirty and not force:
+                    return
+                data = json.dumps(self.settings, indent=4)
+                self.dirty = False
+
+            try:
+                directory = os.path.dirname(os.path.abspath(self.settings_file))
+                fd, temp_path = tempfile.mkstemp(prefix='.settings-', suffix='.tmp', dir=directory)
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(temp_path, self.settings_file)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+                logger.info("Settings saved to file")
+            except Exception as e:
+                with self.lock:
+                    self.dirty = True  # Written again with the next change or at exit
+                logger.error(f"Error saving settings: {e}")
+
+    def get(self, key, default=None):
+        """Get a setting. Dicts and lists are copies, so change them with set() or update()."""
+        with self.lock:
+            return copy.deepcopy(self.settings.get(key, default))
+
+    def get_many(self, defaults):
+        """Get several settings at once.
+
+        Args:
+            defaults (dict): Setting keys mapped to the value to use if a key isn't set
+
+        Returns:
+            dict: Setting keys mapped to their values
+        """
+        with self.lock:
+            return {key: copy.deepcopy(self.settings.get(key, default)) for key, default in defaults.items()}
+
+    def set(self, key, value):
+        """Change a setting, save it and notify subscribers."""
+        self.update({key: value})
+
+    def update(self, values):
+        """Change several settings at once, save them and notify subscribers of the keys that changed.
+
+        Args:
+            values (dict): Setting keys mapped to their new values
+        """
+        with self.lock:
+            changed = [key for key, value in values.items() if self.settings.get(key) != value or key not in self.settings]
+            for key in changed:
+                self.settings[key] = copy.deepcopy(values[key])
+
+        if not changed:
+            return
+        self.save_settings()
+        for key in changed:
+            self._notify(key)
+
+    def update_section(self, section, values):
+        """Merge values into a dict setting, e.g. update_section('games', {'enabled': False})."""
+        with self.lock:
+            merged = dict(self.settings.get(section) or {})
+        merged.update(values)
+        self.update({section: merged})
+
+    def subscribe(self, key, callback):
+        """Call callback(key, value) whenever a setting changes."""
+        self.subscribers.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, key, callback):
+        """Stop notifying a callback about a setting."""
+        callbacks = self.subscribers.get(key, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def _notify(self, key):
+        callbacks = self.subscribers.get(key)
+        if not callbacks:
+            return
+        value = self.get(key)
+        for callback in list(callbacks):
+            try:
+                callback(key, value)
+            except Exception as e:
+                logger.error(f"Error in settings subscriber for '{key}': {e}")
+
     def get_coin_drop_settings(self):
         """Get coin drop settings."""
-        return self.settings.get("coin_drop_settings", {})
-    
+        return self.get("coin_drop_settings", {})
+
     def save_coin_drop_settings(self, guild_id, settings_dict):
         """
         Save coin drop settings for a guild.
-        
+
         Args:
             guild_id (str): The ID of the guild
             settings_dict (dict): Dictionary with coin drop settings
         """
         guild_id = str(guild_id)  # Convert to string for JSON compatibility
-        
-        if "coin_drop_settings" not in self.settings:
-            self.settings["coin_drop_settings"] = {}
-        
-        self.settings["coin_drop_settings"][guild_id] = settings_dict
-        self.save_settings()
-    
+        self.update_section("coin_drop_settings", {guild_id: settings_dict})
+
     def get_xp_drop_settings(self):
         """Get XP drop settings."""
-        return self.settings.get("xp_drop_settings", {})
-    
+        return self.get("xp_drop_settings", {})
+
     def save_xp_drop_settings(self, guild_id, settings_dict):
         """
         Save XP drop settings for a guild.
-        
+
         Args:
             guild_id (str): The ID of the guild
             settings_dict (dict): Dictionary with XP drop settings
         """
         guild_id = str(guild_id)  # Convert to string for JSON compatibility
-        
-        if "xp_drop_settings" not in self.settings:
-            self.settings["xp_drop_settings"] = {}
-        
-        self.settings["xp_drop_settings"][guild_id] = settings_dict
-        self.save_settings()
+        self.update_section("xp_drop_settings", {guild_id: settings_dict})
 
-settings_storage = SettingsStorage()
\ No newline at end of file
+settings_storage = SettingsStorage()
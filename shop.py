@@ -3,18 +3,15 @@ from discord import app_commands
 from discord.ext import commands
 import json
 import os
-import logging
-from database import Database
+from logger import setup_logger
+from database import get_database
+from rewards import CoinSource
+from document_store import get_document_store
 import datetime
 import asyncio
 
 # Set up logging
-logger = logging.getLogger('shop_system')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('shop_system')
 
 # Shop items with prices and descriptions
 SHOP_ITEMS = {
@@ -56,9 +53,10 @@ SHOP_CONFIG_PATH = "data/shop_settings.json"
 class ShopManager:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         # Set the default notification channel ID
         self.notification_channel_id = "1352717796336996422"
+        self.purchases = get_document_store().collection('user_purchases', legacy_file='data/user_purchases.json')
         self.load_config()
         
     def load_config(self):
@@ -128,10 +126,11 @@ class ShopManager:
         if user_coins < item_price:
             return False, f"You don't have enough coins. You have {user_coins:,} coins, but {item_name} costs {item_price:,} coins."
             
-        # Process purchase
-        self.db.remove_coins(user_id, item_price)
+        # Process purchase; fails if the balance was spent since it was checked
+        if not self.db.remove_coins(user_id, item_price, CoinSource.SHOP):
+            return False, f"You don't have enough coins to buy {item_name}."
         
-        # Record purchase in user_purchases.json
+        # Record purchase in the purchase history
         self.record_purchase(user_id, user_name, item_name, item_price)
         
         # Send notification to designated channel
@@ -141,30 +140,16 @@ class ShopManager:
         
     def record_purchase(self, user_id, user_name, item_name, price):
         """Record a purchase in the purchase history."""
-        purchase_data_path = "data/user_purchases.json"
-        
         try:
-            # Load existing purchase data
-            purchases = {}
-            if os.path.exists(purchase_data_path):
-                with open(purchase_data_path, 'r') as f:
-                    purchases = json.load(f)
-                    
-            # Add the new purchase
-            if user_id not in purchases:
-                purchases[user_id] = []
-                
-            purchase_time = datetime.datetime.now().isoformat()
-            purchases[user_id].append({
+            # Only this user's history is read and rewritten
+            purchases = self.purchases.get(user_id, [])
+            purchases.append({
                 "item": item_name,
                 "price": price,
-                "timestamp": purchase_time,
+                "timestamp": datetime.datetime.now().isoformat(),
                 "username": user_name
             })
-            
-            # Save updated purchase data
-            with open(purchase_data_path, 'w') as f:
-                json.dump(purchases, f, indent=4)
+            self.purchases.put(user_id, purchases)
                 
             logger.info(f"Recorded purchase: {user_name} ({user_id}) bought {item_name} for {price} coins")
         except Exception as e:
@@ -205,7 +190,7 @@ class ShopCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.shop_manager = ShopManager(bot)
         
     @app_commands.command(
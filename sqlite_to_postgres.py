@@ -5,6 +5,7 @@ import sqlite3
 import psycopg2
 from psycopg2.extras import DictCursor
 from logger import setup_logger
+from document_store import get_document_store, DOCUMENTS_DB_PATH
 
 logger = setup_logger('sqlite_to_postgres')
 
@@ -240,26 +241,45 @@ def migrate_json_files(pg_conn):
     
     for file_path, data_type in json_files:
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    try:
-                        data = json.load(f)
-                        
-                        # Store as JSON in PostgreSQL
-                        cursor.execute("""
-                            INSERT INTO json_data (data_type, content)
-                            VALUES (%s, %s)
-                            ON CONFLICT (data_type) 
-                            DO UPDATE SET content = %s, updated_at = CURRENT_TIMESTAMP
-                        """, (data_type, json.dumps(data), json.dumps(data)))
-                        
-                        logger.info(f"Successfully migrated {file_path} to PostgreSQL json_data table")
-                    except json.JSONDecodeError:
-                        logger.error(f"Invalid JSON in {file_path}, skipping")
-            else:
-                logger.warning(f"JSON file {file_path} not found, skipping")
+            data = load_json_data(file_path, data_type)
+            if data is None:
+                logger.warning(f"No data found for {data_type} in {file_path} or {DOCUMENTS_DB_PATH}, skipping")
+                continue
+            
+            # Store as JSON in PostgreSQL
+            cursor.execute("""
+                INSERT INTO json_data (data_type, content)
+                VALUES (%s, %s)
+                ON CONFLICT (data_type) 
+                DO UPDATE SET content = %s, updated_at = CURRENT_TIMESTAMP
+            """, (data_type, json.dumps(data), json.dumps(data)))
+            
+            logger.info(f"Successfully migrated {data_type} to PostgreSQL json_data table")
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in {file_path}, skipping")
         except Exception as e:
-            logger.error(f"Error migrating JSON file {file_path}: {e}", exc_info=True)
+            logger.error(f"Error migrating JSON data {data_type}: {e}", exc_info=True)
+
+def load_json_data(file_path, data_type):
+    """Load the data for a JSON data type, from its file or, once imported, from the document store.
+    
+    Returns:
+        The data in the same shape as the JSON file, or None if there is none
+    """
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    
+    if not os.path.exists(DOCUMENTS_DB_PATH):
+        return None
+    
+    store = get_document_store()
+    docs = store.collection(data_type).all()
+    if data_type == 'tickets':
+        # tickets.json held the counter alongside the tickets
+        counter = store.collection('counters').get('tickets')
+        return {'counter': counter, 'active_tickets': docs} if counter is not None else None
+    return docs or None
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Migrate data from SQLite to PostgreSQL")
@@ -1,20 +1,26 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import logging
+from logger import setup_logger
 import datetime
-import json
 import asyncio
 import os
 import random
+from transcript_archive import TranscriptArchive
+from settings_storage import settings_storage
+from document_store import get_document_store
 
 # Set up logging
-logger = logging.getLogger('ticket_system')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('ticket_system')
+
+# Ticket settings kept in settings.json, stored as attributes of the same name
+TICKET_CONFIG_KEYS = (
+    'tickets_category_id',
+    'tickets_log_channel_id',
+    'support_role_id',
+    'reports_channel_id',
+    'suggestions_channel_id'
+)
 
 class TicketSystem(commands.Cog):
     """Cog for managing support tickets."""
@@ -38,6 +44,12 @@ class TicketSystem(commands.Cog):
         
         # Load configuration
         self.load_config()
+        for key in TICKET_CONFIG_KEYS:
+            settings_storage.subscribe(key, self.on_settings_changed)
+        
+        # Open the transcript search archive and index any transcripts saved before it existed
+        self.transcript_archive = TranscriptArchive()
+        self.transcript_archive.index_existing_files()
     
     @commands.Cog.listener()
     async def on_ready(self):
@@ -50,65 +62,60 @@ class TicketSystem(commands.Cog):
             self.persistent_views_added = True
             logger.info("Added persistent views for ticket system")
     
+    def _import_legacy_tickets(self, data):
+        """Split the old tickets.json into the ticket counter and one document per ticket."""
+        self.counters.put('tickets', data.get('counter', 0))
+        return data.get('active_tickets', {})
+    
     def load_ticket_data(self):
-        """Load ticket counter and active tickets from file."""
+        """Load ticket counter and active tickets from the document store."""
         try:
-            if os.path.exists('data/tickets.json'):
-                with open('data/tickets.json', 'r') as f:
-                    data = json.load(f)
-                    self.ticket_counter = data.get('counter', 0)
-                    self.active_tickets = data.get('active_tickets', {})
-                logger.info(f"Loaded ticket data. Counter: {self.ticket_counter}, Active tickets: {len(self.active_tickets)}")
-            else:
-                self.save_ticket_data()
+            store = get_document_store()
+            self.counters = store.collection('counters')
+            self.tickets = store.collection('tickets', legacy_file='data/tickets.json',
+                                            legacy_transform=self._import_legacy_tickets)
+            self.ticket_counter = self.counters.get('tickets', 0)
+            self.active_tickets = self.tickets.all()
+            logger.info(f"Loaded ticket data. Counter: {self.ticket_counter}, Active tickets: {len(self.active_tickets)}")
         except Exception as e:
             logger.error(f"Error loading ticket data: {e}")
-            self.save_ticket_data()
     
-    def save_ticket_data(self):
-        """Save ticket counter and active tickets to file."""
+    def save_ticket(self, ticket_id):
+        """Save the ticket counter and one ticket to the document store."""
         try:
-            data = {
-                'counter': self.ticket_counter,
-                'active_tickets': self.active_tickets
-            }
-            with open('data/tickets.json', 'w') as f:
-                json.dump(data, f, indent=4)
-            logger.info(f"Saved ticket data. Counter: {self.ticket_counter}, Active tickets: {len(self.active_tickets)}")
+            self.counters.put('tickets', self.ticket_counter)
+            self.tickets.put(ticket_id, self.active_tickets[ticket_id])
+            logger.info(f"Saved ticket {ticket_id}. Counter: {self.ticket_counter}, Active tickets: {len(self.active_tickets)}")
         except Exception as e:
-            logger.error(f"Error saving ticket data: {e}")
+            logger.error(f"Error saving ticket {ticket_id}: {e}")
     
-    def load_config(self):
-        """Load ticket system configuration from settings.json."""
+    def remove_ticket(self, ticket_id):
+        """Remove a ticket from the active tickets and the document store."""
+        self.active_tickets.pop(ticket_id, None)
         try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-                self.tickets_category_id = settings.get('tickets_category_id')
-                self.tickets_log_channel_id = settings.get('tickets_log_channel_id')
-                self.support_role_id = settings.get('support_role_id')
-                self.reports_channel_id = settings.get('reports_channel_id')
-                self.suggestions_channel_id = settings.get('suggestions_channel_id')
-            logger.info(f"Loaded ticket configuration. Category ID: {self.tickets_category_id}, Log Channel ID: {self.tickets_log_channel_id}, Support Role ID: {self.support_role_id}, Reports Channel ID: {self.reports_channel_id}, Suggestions Channel ID: {self.suggestions_channel_id}")
+            self.tickets.delete(ticket_id)
         except Exception as e:
-            logger.error(f"Error loading ticket configuration: {e}")
+            logger.error(f"Error removing ticket {ticket_id}: {e}")
+    
+    def load_config(self):
+        """Load ticket system configuration from the shared settings store."""
+        for key, value in settings_storage.get_many(dict.fromkeys(TICKET_CONFIG_KEYS)).items():
+            setattr(self, key, value)
+        logger.info(f"Loaded ticket configuration. Category ID: {self.tickets_category_id}, Log Channel ID: {self.tickets_log_channel_id}, Support Role ID: {self.support_role_id}, Reports Channel ID: {self.reports_channel_id}, Suggestions Channel ID: {self.suggestions_channel_id}")
     
     def save_config(self):
-        """Save ticket system configuration to settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-            
-            settings['tickets_category_id'] = self.tickets_category_id
-            settings['tickets_log_channel_id'] = self.tickets_log_channel_id
-            settings['support_role_id'] = self.support_role_id
-            settings['reports_channel_id'] = self.reports_channel_id
-            settings['suggestions_channel_id'] = self.suggestions_channel_id
-            
-            with open('settings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
-            logger.info(f"Saved ticket configuration. Category ID: {self.tickets_category_id}, Log Channel ID: {self.tickets_log_channel_id}, Support Role ID: {self.support_role_id}, Reports Channel ID: {self.reports_channel_id}, Suggestions Channel ID: {self.suggestions_channel_id}")
-        except Exception as e:
-            logger.error(f"Error saving ticket configuration: {e}")
+        """Save ticket system configuration to the shared settings store."""
+        settings_storage.update({key: getattr(self, key) for key in TICKET_CONFIG_KEYS})
+        logger.info(f"Saved ticket configuration. Category ID: {self.tickets_category_id}, Log Channel ID: {self.tickets_log_channel_id}, Support Role ID: {self.support_role_id}, Reports Channel ID: {self.reports_channel_id}, Suggestions Channel ID: {self.suggestions_channel_id}")
+    
+    def on_settings_changed(self, key, value):
+        """Pick up ticket configuration changes from settings.json."""
+        setattr(self, key, value)
+    
+    def cog_unload(self):
+        """Stop listening for settings changes when the cog is unloaded."""
+        for key in TICKET_CONFIG_KEYS:
+            settings_storage.unsubscribe(key, self.on_settings_changed)
     
     @app_commands.command(
         name="ticket",
@@ -186,7 +193,7 @@ class TicketSystem(commands.Cog):
                 'created_at': datetime.datetime.now().isoformat(),
                 'status': 'open'
             }
-            self.save_ticket_data()
+            self.save_ticket(ticket_id)
             
             # Create welcome message in the ticket channel
             embed = discord.Embed(
@@ -425,6 +432,18 @@ class TicketSystem(commands.Cog):
             with open(transcript_filename, 'w', encoding='utf-8') as f:
                 f.write(transcript_content)
             
+            # Add the transcript to the searchable archive
+            ticket_user = interaction.guild.get_member(int(self.active_tickets[ticket_id].get('user_id')))
+            self.transcript_archive.add_transcript(
+                ticket_id,
+                self.active_tickets[ticket_id].get('subject'),
+                str(ticket_user) if ticket_user else self.active_tickets[ticket_id].get('user_id'),
+                f"{interaction.user.display_name} ({interaction.user.id})",
+                reason,
+                transcript_content,
+                created_at=self.active_tickets[ticket_id].get('created_at')
+            )
+            
             # Send a closing message
             embed = discord.Embed(
                 title=f"Ticket Closed: {ticket_id}",
@@ -484,8 +503,7 @@ class TicketSystem(commands.Cog):
                 logger.error(f"Failed to DM user about ticket closure: {e}")
             
             # Remove ticket from active tickets
-            del self.active_tickets[ticket_id]
-            self.save_ticket_data()
+            self.remove_ticket(ticket_id)
             
             # Wait 10 seconds before deleting the channel
             await asyncio.sleep(10)
@@ -498,6 +516,62 @@ class TicketSystem(commands.Cog):
                 ephemeral=True
             )
     
+    @app_commands.command(
+        name="ticket_search",
+        description="Search closed ticket transcripts (Admin or Support only)"
+    )
+    async def search_tickets(self, interaction: discord.Interaction, query: str):
+        """Search the transcripts of closed tickets.
+        
+        Args:
+            interaction: The interaction that triggered this command
+            query: Words to search for in the transcripts
+        """
+        is_admin = await self.bot.has_admin_permissions(interaction.user.id, interaction.guild.id)
+        is_support = False
+        if self.support_role_id:
+            support_role = interaction.guild.get_role(int(self.support_role_id))
+            if support_role and support_role in interaction.user.roles:
+                is_support = True
+        
+        if not (is_admin or is_support):
+            await interaction.response.send_message(
+                "You don't have permission to search ticket transcripts.",
+                ephemeral=True
+            )
+            return
+        
+        try:
+            results = self.transcript_archive.search(query, limit=10)
+            
+            embed = discord.Embed(
+                title="Ticket Transcript Search",
+                description=f"Results for `{query}`" if results else f"No transcripts found matching `{query}`.",
+                color=discord.Color.blue(),
+                timestamp=datetime.datetime.now()
+            )
+            
+            for result in results:
+                snippet = result['snippet'].replace('\n', ' ')
+                if len(snippet) > 300:
+                    snippet = snippet[:297] + "..."
+                embed.add_field(
+                    name=f"{result['ticket_id']} - {result['subject'] or 'No subject'}"[:256],
+                    value=f"User: {result['user_name']} | Closed: {result['closed_at'][:10]}\n{snippet}"[:1024],
+                    inline=False
+                )
+            
+            embed.set_footer(text=f"{self.transcript_archive.count()} archived transcripts")
+            
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            
+        except Exception as e:
+            logger.error(f"Error searching ticket transcripts: {e}")
+            await interaction.response.send_message(
+                "An error occurred while searching ticket transcripts. Please try again later.",
+                ephemeral=True
+            )
+    
     # add_to_ticket command removed
     
     # remove_from_ticket command removed
@@ -574,6 +648,7 @@ class TicketSystem(commands.Cog):
                 name="__Ticket Management Commands__",
                 value=(
                     "• **/ticket_setup** - Configure the ticket system\n"
+                    "• **/ticket_search** - Search closed ticket transcripts\n"
                 ),
                 inline=False
             )
@@ -598,8 +673,7 @@ class TicketSystem(commands.Cog):
         
         if ticket_id:
             # Remove the ticket from active tickets
-            del self.active_tickets[ticket_id]
-            self.save_ticket_data()
+            self.remove_ticket(ticket_id)
             logger.info(f"Ticket {ticket_id} removed due to channel deletion.")
 
 
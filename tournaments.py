@@ -1,24 +1,18 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
-import os
-import logging
+from logger import setup_logger
 import datetime
 import random
 import math
 import asyncio
-from database import Database
+from database import get_database
+from document_store import get_document_store
 
 # Set up logging
-logger = logging.getLogger('tournaments')
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.FileHandler(filename='logs/bot.log', encoding='utf-8', mode='a')
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
+logger = setup_logger('tournaments')
 
-# Path to tournament data
+# Legacy tournament data files, imported into the document store on first start
 TOURNAMENTS_PATH = "data/tournaments.json"
 GAME_VOTES_PATH = "data/tournament_votes.json"
 
@@ -39,53 +33,39 @@ class TournamentManager:
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.active_tournaments = {}
         self.game_votes = {}
         self.load_data()
         
     def load_data(self):
-        """Load tournament data from JSON file."""
+        """Load tournament data from the document store."""
         try:
-            if os.path.exists(TOURNAMENTS_PATH):
-                with open(TOURNAMENTS_PATH, 'r') as f:
-                    self.active_tournaments = json.load(f)
-                logger.info(f"Loaded {len(self.active_tournaments)} active tournaments")
-            else:
-                # Create the directory if it doesn't exist
-                os.makedirs(os.path.dirname(TOURNAMENTS_PATH), exist_ok=True)
-                self.save_tournaments()
-                logger.info("Created new tournaments data file")
-                
-            if os.path.exists(GAME_VOTES_PATH):
-                with open(GAME_VOTES_PATH, 'r') as f:
-                    self.game_votes = json.load(f)
-                logger.info(f"Loaded {len(self.game_votes)} game votes")
-            else:
-                # Create the directory if it doesn't exist
-                os.makedirs(os.path.dirname(GAME_VOTES_PATH), exist_ok=True)
-                self.save_game_votes()
-                logger.info("Created new game votes data file")
+            store = get_document_store()
+            self.tournaments = store.collection('tournaments', legacy_file=TOURNAMENTS_PATH)
+            self.votes = store.collection('tournament_votes', legacy_file=GAME_VOTES_PATH)
+            
+            self.active_tournaments = self.tournaments.all()
+            logger.info(f"Loaded {len(self.active_tournaments)} active tournaments")
+            
+            self.game_votes = self.votes.all()
+            logger.info(f"Loaded {len(self.game_votes)} game votes")
         except Exception as e:
             logger.error(f"Error loading tournament data: {e}", exc_info=True)
     
-    def save_tournaments(self):
-        """Save tournament data to JSON file."""
+    def save_tournament(self, tournament_id):
+        """Save one tournament to the document store."""
         try:
-            with open(TOURNAMENTS_PATH, 'w') as f:
-                json.dump(self.active_tournaments, f, indent=4)
-            logger.info("Saved tournament data")
+            self.tournaments.put(tournament_id, self.active_tournaments[tournament_id])
         except Exception as e:
-            logger.error(f"Error saving tournament data: {e}", exc_info=True)
+            logger.error(f"Error saving tournament {tournament_id}: {e}", exc_info=True)
             
-    def save_game_votes(self):
-        """Save game votes data to JSON file."""
+    def save_game_vote(self, vote_id):
+        """Save one game vote to the document store."""
         try:
-            with open(GAME_VOTES_PATH, 'w') as f:
-                json.dump(self.game_votes, f, indent=4)
-            logger.info("Saved game votes data")
+            self.votes.put(vote_id, self.game_votes[vote_id])
         except Exception as e:
-            logger.error(f"Error saving game votes data: {e}", exc_info=True)
+            logger.error(f"Error saving game vote {vote_id}: {e}", exc_info=True)
     
     def create_tournament(self, tournament_id, channel_id, creator_id, game, max_participants, 
                         start_time, team_count, players_per_team, prize):
@@ -109,7 +89,7 @@ class TournamentManager:
         }
         
         self.active_tournaments[tournament_id] = tournament
-        self.save_tournaments()
+        self.save_tournament(tournament_id)
         return tournament
     
     def get_tournament(self, tournament_id):
@@ -124,7 +104,7 @@ class TournamentManager:
         """Delete a tournament."""
         if tournament_id in self.active_tournaments:
             del self.active_tournaments[tournament_id]
-            self.save_tournaments()
+            self.tournaments.delete(tournament_id)
             return True
         return False
     
@@ -153,7 +133,7 @@ class TournamentManager:
             "joined_at": datetime.datetime.now().isoformat()
         })
         
-        self.save_tournaments()
+        self.save_tournament(tournament_id)
         return True, f"You have successfully joined the {tournament['game']} tournament!"
     
     def remove_participant(self, tournament_id, user_id):
@@ -169,7 +149,7 @@ class TournamentManager:
         for i, participant in enumerate(tournament["participants"]):
             if participant["id"] == user_id:
                 tournament["participants"].pop(i)
-                self.save_tournaments()
+                self.save_tournament(tournament_id)
                 return True, f"You have left the {tournament['game']} tournament."
                 
         return False, "You are not registered for this tournament."
@@ -209,7 +189,7 @@ class TournamentManager:
         tournament["teams"] = teams
         tournament["status"] = "team_formation"
         
-        self.save_tournaments()
+        self.save_tournament(tournament_id)
         return True, f"Successfully generated {team_count} teams!"
     
     def generate_brackets(self, tournament_id):
@@ -329,7 +309,7 @@ class TournamentManager:
         # Format the first round matchups for announcement
         matchup_text = "\n".join([f"• **{team1}** vs **{team2}**" for team1, team2 in first_round_matchups])
         
-        self.save_tournaments()
+        self.save_tournament(tournament_id)
         return True, f"🎮 **Tournament Started!**\n\nThe {tournament['game']} tournament has officially begun!\n\n**First Round Matchups:**\n{matchup_text}\n\nBrackets have been generated with {num_rounds} rounds!"
     
     def set_match_winner(self, tournament_id, match_id, winner_id, team1_score, team2_score):
@@ -388,7 +368,7 @@ class TournamentManager:
         if all(m["status"] == "completed" for m in final_matches):
             tournament["status"] = "completed"
             
-        self.save_tournaments()
+        self.save_tournament(tournament_id)
         return True, f"Match {match_id} has been completed. Team {winner_id} wins!"
     
     def get_team_name(self, tournament_id, team_id):
@@ -471,7 +451,7 @@ class TournamentManager:
         for team in tournament["teams"]:
             if team["id"] == team_id:
                 team["name"] = team_name
-                self.save_tournaments()
+                self.save_tournament(tournament_id)
                 return True, f"Team {team_id} has been renamed to '{team_name}'."
                 
         return False, f"Team {team_id} not found."
@@ -492,7 +472,7 @@ class TournamentManager:
         }
         
         self.game_votes[vote_id] = vote
-        self.save_game_votes()
+        self.save_game_vote(vote_id)
         return vote
     
     def get_game_vote(self, vote_id):
@@ -520,7 +500,7 @@ class TournamentManager:
         vote["games"][game_index]["votes"] += 1
         vote["voters"][user_id] = game_index
         
-        self.save_game_votes()
+        self.save_game_vote(vote_id)
         return True, f"You voted for {vote['games'][game_index]['name']}!"
     
     def end_game_vote(self, vote_id):
@@ -549,7 +529,7 @@ class TournamentManager:
         vote["status"] = "completed"
         vote["winner"] = winner["name"]
         
-        self.save_game_votes()
+        self.save_game_vote(vote_id)
         return True, f"The vote has ended! {winner['name']} won with {winner['votes']} votes."
     
     def check_expired_votes(self):
@@ -727,7 +707,7 @@ class TournamentCog(commands.Cog):
             
             # Save the message ID in the tournament data
             tournament["message_id"] = str(response.id)
-            self.tournament_manager.save_tournaments()
+            self.tournament_manager.save_tournament(tournament_id)
             
             await interaction.followup.send(
                 f"Tournament created successfully! Players can now register via the join button.",
@@ -0,0 +1,202 @@
+import os
+import re
+import sqlite3
+import datetime
+from logger import setup_logger
+
+logger = setup_logger('transcript_archive')
+
+TRANSCRIPTS_DIR = 'data/transcripts'
+TRANSCRIPTS_DB_PATH = 'data/transcripts.db'
+
+# Header lines written at the top of every transcript file by TicketSystem.close_ticket
+HEADER_FIELDS = {
+    'Ticket ID': 'ticket_id',
+    'Subject': 'subject',
+    'User': 'user_name',
+    'Created': 'created_at',
+    'Closed by': 'closed_by',
+    'Reason': 'reason'
+}
+
+class TranscriptArchive:
+    """
+    Full-text index of closed ticket transcripts.
+    Transcripts are stored in an SQLite FTS5 table so staff can search every
+    closed ticket without reading the individual transcript files.
+    """
+
+    def __init__(self, db_path=TRANSCRIPTS_DB_PATH, transcripts_dir=TRANSCRIPTS_DIR):
+        self.db_path = db_path
+        self.transcripts_dir = transcripts_dir
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.cursor = self.conn.cursor()
+
+        self._create_tables()
+        logger.info(f"Transcript archive initialized at {self.db_path}")
+
+    def _create_tables(self):
+        """Create the FTS5 transcript table if it doesn't exist."""
+        self.cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS transcripts USING fts5(
+                ticket_id UNINDEXED,
+                subject,
+                user_name,
+                closed_by,
+                reason,
+                content,
+                created_at UNINDEXED,
+                closed_at UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        ''')
+        self.conn.commit()
+
+    def add_transcript(self, ticket_id, subject, user_name, closed_by, reason, content,
+                       created_at=None, closed_at=None):
+        """Index a transcript, replacing any previous entry for the same ticket."""
+        closed_at = closed_at or datetime.datetime.now().isoformat()
+        try:
+            self.cursor.execute('DELETE FROM transcripts WHERE ticket_id = ?', (ticket_id,))
+            self.cursor.execute('''
+                INSERT INTO transcripts
+                    (ticket_id, subject, user_name, closed_by, reason, content, created_at, closed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (ticket_id, subject or '', user_name or '', closed_by or '', reason or '',
+                  content, created_at or '', closed_at))
+            self.conn.commit()
+            logger.info(f"Indexed transcript for {ticket_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing transcript for {ticket_id}: {e}")
+            self.conn.rollback()
+            return False
+
+    def index_existing_files(self):
+        """Index transcript files in the transcripts directory that aren't archived yet.
+
+        Returns:
+            int: Number of transcript files added to the archive
+        """
+        if not os.path.exists(self.transcripts_dir):
+            return 0
+
+        self.cursor.execute('SELECT ticket_id FROM transcripts')
+        indexed = {row[0] for row in self.cursor.fetchall()}
+
+        added = 0
+        for filename in sorted(os.listdir(self.transcripts_dir)):
+            if not filename.startswith('ticket-') or not filename.endswith('.txt'):
+                continue
+
+            path = os.path.join(self.transcripts_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except Exception as e:
+                logger.error(f"Error reading transcript file {path}: {e}")
+                continue
+
+            fields = self.parse_header(content)
+            ticket_id = fields.get('ticket_id') or filename[len('ticket-'):-len('.txt')]
+            if ticket_id in indexed:
+                continue
+
+            closed_at = datetime.datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            if self.add_transcript(
+                ticket_id,
+                fields.get('subject'),
+                fields.get('user_name'),
+                fields.get('closed_by'),
+                fields.get('reason'),
+                content,
+                created_at=fields.get('created_at'),
+                closed_at=closed_at
+            ):
+                indexed.add(ticket_id)
+                added += 1
+
+        if added:
+            logger.info(f"Indexed {added} existing transcript files")
+        return added
+
+    @staticmethod
+    def parse_header(content):
+        """Extract the header fields from a transcript file's contents."""
+        fields = {}
+        for line in content.splitlines():
+            if line.startswith('--------------'):
+                break
+            name, sep, value = line.partition(': ')
+            if sep and name in HEADER_FIELDS:
+                fields[HEADER_FIELDS[name]] = value.strip()
+        return fields
+
+    @staticmethod
+    def build_match_query(query):
+        """Turn free text into an FTS5 query that matches all of the given words.
+
+        Each word is quoted so punctuation in user input can't produce FTS5 syntax errors.
+        A trailing '*' on a word is kept as a prefix search.
+        """
+        terms = []
+        for word in re.findall(r'[^\s"]+', query):
+            prefix = word.endswith('*') and len(word) > 1
+            word = word.rstrip('*')
+            if not word:
+                continue
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+        return ' '.join(terms)
+
+    def search(self, query, limit=10):
+        """Search the archive for transcripts matching the query.
+
+        Args:
+            query (str): Words to search for
+            limit (int): Maximum number of results to return
+
+        Returns:
+            list: Matching transcripts ordered by relevance, each with a highlighted snippet
+        """
+        match_query = self.build_match_query(query)
+        if not match_query:
+            return []
+
+        try:
+            self.cursor.execute('''
+                SELECT ticket_id, subject, user_name, closed_by, reason, created_at, closed_at,
+                       snippet(transcripts, 5, '**', '**', '...', 16)
+                FROM transcripts
+                WHERE transcripts MATCH ?
+                ORDER BY bm25(transcripts)
+                LIMIT ?
+            ''', (match_query, limit))
+        except sqlite3.OperationalError as e:
+            logger.error(f"Error searching transcripts for '{query}': {e}")
+            return []
+
+        return [
+            {
+                'ticket_id': row[0],
+                'subject': row[1],
+                'user_name': row[2],
+                'closed_by': row[3],
+                'reason': row[4],
+                'created_at': row[5],
+                'closed_at': row[6],
+                'snippet': row[7]
+            }
+            for row in self.cursor.fetchall()
+        ]
+
+    def count(self):
+        """Get the number of archived transcripts."""
+        self.cursor.execute('SELECT COUNT(*) FROM transcripts')
+        return self.cursor.fetchone()[0]
+
+    def close(self):
+        """Close the archive database connection."""
+        if self.conn:
+            self.conn.close()
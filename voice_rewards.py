@@ -4,7 +4,8 @@ import asyncio
 import time
 import json
 from discord.ext import commands
-from database import Database
+from database import get_database
+from rewards import CoinSource
 from logger import setup_logger
 
 logger = setup_logger('voice_rewards')
@@ -45,7 +46,7 @@ class VoiceRewardsCog(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
         self.voice_users = {}  # {user_id: VoiceUserActivity}
         self.downtime_users = []  # List of users to process for downtime rewards
         self.startup_task = None
@@ -119,8 +120,6 @@ class VoiceRewardsCog(commands.Cog):
         if self.voice_users:
             logger.warning(f"Bot shutting down with {len(self.voice_users)} users still in voice channels.")
             self.save_voice_states()
-
-        self.db.close()
         
     @commands.Cog.listener()
     async def on_ready(self):
@@ -253,7 +252,7 @@ class VoiceRewardsCog(commands.Cog):
 
         coins_to_add = int(minutes_spent * coin_multiplier)
 
-        updated_user = self.db.add_coins(user_id, username, coins_to_add)
+        updated_user = self.db.add_coins(user_id, username, coins_to_add, CoinSource.VOICE)
         if updated_user is None:
             logger.error(f"Failed to add coins to user {username} ({user_id})")
             updated_user = {'level': 0}  # Default value to prevent errors
@@ -392,7 +391,7 @@ class VoiceRewardsCog(commands.Cog):
 
         coins_to_add = int(minutes_spent * coin_multiplier)
 
-        updated_user = self.db.add_coins(user_id, username, coins_to_add)
+        updated_user = self.db.add_coins(user_id, username, coins_to_add, CoinSource.VOICE)
         if updated_user is None:
             logger.error(f"Failed to add coins to user {username} ({user_id}) for downtime")
             updated_user = {'level': 0}  # Default value to prevent errors
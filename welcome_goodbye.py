@@ -3,8 +3,11 @@ from discord import app_commands
 from discord.ext import commands
 import logging
 import datetime
-import json
 import os
+from settings_storage import settings_storage
+
+# Keys in settings.json used by this cog
+WELCOME_SETTINGS_KEYS = ('welcome_channel_id', 'goodbye_channel_id', 'welcome_message', 'goodbye_message', 'custom_welcome_messages')
 
 class WelcomeGoodbyeSystem(commands.Cog):
     """Cog for handling welcome and goodbye messages."""
@@ -24,40 +27,42 @@ class WelcomeGoodbyeSystem(commands.Cog):
         
         # Load settings
         self.load_settings()
+        for key in WELCOME_SETTINGS_KEYS:
+            settings_storage.subscribe(key, self.on_settings_changed)
     
     def load_settings(self):
-        """Load welcome/goodbye settings from settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-                self.welcome_channel_id = settings.get('welcome_channel_id')
-                self.goodbye_channel_id = settings.get('goodbye_channel_id')
-                
-                if 'welcome_message' in settings:
-                    self.welcome_message = settings['welcome_message']
-                if 'goodbye_message' in settings:
-                    self.goodbye_message = settings['goodbye_message']
-                    
-                self.custom_messages = settings.get('custom_welcome_messages', {})
-        except Exception as e:
-            self.logger.error(f"Failed to load welcome/goodbye settings: {e}")
+        """Load welcome/goodbye settings from the shared settings store."""
+        settings = settings_storage.get_many({
+            'welcome_channel_id': None,
+            'goodbye_channel_id': None,
+            'welcome_message': self.welcome_message,
+            'goodbye_message': self.goodbye_message,
+            'custom_welcome_messages': {}
+        })
+        self.welcome_channel_id = settings['welcome_channel_id']
+        self.goodbye_channel_id = settings['goodbye_channel_id']
+        self.welcome_message = settings['welcome_message']
+        self.goodbye_message = settings['goodbye_message']
+        self.custom_messages = settings['custom_welcome_messages']
     
     def save_settings(self):
-        """Save welcome/goodbye settings to settings.json."""
-        try:
-            with open('settings.json', 'r') as f:
-                settings = json.load(f)
-            
-            settings['welcome_channel_id'] = self.welcome_channel_id
-            settings['goodbye_channel_id'] = self.goodbye_channel_id
-            settings['welcome_message'] = self.welcome_message
-            settings['goodbye_message'] = self.goodbye_message
-            settings['custom_welcome_messages'] = self.custom_messages
-            
-            with open('settings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
-        except Exception as e:
-            self.logger.error(f"Failed to save welcome/goodbye settings: {e}")
+        """Save welcome/goodbye settings to the shared settings store."""
+        settings_storage.update({
+            'welcome_channel_id': self.welcome_channel_id,
+            'goodbye_channel_id': self.goodbye_channel_id,
+            'welcome_message': self.welcome_message,
+            'goodbye_message': self.goodbye_message,
+            'custom_welcome_messages': self.custom_messages
+        })
+    
+    def on_settings_changed(self, key, value):
+        """Reload welcome/goodbye settings when settings.json changes."""
+        self.load_settings()
+    
+    def cog_unload(self):
+        """Stop listening for settings changes when the cog is unloaded."""
+        for key in WELCOME_SETTINGS_KEYS:
+            settings_storage.unsubscribe(key, self.on_settings_changed)
     
     @commands.Cog.listener()
     async def on_member_join(self, member):
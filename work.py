@@ -3,24 +3,29 @@ import random
 import asyncio
 import time
 import logging
-import json
-import os
 from discord import app_commands
 from discord.ext import commands
-from database import Database
+from database import get_database
+from rewards import CoinSource
+from document_store import get_document_store
 
 logger = logging.getLogger(__name__)
 
+WORK_COOLDOWN_FLUSH_DELAY = 2.0  # Seconds to hold cooldown writes so bursts are committed together
+
 class WorkCog(commands.Cog):
     """Cog for managing the work command"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = get_database()
 
         self.settings = self.db.get_settings()
 
-        self.cooldown_file = 'data/work_cooldowns.json'
+        # Writes are coalesced, a burst of /work uses is committed in one transaction
+        self.cooldowns = get_document_store().collection(
+            'work_cooldowns', legacy_file='data/work_cooldowns.json', coalesce_delay=WORK_COOLDOWN_FLUSH_DELAY
+        )
 
         self.last_work = self.load_cooldowns()
 
@@ -47,33 +52,22 @@ class WorkCog(commands.Cog):
         ]
     
     def load_cooldowns(self):
-        """Load work cooldowns from file."""
+        """Load work cooldowns from the document store."""
         try:
-            if os.path.exists(self.cooldown_file):
-                with open(self.cooldown_file, 'r') as f:
-
-                    data = json.load(f)
-                    return {int(user_id): timestamp for user_id, timestamp in data.items()}
-            else:
-                logger.info("No work cooldowns file found, creating a new one")
-                return {}
+            return {int(user_id): timestamp for user_id, timestamp in self.cooldowns.all().items()}
         except Exception as e:
             logger.error(f"Error loading work cooldowns: {e}")
             return {}
     
-    def save_cooldowns(self):
-        """Save work cooldowns to file."""
+    def save_cooldown(self, user_id):
+        """Save one user's work cooldown, or remove it if it has been cleared."""
         try:
-
-            os.makedirs(os.path.dirname(self.cooldown_file), exist_ok=True)
-
-            data = {str(user_id): timestamp for user_id, timestamp in self.last_work.items()}
-            
-            with open(self.cooldown_file, 'w') as f:
-                json.dump(data, f)
-            logger.debug("Work cooldowns saved to file")
+            if user_id in self.last_work:
+                self.cooldowns.put(user_id, self.last_work[user_id])
+            else:
+                self.cooldowns.delete(user_id)
         except Exception as e:
-            logger.error(f"Error saving work cooldowns: {e}")
+            logger.error(f"Error saving work cooldown for {user_id}: {e}")
     
     def cleanup_expired_cooldowns(self):
         """Remove expired cooldowns to keep the storage file clean."""
@@ -86,19 +80,15 @@ class WorkCog(commands.Cog):
 
         for user_id in expired_users:
             del self.last_work[user_id]
+            self.save_cooldown(user_id)
         
         if expired_users:
             logger.info(f"Cleaned up {len(expired_users)} expired work cooldowns")
-
-            self.save_cooldowns()
     
     def cog_unload(self):
         """Called when the cog is unloaded."""
 
-        self.save_cooldowns()
-
-        if hasattr(self, 'db'):
-            self.db.close()
+        self.cooldowns.flush()
             
     @app_commands.command(
         name="work",
@@ -139,7 +129,7 @@ class WorkCog(commands.Cog):
 
         coins_earned = random.randint(10, 60)
 
-        updated_user = self.db.add_coins(user_id, username, coins_earned)
+        updated_user = self.db.add_coins(user_id, username, coins_earned, CoinSource.WORK)
         if updated_user is None:
             logger.error(f"Failed to add coins to user {username} ({user_id})")
 
@@ -153,7 +143,7 @@ class WorkCog(commands.Cog):
 
         self.last_work[user_id] = current_time
 
-        self.save_cooldowns()
+        self.save_cooldown(user_id)
 
         work_message = random.choice(self.work_messages).format(coins=coins_earned)
 